@@ -0,0 +1,196 @@
+import asyncio
+
+import paramiko
+
+from ssh_tools import StreamMatcher, read_loop, set_nodelay
+from io_stats import ChannelStats
+from tracing import current
+from sftp_sync import SFTPSync
+
+
+# SSHManager 的 asyncio 版本，接口保持一致，全部方法可 await
+# channel 可读事件通过 loop.add_reader 注册到事件循环，不需要每个会话一个读线程
+# 握手、认证等阻塞调用放到默认线程池中执行；配合 SSHPool 时同一主机的会话共用一个 Transport
+class AsyncSSHManager:
+    def __init__(self, ip, username, password, ssh_name="", port=22, final_prompt="$ ",
+                 pool=None):
+        self.ip = ip
+        self.port = port
+        self.username = username
+        self.password = password
+        self.final_prompt = final_prompt
+        self.ssh_name = ssh_name
+        self.pool = pool
+        self.ssh = None
+        self.sftp = None
+        self.channel = None
+        self.tasks = {}  # 保存 drain 任务
+        self.waiters = []  # 等待 channel 可读的 future，共用一个 reader
+        self.stats = ChannelStats(ssh_name or "shell")
+
+    @classmethod
+    async def create(cls, *args, **kwargs):
+        """ 创建并连接 """
+        manager = cls(*args, **kwargs)
+        await manager.connect()
+        return manager
+
+    async def __aenter__(self):
+        if self.ssh is None:
+            await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _open(self):
+        if self.pool is not None:
+            self.ssh = self.pool.get_client(self.ip, self.port, self.username, self.password)
+            self.sftp = self.pool.get_sftp(self.ip, self.port, self.username, self.password)
+        else:
+            self.ssh = paramiko.SSHClient()
+            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            self.ssh.connect(self.ip, self.port, self.username, self.password)
+            set_nodelay(self.ssh)
+            self.sftp = self.ssh.open_sftp()
+        self.channel = self.ssh.invoke_shell()
+        self.channel.setblocking(0)
+
+    async def connect(self):
+        await asyncio.get_running_loop().run_in_executor(None, self._open)
+        print(self.ssh_name, "ssh connect")
+        # 连接命令的缓冲区立即读取
+        await self.read_until_prompt(self.final_prompt)
+
+    async def wait_readable(self, timeout):
+        """ 等待 channel 可读，超时返回 False """
+        if self.channel.recv_ready() or self.channel.recv_stderr_ready():
+            return True
+        loop = asyncio.get_running_loop()
+        fd = self.channel.fileno()
+        ready = loop.create_future()
+        # add_reader 会替换同一 fd 上已有的 reader，多个协程（如 stream 和 read_until_prompt）
+        # 同时等待时只注册一个，可读时唤醒全部等待者
+        # pipe 是电平触发的，触发后立即移除，没有等待者时不留 reader
+        if not self.waiters:
+            loop.add_reader(fd, self._on_readable, fd)
+        self.waiters.append(ready)
+        try:
+            await asyncio.wait_for(ready, timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            if ready in self.waiters:
+                self.waiters.remove(ready)
+                if not self.waiters:
+                    loop.remove_reader(fd)
+
+    def _on_readable(self, fd):
+        waiters, self.waiters = self.waiters, []
+        asyncio.get_running_loop().remove_reader(fd)
+        for ready in waiters:
+            if not ready.done():
+                ready.set_result(True)
+
+    # 参数含义与 SSHManager.read_until_prompt 相同，读取循环共用 ssh_tools.read_loop
+    async def read_until_prompt(self,
+                                prompt,
+                                max_duration=3600,
+                                once_max_wait=360,
+                                show_log=False,
+                                buffer_size=1024,
+                                interval=1,
+                                sink=None):
+        reader = read_loop(self.channel, self.ssh_name, prompt, max_duration, once_max_wait,
+                           show_log, buffer_size, interval, sink, self.stats, current())
+        try:
+            while True:
+                await self.wait_readable(next(reader))
+        except StopIteration as done:
+            return done.value
+
+    async def execute_command(self,
+                              command,
+                              max_duration=3600,
+                              once_max_wait=360,
+                              show_log=False,
+                              buffer_size=1024,
+                              interval=1):
+        print(self.ssh_name, command)
+        self.channel.send(command + "\r")
+        return await self.read_until_prompt(self.final_prompt, max_duration, once_max_wait,
+                                            show_log, buffer_size, interval)
+
+    # 只发送命令，不等待输出
+    def execute_command_async(self, command):
+        print(self.ssh_name, command)
+        self.channel.send(command + "\r")
+
+    async def stream(self, buffer_size=32768, decode=True):
+        """ 异步迭代 channel 输出，channel 关闭时结束 """
+        matcher = StreamMatcher(None)
+        while True:
+            if self.channel.recv_ready():
+                recv = self.channel.recv
+            elif self.channel.recv_stderr_ready():
+                # stderr 与 stdout 共用同一个 pipe，不读走会一直可读（wait_readable 立即返回），
+                # 与 Reactor.service 一样一并输出
+                recv = self.channel.recv_stderr
+            else:
+                if self.channel.closed or self.channel.eof_received:
+                    return
+                await self.wait_readable(1)
+                continue
+            data = recv(buffer_size)
+            if not data:
+                return
+            if decode:
+                text = matcher.decoder.decode(data)
+                if text:
+                    yield text
+            else:
+                yield data
+
+    # 与 SSHManager.start_recv_thread 对应：在事件循环上持续读取，防止缓冲区占满
+    # sink，接收每次读到的字节的回调，为 None 时直接丢弃
+    def start_recv_task(self, max_duration=3600, buffer_size=32768, sink=None):
+        task_name = f"RecvTask-{len(self.tasks) + 1}"
+
+        async def drain():
+            async for data in self.stream(buffer_size, decode=False):
+                if sink is not None:
+                    sink(data)
+        task = asyncio.ensure_future(asyncio.wait_for(drain(), max_duration))
+        self.tasks[task_name] = task
+        return task_name
+
+    async def stop_task(self, task_name):
+        task = self.tasks.pop(task_name, None)
+        if task is None:
+            print(f"Task {task_name} not found")
+            return
+        task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            pass
+
+    async def download_directory(self, remote_dir, local_dir, workers=4, mode='auto',
+                                 check='mtime', prune=False):
+        sync = SFTPSync(self.ssh, workers=workers, check=check)
+        return await asyncio.get_running_loop().run_in_executor(
+            None, sync.sync, remote_dir, local_dir, mode, prune)
+
+    async def close(self):
+        for task_name in list(self.tasks.keys()):
+            await self.stop_task(task_name)
+        if self.ssh:
+            if self.pool is not None:
+                self.channel.close()
+            else:
+                self.sftp.close()
+                self.ssh.close()
+            print(self.ssh_name, "ssh close")
+            self.ssh = None
+
@@ -0,0 +1,136 @@
+"""
+并发会话扩展性：N 个 AsyncSSHManager 跑在一个事件循环上 vs 每会话一个线程的 SSHManager。
+
+替身服务端运行在子进程中，线程数和 CPU 只统计客户端进程。
+
+用法：python benchmarks/bench_async_scaling.py [--sessions 64] [--commands 20]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from async_ssh_tools import AsyncSSHManager  # noqa: E402
+from ssh_tools import SSHManager, SSHPool  # noqa: E402
+
+
+def serve(conn):
+    from local_server import LocalSSHServer
+    server = LocalSSHServer()
+    conn.send((server.port, server.username, server.password, server.prompt))
+    conn.recv()
+    server.close()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+class Probe:
+    """后台采样客户端进程的线程数峰值"""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self.running = True
+        self.thread = threading.Thread(target=self.loop, daemon=True)
+
+    def loop(self):
+        while self.running:
+            self.peak = max(self.peak, threading.active_count())
+            time.sleep(0.01)
+
+    def __enter__(self):
+        self.cpu = time.process_time()
+        self.wall = time.perf_counter()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.running = False
+        self.thread.join()
+        self.cpu = time.process_time() - self.cpu
+        self.wall = time.perf_counter() - self.wall
+
+
+def run_async(addr, sessions, commands):
+    port, username, password, prompt = addr
+    latencies = []
+
+    async def one(pool, i):
+        manager = await AsyncSSHManager.create("127.0.0.1", username, password, f"[{i}]",
+                                               port, prompt, pool=pool)
+        for j in range(commands):
+            t0 = time.perf_counter()
+            await manager.execute_command(f"echo {i} {j}")
+            latencies.append(time.perf_counter() - t0)
+        await manager.close()
+
+    async def main():
+        pool = SSHPool()
+        await asyncio.gather(*(one(pool, i) for i in range(sessions)))
+        pool.close()
+
+    with Probe() as probe:
+        asyncio.run(main())
+    return probe, latencies
+
+
+def run_threads(addr, sessions, commands):
+    port, username, password, prompt = addr
+    latencies = []
+
+    def one(i):
+        manager = SSHManager("127.0.0.1", username, password, f"[{i}]", port, prompt)
+        for j in range(commands):
+            t0 = time.perf_counter()
+            manager.execute_command(f"echo {i} {j}")
+            latencies.append(time.perf_counter() - t0)
+        manager.close()
+
+    with Probe() as probe:
+        threads = [threading.Thread(target=one, args=(i,)) for i in range(sessions)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    return probe, latencies
+
+
+def report(name, probe, latencies):
+    print(f"{name:<32} wall {probe.wall:6.2f} s  cpu {probe.cpu:6.2f} s  "
+          f"peak threads {probe.peak:4d}  p50 {1000 * percentile(latencies, 50):7.1f} ms  "
+          f"p99 {1000 * percentile(latencies, 99):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=64)
+    parser.add_argument("--commands", type=int, default=20)
+    args = parser.parse_args()
+
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=serve, args=(child,), daemon=True)
+    proc.start()
+    addr = parent.recv()
+    try:
+        print(f"{args.sessions} sessions x {args.commands} commands")
+        with contextlib.redirect_stdout(io.StringIO()):
+            a = run_async(addr, args.sessions, args.commands)
+            t = run_threads(addr, args.sessions, args.commands)
+        report("AsyncSSHManager + SSHPool", *a)
+        report("SSHManager, thread per session", *t)
+    finally:
+        parent.send("stop")
+        proc.join(5)
+
+
+if __name__ == "__main__":
+    main()
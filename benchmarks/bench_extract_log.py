@@ -0,0 +1,127 @@
+"""
+log.txt 解析吞吐量：旧版 extract_log（逐行逐键子串查找 + 两次 findall + DataFrame）
+vs 单次扫描的 parse_log，以及磁盘缓存命中时的耗时。
+
+先用 surfaces.py 生成 N 个 log.txt（server 部分附带若干行普通日志），再分别解析全部文件，
+并校验两种实现的结果一致。
+
+用法：python benchmarks/bench_extract_log.py [--files 500] [--filler-lines 2000]
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+
+import log_process  # noqa: E402
+from log_process import client_res_pattern, server_run_columns, server_run_rows, \
+    server_res_columns, server_res_rows  # noqa: E402
+from surfaces import SyntheticSurface, format_log  # noqa: E402
+
+legacy_run_pattern = re.compile(r'scheduler.py:117\]\s(?:Max|Mean|Min)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)')
+legacy_res_pattern = re.compile(r'scheduler.py:118\]\s(?:Sum|Max|Mean|Min|P99)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)')
+
+FILLER = [
+    "INFO 06-01 12:00:{s:02d} metrics.py:334] Avg prompt throughput: {a:.1f} tokens/s, "
+    "Avg generation throughput: {b:.1f} tokens/s, Running: {r} reqs, Swapped: 0 reqs, "
+    "Pending: {p} reqs, GPU KV cache usage: {u:.1f}%, CPU KV cache usage: 0.0%.",
+    "INFO:     127.0.0.1:{port} - \"POST /v1/completions HTTP/1.1\" 200 OK",
+]
+
+
+def legacy_extract_log(logpath):
+    """ 本次改动前的 extract_log """
+    with open(logpath, encoding='utf-8', errors='replace') as file:
+        data = file.read()
+    if "data split" in data:
+        client_data, server_data = data.split("data split")
+    else:
+        client_data, server_data = "", data
+    client_res = {}
+    for line in client_data.split('\n'):
+        for key in client_res_pattern:
+            if key in line:
+                value = line.split(":")[-1]
+                client_res[key] = float(value.replace(' ', ''))
+    server_run_df = pd.DataFrame(legacy_run_pattern.findall(server_data),
+                                 columns=server_run_columns, index=server_run_rows)
+    server_run_df = server_run_df.replace(',', '', regex=True).astype(float)
+    server_res_df = pd.DataFrame(legacy_res_pattern.findall(server_data),
+                                 columns=server_res_columns, index=server_res_rows)
+    server_res_df = server_res_df.replace(',', '', regex=True).astype(float)
+    return client_res, server_run_df, server_res_df
+
+
+def make_corpus(folder, files, filler_lines):
+    rng = random.Random(0)
+    surface = SyntheticSurface("13b-sharegpt")
+    paths = []
+    for i in range(files):
+        mns, rr = rng.randrange(16, 512, 16), rng.randrange(1, 20)
+        text = format_log(*surface.evaluate(mns, None, rr))
+        client, server = text.split("data split\n")
+        lines = [FILLER[j % 2].format(s=j % 60, a=rng.random() * 1000, b=rng.random() * 3000,
+                                      r=rng.randrange(mns), p=rng.randrange(50),
+                                      u=rng.random() * 100, port=40000 + j)
+                 for j in range(filler_lines)]
+        path = os.path.join(folder, f"{i}", "log.txt")
+        os.makedirs(os.path.dirname(path))
+        with open(path, "w") as f:
+            f.write(client + "data split\n" + "\n".join(lines) + "\n" + server)
+        paths.append(path)
+    return paths
+
+
+def timed(fn, paths):
+    start = time.perf_counter()
+    results = [fn(path) for path in paths]
+    return time.perf_counter() - start, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--filler-lines", type=int, default=2000)
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench_extract_")
+    log_process.parse_cache_dir = os.path.join(folder, "cache")
+    try:
+        paths = make_corpus(os.path.join(folder, "logs"), args.files, args.filler_lines)
+        size = sum(os.path.getsize(p) for p in paths)
+
+        t_legacy, legacy = timed(legacy_extract_log, paths)
+        t_record, _ = timed(lambda p: log_process.parse_log(p, cache=False), paths)
+        t_frames, frames = timed(lambda p: log_process.extract_log(p, cache=False), paths)
+        t_cold, _ = timed(log_process.parse_log, paths)
+        t_warm, cached = timed(log_process.extract_log, paths)
+        t_warm_record, _ = timed(log_process.parse_log, paths)
+
+        # 结果一致性
+        for old, new, hit in zip(legacy, frames, cached):
+            assert old[0] == new[0] == hit[0]
+            for i in (1, 2):
+                assert old[i].equals(new[i]) and old[i].equals(hit[i])
+
+        print(f"{args.files} files, {size / 2**20:.1f} MB, results identical")
+        for name, t in (("legacy extract_log", t_legacy),
+                        ("parse_log (record)", t_record),
+                        ("extract_log (frames)", t_frames),
+                        ("parse_log, cache miss", t_cold),
+                        ("extract_log, cache hit", t_warm),
+                        ("parse_log, cache hit", t_warm_record)):
+            print(f"{name:<24}{t:8.3f} s   {args.files / t:9.0f} files/s   "
+                  f"{size / 2**20 / t:8.1f} MB/s")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+结果表构建耗时：extract_logs 全量构建（不同进程数）、无变化时重跑、新增少量实验后的增量更新。
+
+用 surfaces.py 在临时目录生成 model/dataset/num_prompts/<chunked>/<mns_mnbt_rr>/log.txt
+的输出目录，解析缓存也指向临时目录，每次全量构建前清空。
+
+用法：python benchmarks/bench_extract_logs.py [--files 2000] [--workers 1,2,4]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import log_process  # noqa: E402
+from surfaces import SyntheticSurface, write_tree  # noqa: E402
+
+
+def grid(n, rr_offset=0):
+    return [[mns, None, rr + rr_offset] for rr in range(1, 100) for mns in range(16, 1025, 16)][:n]
+
+
+def timed(fn):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--workers", default=",".join(str(w) for w in (1, 2, 4)
+                                                      if w <= (os.cpu_count() or 1)) or "1")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench_extract_logs_")
+    out_dir = os.path.join(folder, "2-A100")
+    table = os.path.join(out_dir, "table.csv")
+    cache = os.path.join(folder, "cache")
+    log_process.parse_cache_dir = cache
+    try:
+        surface = SyntheticSurface("13b-sharegpt")
+        write_tree(surface, out_dir, "model", "sharegpt", False, grid(args.files))
+        print(f"{args.files} log.txt, {os.cpu_count()} CPU")
+
+        for workers in [int(w) for w in args.workers.split(",")]:
+            for path in (table, table + ".manifest.json"):
+                if os.path.exists(path):
+                    os.remove(path)
+            shutil.rmtree(cache, ignore_errors=True)
+            t = timed(lambda: log_process.extract_logs(out_dir, table, workers=workers))
+            print(f"full build, {workers} workers       {t:7.2f} s   {args.files / t:7.0f} logs/s")
+
+        t = timed(lambda: log_process.extract_logs(out_dir, table))
+        print(f"rebuild, nothing changed        {t:7.2f} s")
+
+        added = max(1, args.files // 100)
+        write_tree(surface, out_dir, "model", "sharegpt", False, grid(added, rr_offset=0.5))
+        t = timed(lambda: log_process.extract_logs(out_dir, table))
+        print(f"incremental, {added} new logs       {t:7.2f} s")
+
+        t = timed(lambda: log_process.extract_logs(out_dir, table, formats=("csv.gz", "parquet")))
+        print(f"with csv.gz/parquet output      {t:7.2f} s")
+        with open(table) as f:
+            print(f"table rows: {sum(1 for _ in f) - 1}")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
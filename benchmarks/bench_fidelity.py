@@ -0,0 +1,146 @@
+"""
+多保真度调优（fidelity.SuccessiveHalving）的离线基准，用合成响应面代替真实实验。
+
+对每个 场景 x chunked 模式，对比：
+- full，所有实验都用完整的 num-prompts（原有的 opti_experiment）
+- fidelity，在 rungs 中最小的 num-prompts 上搜索，逐级复测排名靠前的实验
+报告各级实验数、GPU 时间（benchmark 时长之和，另加每个实验 --launch 秒的启动/准备开销）、
+最终参数在完整 num-prompts 下无噪声的真实吞吐量，以及是否满足约束。
+prompt 少时噪声按 1/sqrt(num-prompts) 放大，排队积压也更小（低保真度偏乐观）。
+
+用法：
+  python benchmarks/bench_fidelity.py
+  python benchmarks/bench_fidelity.py --strategy bayes --rungs 100,400 --eta 4 --noise 0.03
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fidelity import SuccessiveHalving, fidelity_rungs  # noqa: E402
+from optimizer import OptiPlan, default_params  # noqa: E402
+from surrogate import make_strategy  # noqa: E402
+from surfaces import SCENARIOS, SyntheticSurface  # noqa: E402
+
+
+class Oracle:
+    """ 各个 num-prompts 下的合成实验，记录 GPU 时间 """
+
+    def __init__(self, scenario, noise, launch):
+        self.scenario = scenario
+        self.noise = noise
+        self.launch = launch
+        self.surfaces = {}
+        self.gpu_seconds = 0.0
+        self.trials = 0
+
+    def surface(self, num_prompts, noise=None):
+        key = (num_prompts, noise)
+        if key not in self.surfaces:
+            scale = math.sqrt(2000 / num_prompts)
+            self.surfaces[key] = SyntheticSurface(
+                self.scenario, num_prompts, self.noise * scale if noise is None else noise,
+                seed=num_prompts)
+        return self.surfaces[key]
+
+    def evaluate(self, num_prompts, params):
+        result = self.surface(num_prompts).evaluate(*params)
+        self.gpu_seconds += result[0]["Benchmark duration (s)"] + self.launch
+        self.trials += 1
+        return result
+
+    def truth(self, num_prompts, params, limits):
+        """ 完整 num-prompts 下无噪声的吞吐量，超限为 -1 """
+        if params is None:
+            return -1
+        m = self.surface(num_prompts, 0.0).model(*params)
+        if m["ttft"] > limits["ttft_p99_limit"] or m["tpot99"] > limits["tpot_p99_limit"]:
+            return -1
+        return m["thr"]
+
+
+def search(oracle, num_prompts, chunked_prefill, step_cfg, limits, search_cfg):
+    """ 与 vllm_experiment.search 相同的串行调优循环 """
+    plan = OptiPlan(chunked_prefill, step_cfg, limits, make_strategy(search_cfg))
+    params = default_params(step_cfg)
+    flag = True
+    while flag:
+        flag, *params = plan.append_experiment(list(params), *oracle.evaluate(num_prompts, params))
+    return plan
+
+
+def run(scenario, chunked_prefill, step_cfg, limits, num_prompts, search_cfg, args):
+    rows = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        oracle = Oracle(scenario, args.noise, args.launch)
+        plan = search(oracle, num_prompts, chunked_prefill, step_cfg, limits, search_cfg)
+        best = plan.input_params_list[plan.best_idx] if plan.best_throughput > 0 else None
+        rows["full"] = (oracle, best, {num_prompts: oracle.trials})
+
+        oracle = Oracle(scenario, args.noise, args.launch)
+        rungs = fidelity_rungs({"rungs": [int(n) for n in args.rungs.split(",")]}, num_prompts)
+        plan = search(oracle, rungs[0], chunked_prefill, step_cfg, limits, search_cfg)
+        halving = SuccessiveHalving(rungs, args.eta, args.min_survivors)
+        best = halving.run(plan, lambda n, params: oracle.evaluate(n, params)[0])
+        rows["fidelity"] = (oracle, best, {n: len(halving.trials(n)) for n in rungs})
+    return {name: {"gpu": oracle.gpu_seconds, "best": best, "trials": trials,
+                   "truth": oracle.truth(num_prompts, best, limits)}
+            for name, (oracle, best, trials) in rows.items()}
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=os.path.join(root, "config.yaml"))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--strategy", default="heuristic")
+    parser.add_argument("--rungs", default="200,600")
+    parser.add_argument("--eta", type=int, default=3)
+    parser.add_argument("--min-survivors", type=int, default=2)
+    parser.add_argument("--noise", type=float, default=0.02,
+                        help="num-prompts=2000 时的相对噪声")
+    parser.add_argument("--launch", type=float, default=60.0,
+                        help="每个实验 benchmark 以外的开销(s)")
+    args = parser.parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    limits = config["limitation"]
+    search_cfg = dict(config.get("search") or {})
+    search_cfg["strategy"] = args.strategy
+    num_prompts = config["params"]["num-prompts"]
+
+    rungs = fidelity_rungs({"rungs": [int(n) for n in args.rungs.split(",")]}, num_prompts)
+    print(f"{args.strategy} search, rungs {rungs}, eta {args.eta}, noise {args.noise} "
+          f"at {num_prompts} prompts")
+    print(f"{'scenario':<14}{'mode':<9}{'full trials':>12}{'GPU h':>7}{'thr':>7}"
+          f"{'rung trials':>16}{'GPU h':>7}{'thr':>7}{'speedup':>9}   best params (full / fidelity)")
+    total = {"full": 0.0, "fidelity": 0.0}
+    ratios = []
+    for scenario in args.scenarios.split(","):
+        for mode in ("disable", "enable"):
+            step_cfg = config["params"][mode + "_chunked_prefill"]
+            res = run(scenario, mode == "enable", step_cfg, limits, num_prompts, search_cfg,
+                      args)
+            full, fid = res["full"], res["fidelity"]
+            for name in total:
+                total[name] += res[name]["gpu"]
+            ratios.append(fid["truth"] / full["truth"] if full["truth"] > 0 else 1.0)
+            rung_trials = "/".join(str(n) for n in fid["trials"].values())
+            print(f"{scenario:<14}{mode:<9}{sum(full['trials'].values()):>12}"
+                  f"{full['gpu'] / 3600:>7.2f}{full['truth']:>7.2f}{rung_trials:>16}"
+                  f"{fid['gpu'] / 3600:>7.2f}{fid['truth']:>7.2f}"
+                  f"{full['gpu'] / fid['gpu']:>8.1f}x   {full['best']} / {fid['best']}")
+    print(f"total GPU time: full {total['full'] / 3600:.1f}h, fidelity "
+          f"{total['fidelity'] / 3600:.1f}h ({total['full'] / total['fidelity']:.1f}x less); "
+          f"final throughput vs full search: mean {sum(ratios) / len(ratios):.1%}, "
+          f"min {min(ratios):.1%}")
+
+
+if __name__ == "__main__":
+    main()
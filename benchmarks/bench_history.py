@@ -0,0 +1,82 @@
+"""
+OptiPlan 实验历史的查询耗时：原来的列表线性扫描 vs TrialHistory 的哈希/有序线索引。
+
+向 OptiPlan 灌入 N 个网格上的历史实验（模拟热启动/离线回放），然后测量
+exist() 查重和 find_dir 沿 max_num_seqs 一条线查找邻居实验的平均耗时。
+
+用法：python benchmarks/bench_history.py [--sizes 100,1000,5000]
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimizer import OptiPlan  # noqa: E402
+from surfaces import SyntheticSurface  # noqa: E402
+
+
+def legacy_exist(params_list, params):
+    for item in params_list:
+        if item == params:
+            return True
+    return False
+
+
+def legacy_line(params_list, idx, dim):
+    others = [d for d in range(3) if d != dim]
+    return [[i, p[dim]] for i, p in enumerate(params_list)
+            if p[others[0]] == params_list[idx][others[0]] and
+            p[others[1]] == params_list[idx][others[1]]]
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", default="100,1000,5000")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+    with open(os.path.join(root, "config.yaml")) as f:
+        config = yaml.safe_load(f)
+    step_cfg = config["params"]["enable_chunked_prefill"]
+    surface = SyntheticSurface("7b-gsm")
+    # server 端表格对查询耗时没有影响，所有实验共用一份
+    client_res, server_run_df, server_res_df = surface.evaluate(256, 512, 10)
+
+    print(f"{'trials':>7}{'exist list':>12}{'exist idx':>11}{'line list':>11}{'line idx':>10}"
+          f"{'find_dir':>11}   (us per call)")
+    for n in [int(v) for v in args.sizes.split(",")]:
+        plan = OptiPlan(True, step_cfg, config["limitation"])
+        points = [[mns, mnbt, rr] for rr in range(1, 51) for mnbt in range(128, 2049, 128)
+                  for mns in range(16, 1025, 16)][:n]
+        with contextlib.redirect_stdout(io.StringIO()):
+            for params in points:
+                idx = plan.record_experiment(params, client_res, server_run_df, server_res_df)
+                plan.history.set_opti_dir(idx, [1, 0, 0])
+        params_list = plan.input_params_list
+        probes = [points[(i * 7919) % n] for i in range(args.repeat)]
+        t_exist_list = timed(lambda i: legacy_exist(params_list, probes[i]), min(args.repeat, 200))
+        t_exist_idx = timed(lambda i: plan.exist(probes[i]), args.repeat)
+        t_line_list = timed(lambda i: legacy_line(params_list, (i * 7919) % n, 0),
+                            min(args.repeat, 200))
+        t_line_idx = timed(lambda i: plan.history.line((i * 7919) % n, 0), args.repeat)
+        with contextlib.redirect_stdout(io.StringIO()):
+            t_dir0 = timed(lambda i: plan.find_dir((i * 7919) % n, 0), min(args.repeat, 500))
+        print(f"{n:>7}{t_exist_list:>12.1f}{t_exist_idx:>11.2f}{t_line_list:>11.1f}"
+              f"{t_line_idx:>10.2f}{t_dir0:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
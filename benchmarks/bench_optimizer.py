@@ -0,0 +1,209 @@
+"""
+离线调优基准：用响应面代替真实实验驱动 OptiPlan.append_experiment，不占用 GPU。
+
+两种 oracle：
+- synthetic，surfaces.py 中的参数化吞吐量/延迟模型，已知网格上的真实最优值
+- recorded，读取已有输出目录（如 2-A100/）下的 log.txt，未测过的参数点
+  用最近的若干个实测点按距离加权插值，server 端统计取最近的实测点
+
+每个 策略 x 场景 x chunked 模式 报告：实验次数、达到最终最优所用的次数、
+相对真实最优的 regret、违反 TTFT/TPOT 约束的实验数。
+
+用法：
+  python benchmarks/bench_optimizer.py                         # 合成场景
+  python benchmarks/bench_optimizer.py --noise 0.05 --limit ttft_p99_limit=2000
+  python benchmarks/bench_optimizer.py --recorded 2-A100 --model Baichuan2-13B-Chat \\
+      --dataset sharegpt
+"""
+import argparse
+import contextlib
+import io
+import math
+import os
+import sys
+import time
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_process import extract_log  # noqa: E402
+from optimizer import OptiPlan, default_params  # noqa: E402
+from param_space import core_names  # noqa: E402
+from surrogate import make_strategy  # noqa: E402
+from surfaces import SCENARIOS, SyntheticSurface  # noqa: E402
+
+INTERP_KEYS = ["Request throughput (req/s)", "P99 TTFT (ms)", "P99 TPOT (ms)",
+               "Mean TTFT (ms)", "Mean TPOT (ms)", "Output token throughput (tok/s)",
+               "Total input tokens", "Total generated tokens"]
+
+
+class RecordedOracle:
+    """ 从 output_folder/model/dataset/num_prompts/<chunked>/<mns_mnbt_rr>/log.txt 回放实验 """
+
+    def __init__(self, folder, model, dataset, num_prompts, chunked_prefill, step_cfg,
+                 neighbors=4):
+        chunked_str = "enable_chunked" if chunked_prefill else "disable_chunked"
+        self.root = os.path.join(folder, model, dataset, str(num_prompts), chunked_str)
+        self.name = f"{model}/{dataset}"
+        self.step_cfg = step_cfg
+        self.neighbors = neighbors
+        self.points = {}
+        self.interpolated = 0
+        for name in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            log_path = os.path.join(self.root, name, "log.txt")
+            if not os.path.exists(log_path):
+                continue
+            params = tuple(self.parse_value(v) for v in name.split("_"))
+            try:
+                result = extract_log(log_path)
+            except Exception as e:
+                print(f"skip {log_path}: {e}", file=sys.stderr)
+                continue
+            if "Request throughput (req/s)" not in result[0]:
+                continue
+            self.points[params] = result
+        if not self.points:
+            raise RuntimeError(f"no log.txt found under {self.root}")
+
+    @staticmethod
+    def parse_value(value):
+        if value == "None":
+            return None
+        number = float(value)
+        return int(number) if number.is_integer() else number
+
+    def distance(self, a, b):
+        """ 按每个参数 bound 归一化后的欧氏距离 """
+        total = 0.0
+        for dim, name in enumerate(core_names):
+            if a[dim] is None or b[dim] is None:
+                continue
+            lo, hi = self.step_cfg[name]["bound"]
+            total += ((a[dim] - b[dim]) / (hi - lo)) ** 2
+        return math.sqrt(total)
+
+    def evaluate(self, mns, mnbt, rr):
+        params = (mns, mnbt, rr)
+        if params in self.points:
+            return self.points[params]
+        self.interpolated += 1
+        nearest = sorted(self.points, key=lambda p: self.distance(p, params))[:self.neighbors]
+        weights = [1.0 / max(self.distance(p, params), 1e-9) ** 2 for p in nearest]
+        total = sum(weights)
+        client_res = dict(self.points[nearest[0]][0])
+        for key in INTERP_KEYS:
+            if key in client_res:
+                client_res[key] = sum(w * self.points[p][0][key]
+                                      for p, w in zip(nearest, weights)) / total
+        _, server_run_df, server_res_df = self.points[nearest[0]]
+        return client_res, server_run_df, server_res_df
+
+    def grid_optimum(self, step_cfg, limits):
+        """ 实测点中满足约束的最大吞吐量 """
+        best, best_params = -1, None
+        for params, (client_res, _, _) in self.points.items():
+            if client_res["P99 TTFT (ms)"] > limits["ttft_p99_limit"] or \
+               client_res["P99 TPOT (ms)"] > limits["tpot_p99_limit"]:
+                continue
+            if client_res["Request throughput (req/s)"] > best:
+                best, best_params = client_res["Request throughput (req/s)"], list(params)
+        return best, best_params
+
+
+def run_search(oracle, chunked_prefill, step_cfg, limits, search_cfg, max_trials):
+    """ 与 vllm_experiment.opti_experiment 相同的串行调优循环 """
+    plan = OptiPlan(chunked_prefill, step_cfg, limits, make_strategy(search_cfg))
+    params = default_params(step_cfg)
+    flag = True
+    start = time.perf_counter()
+    # OptiPlan 的调试输出很多，基准中丢弃
+    with contextlib.redirect_stdout(io.StringIO()):
+        while flag and len(plan.history) < max_trials:
+            flag, *params = plan.append_experiment(list(params), *oracle.evaluate(*params))
+    elapsed = time.perf_counter() - start
+
+    evas = plan.eva_list.tolist()
+    best = max(evas)
+    return {
+        "trials": len(evas),
+        "to_best": evas.index(best) + 1,
+        "best": best,
+        "best_params": plan.input_params_list[plan.best_idx] if best > 0 else None,
+        "violations": sum(1 for e in evas if e < 0),
+        "seconds": elapsed,
+    }
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=os.path.join(root, "config.yaml"))
+    parser.add_argument("--strategies", default="heuristic,bayes")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--modes", default="disable,enable")
+    parser.add_argument("--noise", type=float, default=0.0)
+    parser.add_argument("--seeds", type=int, default=1)
+    parser.add_argument("--max-trials", type=int, default=100)
+    parser.add_argument("--limit", action="append", default=[],
+                        help="覆盖 limitation 中的值，如 ttft_p99_limit=2000")
+    parser.add_argument("--recorded", help="已有输出目录，如 2-A100")
+    parser.add_argument("--model")
+    parser.add_argument("--dataset")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    limits = dict(config["limitation"])
+    for item in args.limit:
+        key, value = item.split("=")
+        limits[key] = float(value)
+    num_prompts = config["params"]["num-prompts"]
+
+    rows = []
+    for mode in args.modes.split(","):
+        chunked_prefill = mode == "enable"
+        step_cfg = config["params"][mode + "_chunked_prefill"]
+        if args.recorded:
+            oracles = [RecordedOracle(args.recorded, args.model, args.dataset, num_prompts,
+                                      chunked_prefill, step_cfg)]
+        else:
+            oracles = [SyntheticSurface(name, num_prompts, args.noise, seed)
+                       for name in args.scenarios.split(",") for seed in range(args.seeds)]
+        for oracle in oracles:
+            optimum, optimum_params = oracle.grid_optimum(step_cfg, limits)
+            for strategy in args.strategies.split(","):
+                search_cfg = dict(config.get("search") or {})
+                search_cfg["strategy"] = strategy
+                res = run_search(oracle, chunked_prefill, step_cfg, limits, search_cfg,
+                                 args.max_trials)
+                regret = (optimum - max(res["best"], 0)) / optimum if optimum > 0 else 0.0
+                rows.append((oracle.name, mode, strategy, res, regret, optimum, optimum_params))
+            if args.recorded:
+                print(f"{oracle.name} {mode}: {len(oracle.points)} recorded points, "
+                      f"{oracle.interpolated} interpolated evaluations")
+
+    print(f"limits: ttft_p99 {limits['ttft_p99_limit']} ms, tpot_p99 {limits['tpot_p99_limit']} ms, "
+          f"noise {args.noise}")
+    print(f"{'scenario':<16}{'mode':<9}{'strategy':<11}{'trials':>7}{'to_best':>8}"
+          f"{'violate':>8}{'best':>9}{'optimum':>9}{'regret':>8}{'time':>8}   best params")
+    for name, mode, strategy, res, regret, optimum, optimum_params in rows:
+        print(f"{name:<16}{mode:<9}{strategy:<11}{res['trials']:>7}{res['to_best']:>8}"
+              f"{res['violations']:>8}{res['best']:>9.2f}{optimum:>9.2f}{regret:>7.1%}"
+              f"{res['seconds']:>7.2f}s   {res['best_params']} (optimum {optimum_params})")
+
+    # 按策略汇总
+    print()
+    for strategy in args.strategies.split(","):
+        sel = [r for r in rows if r[2] == strategy]
+        if not sel:
+            continue
+        n = len(sel)
+        print(f"{strategy:<11} mean trials {sum(r[3]['trials'] for r in sel) / n:6.1f}   "
+              f"mean to_best {sum(r[3]['to_best'] for r in sel) / n:6.1f}   "
+              f"mean regret {sum(r[4] for r in sel) / n:6.1%}   "
+              f"violations {sum(r[3]['violations'] for r in sel)}")
+
+
+if __name__ == "__main__":
+    main()
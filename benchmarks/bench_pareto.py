@@ -0,0 +1,107 @@
+"""
+Pareto 前沿调优（pareto.ParetoStrategy）的离线基准，用合成响应面代替真实实验。
+
+对每个 场景 x chunked 模式：
+- pareto，一次调优得到 (吞吐量, P99 TTFT, P99 TPOT) 前沿，再对每组 SLO 从前沿中取最优参数
+- per-SLO，每组 SLO 分别用 --strategy（默认 heuristic）调优一次
+对比总实验次数，以及每组 SLO 下所选参数相对网格真实最优的 regret（超限记为 100%）。
+
+用法：
+  python benchmarks/bench_pareto.py
+  python benchmarks/bench_pareto.py --ttft 1000,3000,6000 --tpot 60,100,200 --max-trials 40
+"""
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+import yaml
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from optimizer import OptiPlan, default_params  # noqa: E402
+from pareto import best_under  # noqa: E402
+from surrogate import make_strategy  # noqa: E402
+from surfaces import SCENARIOS, SyntheticSurface  # noqa: E402
+
+
+def search(surface, chunked_prefill, step_cfg, limits, search_cfg):
+    """ 与 vllm_experiment.search 相同的串行调优循环 """
+    plan = OptiPlan(chunked_prefill, step_cfg, limits, make_strategy(search_cfg))
+    params = default_params(step_cfg)
+    flag = True
+    with contextlib.redirect_stdout(io.StringIO()):
+        while flag:
+            flag, *params = plan.append_experiment(list(params), *surface.evaluate(*params))
+    return plan
+
+
+def regret(surface, params, limits, optimum):
+    """ 所选参数在无噪声响应面上的 regret，超限为 1 """
+    if params is None or optimum <= 0:
+        return 1.0 if optimum > 0 else 0.0
+    m = surface.model(*params)
+    if m["ttft"] > limits["ttft_p99_limit"] or m["tpot99"] > limits["tpot_p99_limit"]:
+        return 1.0
+    return max(optimum - m["thr"], 0.0) / optimum
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--config", default=os.path.join(root, "config.yaml"))
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--ttft", default="1000,3000,6000")
+    parser.add_argument("--tpot", default="60,100,200")
+    parser.add_argument("--strategy", default="heuristic", help="per-SLO 调优使用的策略")
+    parser.add_argument("--max-trials", type=int, default=40)
+    parser.add_argument("--noise", type=float, default=0.0)
+    args = parser.parse_args()
+    with open(args.config) as f:
+        config = yaml.safe_load(f)
+    num_prompts = config["params"]["num-prompts"]
+    slos = [(float(t), float(p)) for t in args.ttft.split(",") for p in args.tpot.split(",")]
+    pareto_cfg = {"strategy": "pareto", "max_trials": args.max_trials,
+                  "ttft_max": max(t for t, _ in slos), "tpot_max": max(p for _, p in slos)}
+    single_cfg = dict(config.get("search") or {}, strategy=args.strategy)
+
+    print(f"{len(slos)} SLOs: TTFT {args.ttft} ms x TPOT {args.tpot} ms")
+    print(f"{'scenario':<14}{'mode':<9}{'pareto trials':>14}{'front':>7}{'regret':>8}"
+          f"{'per-SLO trials':>16}{'regret':>8}")
+    totals = {"pareto": [0, []], "single": [0, []]}
+    for scenario in args.scenarios.split(","):
+        surface = SyntheticSurface(scenario, num_prompts, args.noise)
+        for mode in ("disable", "enable"):
+            chunked_prefill = mode == "enable"
+            step_cfg = config["params"][mode + "_chunked_prefill"]
+            base = dict(config["limitation"])
+            plan = search(surface, chunked_prefill, step_cfg, base, pareto_cfg)
+            rows = plan.strategy.rows(plan)
+            pareto_regret, single_regret, single_trials = [], [], 0
+            for ttft, tpot in slos:
+                limits = dict(base, ttft_p99_limit=ttft, tpot_p99_limit=tpot)
+                optimum, _ = surface.grid_optimum(step_cfg, limits)
+                best = best_under(rows, ttft, tpot)
+                params = plan.space.from_named(best["params"]) if best else None
+                pareto_regret.append(regret(surface, params, limits, optimum))
+                single = search(surface, chunked_prefill, step_cfg, limits, single_cfg)
+                single_trials += len(single.history)
+                params = single.input_params_list[single.best_idx] \
+                    if single.best_throughput > 0 else None
+                single_regret.append(regret(surface, params, limits, optimum))
+            totals["pareto"][0] += len(plan.history)
+            totals["pareto"][1] += pareto_regret
+            totals["single"][0] += single_trials
+            totals["single"][1] += single_regret
+            print(f"{scenario:<14}{mode:<9}{len(plan.history):>14}{len(rows):>7}"
+                  f"{sum(pareto_regret) / len(slos):>7.1%}{single_trials:>16}"
+                  f"{sum(single_regret) / len(slos):>7.1%}")
+    for name, label in (("pareto", "pareto (one sweep)"), ("single", f"{args.strategy} per SLO")):
+        trials, regrets = totals[name]
+        print(f"{label:<22} {trials:>5} trials, mean regret {sum(regrets) / len(regrets):.1%}, "
+              f"infeasible picks {sum(r == 1.0 for r in regrets)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+每次 item_test 的环境准备耗时（set_env + post_handle 关闭）：独立连接 vs SSHPool。
+
+--handshake-delay 可以为每次新建 TCP 连接加上模拟的广域网握手耗时。
+最后检查一个握手很慢的主机不阻塞同时连接其他主机（SSHPool 按主机加锁）。
+
+用法：python benchmarks/bench_pool_setup.py [--trials 20] [--handshake-delay 0.1]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_server import LocalSSHServer  # noqa: E402
+from ssh_tools import SSHManager, SSHPool  # noqa: E402
+
+SERVER_PRE_CMDS = ["cd /tmp", "export VLLM_SCHEDULER_PROFILE=true",
+                   "export VLLM_WORKER_MULTIPROC_METHOD=spawn"]
+CLIENT_PRE_CMDS = ["cd /tmp"]
+
+
+def one_trial(server, pool):
+    t0 = time.perf_counter()
+    server_ssh = SSHManager("127.0.0.1", server.username, server.password, "[server]:",
+                            server.port, server.prompt, pool=pool)
+    client_ssh = SSHManager("127.0.0.1", server.username, server.password, "[client]:",
+                            server.port, server.prompt, pool=pool)
+    for cmd in SERVER_PRE_CMDS:
+        server_ssh.execute_command(cmd, max_duration=3)
+    for cmd in CLIENT_PRE_CMDS:
+        client_ssh.execute_command(cmd, max_duration=3)
+    client_ssh.sftp.listdir("/")
+    setup = time.perf_counter() - t0
+    server_ssh.close()
+    client_ssh.close()
+    return setup
+
+
+def slow_host(delay=1.0):
+    """ 慢主机握手期间连接快主机，快主机的耗时不应包含慢主机的握手 """
+    slow = LocalSSHServer(handshake_delay=delay)
+    fast = LocalSSHServer()
+    pool = SSHPool()
+    elapsed = {}
+
+    def connect(name, server):
+        t0 = time.perf_counter()
+        pool.get_client("127.0.0.1", server.port, server.username, server.password)
+        elapsed[name] = time.perf_counter() - t0
+    try:
+        threads = [threading.Thread(target=connect, args=("slow", slow))]
+        threads[0].start()
+        time.sleep(0.1)
+        threads.append(threading.Thread(target=connect, args=("fast", fast)))
+        threads[1].start()
+        for t in threads:
+            t.join()
+        # 同一主机再次获取：复用已有连接
+        connect("fast again", fast)
+    finally:
+        pool.close()
+        slow.close()
+        fast.close()
+    print(f"slow host ({delay}s handshake) {1000 * elapsed['slow']:.0f} ms, "
+          f"concurrent fast host {1000 * elapsed['fast']:.0f} ms, "
+          f"pooled {1000 * elapsed['fast again']:.1f} ms")
+    assert elapsed["fast"] < delay / 2, elapsed
+    assert fast.state.connections == 1, fast.state.connections
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--handshake-delay", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = LocalSSHServer(handshake_delay=args.handshake_delay)
+    results = {}
+    try:
+        import contextlib
+        import io
+        for name, pool in (("no pool", None), ("SSHPool", SSHPool())):
+            before = server.state.connections
+            with contextlib.redirect_stdout(io.StringIO()):
+                samples = [one_trial(server, pool) for _ in range(args.trials)]
+            results[name] = (samples, server.state.connections - before)
+            if pool is not None:
+                pool.close()
+    finally:
+        server.close()
+
+    print(f"{args.trials} trials, handshake delay {args.handshake_delay}s")
+    for name, (samples, conns) in results.items():
+        print(f"{name:<8} first {1000 * samples[0]:8.1f} ms   "
+              f"mean {1000 * sum(samples) / len(samples):8.1f} ms   "
+              f"rest mean {1000 * sum(samples[1:]) / max(1, len(samples) - 1):8.1f} ms   "
+              f"TCP connections {conns}")
+    slow_host()
+
+
+if __name__ == "__main__":
+    main()
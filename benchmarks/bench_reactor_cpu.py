@@ -0,0 +1,155 @@
+"""
+server 输出 drain 的 CPU 占用对比：每个 channel 一个轮询线程（interval=0）vs 共用 reactor。
+
+本地 SSH 替身在子进程中运行，只统计本进程（SSHManager、paramiko Transport、drain）的 CPU 时间。
+1. 空闲：N 个 server 会话都没有输出时的 CPU 占用。
+2. 刷屏：N 个 server 会话同时高速打印日志时的吞吐量、每 MB 的 CPU 时间、最大积压和反压次数。
+3. 多会话：32 个会话同时刷屏，分几个时间窗检查每个 channel 都在持续被读取（没有饿死或死锁）。
+
+用法：python benchmarks/bench_reactor_cpu.py [--seconds 3]
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from ssh_tools import SSHManager, SSHPool  # noqa: E402
+
+
+def serve(conn, log_rate):
+    from local_server import LocalSSHServer
+    server = LocalSSHServer(server_log_rate=log_rate, launch_delay=0.05)
+    conn.send((server.port, server.username, server.password, server.prompt))
+    conn.recv()
+    server.close()
+
+
+def cpu_time():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Sessions:
+    """ 子进程中的替身服务端 + n 个正在运行 api_server 的 server 会话 """
+
+    def __init__(self, n, log_rate):
+        self.conn, child = multiprocessing.Pipe()
+        self.proc = multiprocessing.Process(target=serve, args=(child, log_rate), daemon=True)
+        self.proc.start()
+        port, username, password, prompt = self.conn.recv()
+        self.pool = SSHPool()
+        self.managers = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i in range(n):
+                ssh = SSHManager("127.0.0.1", username, password, f"[server{i}]:", port, prompt,
+                                 pool=self.pool)
+                ssh.execute_command_async("python -m vllm.entrypoints.openai.api_server "
+                                          f"--port {9000 + i}")
+                ssh.read_until_prompt("Uvicorn running on")
+                self.managers.append(ssh)
+
+    def start(self, shared):
+        self.names = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ssh in self.managers:
+                ssh.reset_stats()
+                self.names.append(ssh.start_recv_thread(shared=shared))
+
+    def stop(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ssh, name in zip(self.managers, self.names):
+                ssh.stop_thread(name)
+
+    def close(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            for ssh in self.managers:
+                ssh.close()
+            self.pool.close()
+        self.conn.send("stop")
+        self.proc.join(5)
+
+    def bytes(self):
+        return [ssh.stats.bytes for ssh in self.managers]
+
+
+def measure(n, log_rate, shared, seconds):
+    sessions = Sessions(n, log_rate)
+    try:
+        sessions.start(shared)
+        time.sleep(0.5)
+        b0, c0, t0 = sum(sessions.bytes()), cpu_time(), time.time()
+        time.sleep(seconds)
+        b1, c1, t1 = sum(sessions.bytes()), cpu_time(), time.time()
+        sessions.stop()
+        stats = [ssh.stats for ssh in sessions.managers]
+        return {"cpu": (c1 - c0) / (t1 - t0), "mb_s": (b1 - b0) / (t1 - t0) / 2**20,
+                "cpu_per_mb": (c1 - c0) / max((b1 - b0) / 2**20, 1e-9),
+                "backlog": max(s.backlog_max for s in stats),
+                "backpressure": sum(s.backpressure for s in stats)}
+    finally:
+        sessions.close()
+
+
+def report(name, r, flood):
+    line = f"  {name:<22} CPU {r['cpu']:6.1%}"
+    if flood:
+        line += (f"   {r['mb_s']:6.1f} MB/s   {1000 * r['cpu_per_mb']:6.1f} ms CPU/MB   "
+                 f"backlog max {r['backlog'] / 1024:6.0f} KB   backpressure {r['backpressure']}")
+    print(line)
+
+
+def check_many(n, log_rate, seconds):
+    """ n 个会话同时刷屏，每个时间窗内每个 channel 都有新数据被读走 """
+    sessions = Sessions(n, log_rate)
+    try:
+        sessions.start(True)
+        windows = []
+        last = sessions.bytes()
+        for _ in range(3):
+            time.sleep(seconds / 3)
+            now = sessions.bytes()
+            windows.append(min(b - a for a, b in zip(last, now)))
+            last = now
+        sessions.stop()
+        assert all(w > 0 for w in windows), windows
+        print(f"  {n} sessions: every channel drained in each of {len(windows)} windows, "
+              f"min per-channel bytes per window {min(windows)}")
+    finally:
+        sessions.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+    print(f"CPU cores: {os.cpu_count()}")
+
+    print("idle (server running, no output):")
+    for n in (1, 8):
+        legacy = measure(n, 0, False, args.seconds)
+        shared = measure(n, 0, True, args.seconds)
+        report(f"{n} x thread interval=0", legacy, False)
+        report(f"{n} x reactor", shared, False)
+        assert shared["cpu"] < 0.05, shared
+
+    print("flood (server log lines every 10ms):")
+    for n, rate in ((1, 400), (8, 50)):
+        legacy = measure(n, rate, False, args.seconds)
+        shared = measure(n, rate, True, args.seconds)
+        report(f"{n} x thread interval=0", legacy, True)
+        report(f"{n} x reactor", shared, True)
+        assert shared["backpressure"] == 0, shared
+
+    print("many sessions:")
+    check_many(32, 10, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
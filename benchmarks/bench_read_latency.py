@@ -0,0 +1,84 @@
+"""
+read_until_prompt 单条命令往返延迟对比：旧的 sleep 轮询 vs select 唤醒。
+
+用法：python benchmarks/bench_read_latency.py [--rounds 20]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_server import LocalSSHServer  # noqa: E402
+from ssh_tools import SSHManager  # noqa: E402
+
+
+def legacy_read_until_prompt(manager, prompt, max_duration=3600, once_max_wait=360,
+                             buffer_size=1024, interval=1):
+    """改动前的实现：recv_ready 为假时 sleep(interval)"""
+    channel = manager.channel
+    output = ''
+    buffer = b''
+    start_time = time.time()
+    last_recv_time = start_time
+    while time.time() - start_time < max_duration:
+        while not channel.recv_ready():
+            time.sleep(interval)
+            if time.time() - last_recv_time >= once_max_wait:
+                return output
+        buffer += channel.recv(buffer_size)
+        last_recv_time = time.time()
+        try:
+            recv = buffer.decode('utf-8')
+            buffer = b''
+        except UnicodeDecodeError:
+            continue
+        output += recv
+        if prompt and prompt in output:
+            break
+    return output
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+
+def report(name, samples):
+    print(f"{name:<28} mean {1000 * sum(samples) / len(samples):9.2f} ms   "
+          f"p50 {1000 * percentile(samples, 50):9.2f} ms   "
+          f"p99 {1000 * percentile(samples, 99):9.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    server = LocalSSHServer()
+    manager = SSHManager("127.0.0.1", server.username, server.password, "[bench]:",
+                         server.port, server.prompt)
+    try:
+        legacy, current = [], []
+        for i in range(args.rounds):
+            t0 = time.perf_counter()
+            manager.channel.send(f"echo legacy {i}\r")
+            legacy_read_until_prompt(manager, manager.final_prompt)
+            legacy.append(time.perf_counter() - t0)
+
+            t0 = time.perf_counter()
+            manager.channel.send(f"echo select {i}\r")
+            manager.read_until_prompt(manager.final_prompt)
+            current.append(time.perf_counter() - t0)
+
+        print(f"\n{args.rounds} rounds of `echo` against local stand-in on port {server.port}")
+        report("sleep polling (interval=1)", legacy)
+        report("select wakeup", current)
+    finally:
+        manager.close()
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
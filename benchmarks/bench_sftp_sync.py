@@ -0,0 +1,123 @@
+"""
+download_directory 同步耗时：改动前的逐个 sftp.get vs SFTPSync（并发、增量、tar 流）。
+
+远端目录由本地 SFTP 替身提供，默认包含 3000 个小文件和 3 个 16MB 大文件。
+
+用法：python benchmarks/bench_sftp_sync.py [--small 3000] [--large 3] [--large-mb 16]
+"""
+import argparse
+import contextlib
+import io
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from local_server import LocalSSHServer  # noqa: E402
+from ssh_tools import SSHManager  # noqa: E402
+from sftp_sync import SFTPSync  # noqa: E402
+
+
+def legacy_download_directory(sftp, remote_dir, local_dir):
+    """改动前的实现：递归遍历，单个 SFTP channel 逐个下载"""
+    os.makedirs(local_dir, exist_ok=True)
+    for entry in sftp.listdir_attr(remote_dir):
+        remote_path = os.path.join(remote_dir, entry.filename)
+        local_path = os.path.join(local_dir, entry.filename)
+        if stat.S_ISDIR(entry.st_mode):
+            legacy_download_directory(sftp, remote_path, local_path)
+        else:
+            sftp.get(remote_path, local_path)
+
+
+def make_tree(root, small, large, large_mb):
+    for i in range(small):
+        folder = os.path.join(root, "vllm_test", f"d{i % 30}")
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, f"f{i}.json"), "w") as f:
+            f.write('{"step": %d, "waiting": 3, "running": 64}\n' % i * 20)
+    for i in range(large):
+        with open(os.path.join(root, "vllm_test", f"profile{i}.bin"), "wb") as f:
+            f.write(os.urandom(large_mb * 2**20))
+
+
+def timed(name, fn):
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+    print(f"{name:<34} {elapsed:8.2f} s   {result if result is not None else ''}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--small", type=int, default=3000)
+    parser.add_argument("--large", type=int, default=3)
+    parser.add_argument("--large-mb", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    out = tempfile.mkdtemp()
+    make_tree(root, args.small, args.large, args.large_mb)
+    server = LocalSSHServer()
+    with contextlib.redirect_stdout(io.StringIO()):
+        manager = SSHManager("127.0.0.1", server.username, server.password, "[bench]:",
+                             server.port, server.prompt)
+    remote = root + "/vllm_test"
+    try:
+        print(f"{args.small} small files + {args.large} x {args.large_mb}MB, "
+              f"{args.workers} workers")
+        timed("legacy sequential sftp.get",
+              lambda: legacy_download_directory(manager.sftp, remote, out + "/legacy"))
+
+        sync = SFTPSync(manager.ssh, workers=args.workers)
+        summary = lambda s: f"files={s['files']} skipped={s['skipped']} removed={s['removed']} " \
+                            f"tar={s['tar']}"  # noqa
+        timed("SFTPSync sftp, cold",
+              lambda: summary(sync.sync(remote, out + "/sftp", mode='sftp')))
+        timed("SFTPSync sftp, warm (no changes)",
+              lambda: summary(sync.sync(remote, out + "/sftp", mode='sftp')))
+        # 修改一个大文件和 10 个小文件
+        with open(os.path.join(root, "vllm_test", "profile0.bin"), "ab") as f:
+            f.write(b"x")
+        for i in range(10):
+            with open(os.path.join(root, "vllm_test", f"d{i % 30}", f"f{i}.json"), "a") as f:
+                f.write("changed\n")
+        timed("SFTPSync sftp, 11 files changed",
+              lambda: summary(sync.sync(remote, out + "/sftp", mode='sftp')))
+        # 远端删除 5 个文件、改名 1 个：镜像中同步删除，不会被带到之后的实验目录
+        for i in range(10, 15):
+            os.remove(os.path.join(root, "vllm_test", f"d{i % 30}", f"f{i}.json"))
+        os.rename(os.path.join(root, "vllm_test", "d15", "f15.json"),
+                  os.path.join(root, "vllm_test", "d15", "g15.json"))
+        # 默认不删除本地文件（如实验目录中的 log.txt），prune=True 时镜像与远端一致
+        with open(os.path.join(out, "sftp", "log.txt"), "w") as f:
+            f.write("local only\n")
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync.sync(remote, out + "/sftp", mode='sftp')
+        assert os.path.exists(os.path.join(out, "sftp", "log.txt"))
+        assert os.path.exists(os.path.join(out, "sftp", "d15", "f15.json"))
+        timed("SFTPSync sftp, 6 removed, prune",
+              lambda: summary(sync.sync(remote, out + "/sftp", mode='sftp', prune=True)))
+        mirror = sorted(os.path.relpath(os.path.join(r, n), out + "/sftp")
+                        for r, _, names in os.walk(out + "/sftp") for n in names)
+        expect = sorted(os.path.relpath(os.path.join(r, n), remote)
+                        for r, _, names in os.walk(remote) for n in names)
+        assert mirror == expect, set(mirror) ^ set(expect)
+        timed("SFTPSync tar stream, cold",
+              lambda: summary(sync.sync(remote, out + "/tar", mode='tar')))
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            manager.close()
+        server.close()
+        shutil.rmtree(root)
+        shutil.rmtree(out)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+read_until_prompt 长时间流式读取的吞吐：旧的整串拼接+全量查找 vs StreamMatcher。
+
+用一个内存中的假 channel 回放合成的 vLLM 日志（含跨 recv 截断的多字节字符），
+prompt 只出现在日志末尾。旧实现是二次复杂度，只在较小的数据量上运行。
+
+用法：python benchmarks/bench_stream_match.py [--mb 256] [--legacy-mb 4]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from io_stats import ChannelStats  # noqa: E402
+from ssh_tools import SSHManager  # noqa: E402
+
+LOG_LINES = [
+    "INFO 05-01 12:00:00 metrics.py:334] Avg prompt throughput: 812.3 tokens/s, Avg generation "
+    "throughput: 1532.9 tokens/s, Running: 64 reqs, Swapped: 0 reqs, Pending: 12 reqs, "
+    "GPU KV cache usage: 41.2%, CPU KV cache usage: 0.0%.\r\n",
+    'INFO:     127.0.0.1:51234 - "POST /v1/completions HTTP/1.1" 200 OK\r\n',
+    "INFO 05-01 12:00:01 async_llm_engine.py:120] Finished request cmpl-7f3a. 输出完成\r\n",
+]
+
+
+def synthetic_log(size):
+    block = "".join(LOG_LINES).encode("utf-8")
+    data = block * (size // len(block) + 1)
+    return data[:size] + b"\r\n# "
+
+
+class FakeChannel:
+    """按 buffer_size 切片回放字节流，recv_ready 恒为真"""
+
+    def __init__(self, data):
+        self.data = memoryview(data)
+        self.pos = 0
+        self.closed = False
+        self.eof_received = False
+
+    def recv_ready(self):
+        return self.pos < len(self.data)
+
+    def recv_stderr_ready(self):
+        return False
+
+    def recv(self, n):
+        chunk = self.data[self.pos:self.pos + n].tobytes()
+        self.pos += n
+        return chunk
+
+
+def make_manager(data):
+    manager = SSHManager.__new__(SSHManager)
+    manager.ssh_name = "[bench]:"
+    manager.ssh = None
+    manager.stats = ChannelStats("bench")
+    manager.channel = FakeChannel(data)
+    return manager
+
+
+def legacy_read(channel, prompt, buffer_size=1024):
+    """改动前的读取核心：整串拼接，对整个 buffer 重试解码，对整个 output 查找 prompt"""
+    output = ''
+    buffer = b''
+    while channel.recv_ready():
+        buffer += channel.recv(buffer_size)
+        try:
+            recv = buffer.decode('utf-8')
+            buffer = b''
+        except UnicodeDecodeError:
+            continue
+        output += recv
+        if prompt and prompt in output:
+            break
+    return output
+
+
+def run(name, size, fn):
+    data = synthetic_log(size)
+    t0 = time.perf_counter()
+    output = fn(data)
+    elapsed = time.perf_counter() - t0
+    assert output.endswith("# "), name
+    print(f"{name:<18} {size / 2**20:8.1f} MB  {elapsed:8.2f} s  "
+          f"{size / 2**20 / elapsed:9.1f} MB/s")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=256)
+    parser.add_argument("--legacy-mb", type=int, default=4)
+    args = parser.parse_args()
+
+    for mb in (args.legacy_mb // 2, args.legacy_mb):
+        run("legacy", mb * 2**20, lambda d: legacy_read(FakeChannel(d), "# "))
+    for mb in (args.legacy_mb, args.mb):
+        run("StreamMatcher", mb * 2**20,
+            lambda d: make_manager(d).read_until_prompt("# ", max_duration=86400))
+
+
+if __name__ == "__main__":
+    main()
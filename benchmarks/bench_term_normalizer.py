@@ -0,0 +1,122 @@
+"""
+client 输出整理的内存与耗时：旧流程（read_until_prompt 把整个输出留在内存，结束后 handle_r_str）
+vs 边读边整理的 TermNormalizer（逐行写入 log.txt）。
+
+模拟 benchmark_serving2.py 在 pty 中的输出：带自动换行的命令回显、tqdm 进度条（\\r 覆盖、
+隐藏光标等 ANSI 序列）、带颜色的日志行、最终结果表和 shell 提示符，按 1024 字节切块后
+经 StreamMatcher 增量解码输入。不同进度条更新次数（对应运行时长）下用 tracemalloc 统计峰值内存，
+并校验两种方式解析出的 client 结果一致、输出中没有残留的控制序列。
+
+用法：python benchmarks/bench_term_normalizer.py [--updates 10000,100000,400000]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_process import TermNormalizer, handle_r_str, parse_text  # noqa: E402
+from ssh_tools import StreamMatcher  # noqa: E402
+from surfaces import SyntheticSurface, format_log  # noqa: E402
+
+PROMPT = "root@a100:~/work# "
+COMMAND = "python benchmark_serving2.py --backend vllm --trust-remote-code --model " \
+          "/data/models/Llama-2-13b-chat-hf --dataset-name sharegpt --dataset-path " \
+          "/data/datasets/ShareGPT_V3_unfiltered_cleaned_split.json --num-prompts=2000 " \
+          "--request-rate=8 --host 127.0.0.1 --port 8000"
+
+
+def pty_text(text):
+    return text.replace("\n", "\r\n")
+
+
+def stream_pieces(updates, total=2000):
+    """ 按时间顺序产生终端输出片段，不在内存中拼出完整输出 """
+    # 回显：readline 在 80 列处插入 " \r" 强制换行
+    yield "\r\n".join(COMMAND[i:i + 80] for i in range(0, len(COMMAND), 80)).replace(
+        "\r\n", " \r") + "\r\n"
+    yield pty_text("\x1b[32mINFO\x1b[0m Namespace(backend='vllm', request_rate=8.0)\n")
+    yield "\x1b[?25l"
+    for i in range(updates):
+        done = i * total // updates
+        bar = "█" * (done * 40 // total)
+        yield f"\r{done * 100 // total:3d}%|{bar:<40}| {done}/{total} " \
+              f"[{i // 60:02d}:{i % 60:02d}<00:00, {8 + i % 7 / 10:.2f}it/s]\x1b[K"
+    yield f"\r100%|{chr(0x2588) * 40}| {total}/{total} [59:59<00:00, 8.00it/s]\r\n\x1b[?25h"
+    client = format_log(*SyntheticSurface("13b-sharegpt").evaluate(256, None, 8))
+    yield pty_text(client.split("data split")[0])
+    yield PROMPT
+
+
+def chunks(updates, size=1024):
+    buf = b""
+    for piece in stream_pieces(updates):
+        buf += piece.encode("utf-8")
+        while len(buf) >= size:
+            yield buf[:size]
+            buf = buf[size:]
+    if buf:
+        yield buf
+
+
+def legacy(updates, log_path):
+    matcher = StreamMatcher(PROMPT)
+    for data in chunks(updates):
+        matcher.feed(data)
+    with open(log_path, "w", encoding="utf-8") as f:
+        f.writelines(handle_r_str(matcher.getvalue()))
+
+
+def streaming(updates, log_path):
+    matcher = StreamMatcher(PROMPT, keep=False)
+    with open(log_path, "w", encoding="utf-8") as f:
+        normalizer = TermNormalizer(f.write, echo=COMMAND, prompt=PROMPT)
+        for data in chunks(updates):
+            normalizer.feed(matcher.feed(data))
+        normalizer.close()
+
+
+def measure(fn, updates, log_path):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(updates, log_path)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    with open(log_path, encoding="utf-8") as f:
+        text = f.read()
+    return elapsed, peak, text
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--updates", default="10000,100000,400000")
+    args = parser.parse_args()
+
+    folder = tempfile.mkdtemp(prefix="bench_term_")
+    try:
+        print(f"{'updates':>8}{'raw MB':>9}{'legacy peak':>14}{'stream peak':>14}"
+              f"{'legacy s':>10}{'stream s':>10}{'lines':>7}")
+        for updates in [int(v) for v in args.updates.split(",")]:
+            raw = sum(len(c) for c in chunks(updates))
+            t_old, peak_old, old = measure(legacy, updates, os.path.join(folder, "old.txt"))
+            t_new, peak_new, new = measure(streaming, updates, os.path.join(folder, "new.txt"))
+
+            assert parse_text(old + "data split\n").client_res == \
+                parse_text(new + "data split\n").client_res
+            assert "\x1b" not in new and "\r" not in new
+            assert "benchmark_serving2" not in new and PROMPT.strip() not in new
+            print(f"{updates:>8}{raw / 2**20:>9.1f}{peak_old / 2**20:>11.2f} MB"
+                  f"{peak_new / 2**20:>11.3f} MB{t_old:>10.2f}{t_new:>10.2f}"
+                  f"{new.count(chr(10)):>7}")
+        print("client results identical, no control sequences / echo / prompt in output")
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
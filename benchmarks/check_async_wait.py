@@ -0,0 +1,110 @@
+"""
+AsyncSSHManager 多个协程同时等待同一 channel 的本地检查，用 os.pipe 模拟 paramiko channel。
+
+1. read_until_prompt 等待时另一个协程也调用 wait_readable：数据到达时两者都被唤醒，
+   read_until_prompt 不会等到 interval 才发现数据。
+2. 其中一个等待超时退出：另一个的等待仍然有效。
+3. 等待结束后事件循环上不留 reader。
+4. stream 读取 stderr：有未读的 stderr 时不会空转，stderr 与 stdout 一并输出。
+
+用法：python benchmarks/check_async_wait.py
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from async_ssh_tools import AsyncSSHManager  # noqa: E402
+from check_reactor import PipeChannel  # noqa: E402
+
+
+class StderrChannel(PipeChannel):
+    """ stderr 数据放在单独的缓冲中，paramiko 在其中有数据时 recv_stderr_ready 为 True """
+
+    def __init__(self):
+        super().__init__()
+        self.err = b""
+
+    def send_stderr(self, data):
+        self.err += data
+
+    def recv_stderr_ready(self):
+        return bool(self.err)
+
+    def recv_stderr(self, size):
+        data, self.err = self.err[:size], self.err[size:]
+        return data
+
+
+async def run():
+    loop = asyncio.get_running_loop()
+    manager = AsyncSSHManager("127.0.0.1", "root", "pw", "[fake]", final_prompt="# ")
+    manager.channel = PipeChannel()
+    fd = manager.channel.fileno()
+    # interval 远大于期望的唤醒延迟，只有被 reader 唤醒时才能及时读到
+    interval = 5
+
+    # 1. 两个等待者同时等待，数据到达时都被唤醒
+    t0 = time.perf_counter()
+    reading = asyncio.ensure_future(manager.read_until_prompt("# ", interval=interval))
+    waiting = asyncio.ensure_future(manager.wait_readable(interval))
+    await asyncio.sleep(0.05)
+    manager.channel.send(b"out\r\n# ")
+    text = await asyncio.wait_for(reading, interval)
+    woke = await asyncio.wait_for(waiting, interval)
+    elapsed = time.perf_counter() - t0
+    assert text == "out\r\n# ", text
+    assert woke is True
+    assert elapsed < 1, elapsed
+    assert not loop.remove_reader(fd), "reader left on the event loop"
+    print(f"two waiters on one channel: both woke, prompt read in {elapsed * 1000:.0f} ms")
+
+    # 2. 一个等待者超时，另一个继续等待
+    t0 = time.perf_counter()
+    reading = asyncio.ensure_future(manager.read_until_prompt("# ", interval=interval))
+    await asyncio.sleep(0.02)
+    assert await manager.wait_readable(0.05) is False
+    manager.channel.send(b"more\r\n# ")
+    text = await asyncio.wait_for(reading, interval)
+    elapsed = time.perf_counter() - t0
+    assert text == "more\r\n# ", text
+    assert elapsed < 1, elapsed
+    assert not loop.remove_reader(fd), "reader left on the event loop"
+    print(f"one waiter timed out: the other still woke, prompt read in {elapsed * 1000:.0f} ms")
+    manager.channel.close()
+
+    # 4. 未读的 stderr 让 wait_readable 立即返回，stream 必须把它读走
+    manager.channel = StderrChannel()
+    manager.channel.send_stderr(b"oops\n")
+    waits = 0
+    wait_readable = manager.wait_readable
+
+    async def counting_wait(timeout):
+        nonlocal waits
+        waits += 1
+        return await wait_readable(timeout)
+    manager.wait_readable = counting_wait
+
+    async def collect():
+        return b"".join([data async for data in manager.stream(decode=False)])
+    collecting = asyncio.ensure_future(collect())
+    await asyncio.sleep(0.05)
+    manager.channel.send(b"out\n")
+    await asyncio.sleep(0.05)
+    manager.channel.close()
+    data = await asyncio.wait_for(collecting, interval)
+    assert b"oops" in data and b"out" in data, data
+    assert waits < 10, waits
+    print(f"stderr in stream: forwarded with stdout, {waits} waits in 100 ms")
+
+
+def main():
+    asyncio.run(run())
+    print("async wait checks passed")
+
+
+if __name__ == "__main__":
+    main()
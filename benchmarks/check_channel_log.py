@@ -0,0 +1,85 @@
+"""
+ChannelLog（channel_log.py）的本地检查。
+
+1. wait_for：环形缓冲已挤出 since 之后的部分字节时，返回的偏移仍是 pattern 末尾的绝对偏移，
+   用它作为下一次 wait_for 的 since 不会跳过或重复匹配。
+2. 轮转：小 rotate_size 写出多个分段（轮转处截断 UTF-8 字符），parse_log 以前缀或任一分段为参数
+   都按顺序读取全部分段，得到与未轮转时相同的 server 统计。
+
+用法：python benchmarks/check_channel_log.py
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from channel_log import ChannelLog, log_parts, read_log  # noqa: E402
+from local_server import SERVER_RES_LINES, SERVER_RUN_LINES  # noqa: E402
+from log_process import parse_log  # noqa: E402
+
+
+def check_wait_for(out):
+    log = ChannelLog(os.path.join(out, "ring"), ring_size=1000)
+    filler = b"x" * 99 + b"\n"
+    for _ in range(5):
+        log.feed(filler)
+    since = log.total_bytes
+    # since 之后先写入 2000 字节，ring 只保留最近的约 1000 字节
+    for _ in range(20):
+        log.feed(filler)
+    log.feed(b"MARK-1 ")
+    log.feed(b"tail ")
+    log.feed(b"MARK-2\n")
+    data = b"".join(chunk for _, chunk in log.ring)
+    first, window = log.slice_at(since)
+    assert first > since and window == data, (first, since)
+    end1 = log.wait_for("MARK-1", since=since, timeout=0)
+    assert end1 == since + 2000 + len("MARK-1"), end1
+    end2 = log.wait_for("MARK-", since=end1, timeout=0)
+    assert end2 == since + 2000 + len("MARK-1 tail MARK-"), end2
+    assert log.wait_for("MARK-1", since=end1, timeout=0) == -1
+    log.close()
+    print(f"wait_for: offsets exact after {first - since} bytes evicted past since")
+
+
+def check_rotation(out):
+    lines = ["INFO 05-01 12:00:00 scheduler.py:200] 调度 waiting 3 running 64\n"] * 3000
+    text = "".join(lines) + "\n".join(SERVER_RUN_LINES + SERVER_RES_LINES) + "\n"
+    whole = os.path.join(out, "whole.txt")
+    with open(whole, "w", encoding="utf-8") as f:
+        f.write(text)
+    prefix = os.path.join(out, "server_log")
+    log = ChannelLog(prefix, rotate_size=10001)
+    data = text.encode("utf-8")
+    for i in range(0, len(data), 4093):
+        log.feed(data[i:i + 4093])
+        # 让写线程逐块写出，按 rotate_size 轮转出多个分段
+        time.sleep(0.002)
+    log.close()
+    parts = log_parts(prefix)
+    assert len(parts) > 5, parts
+    assert read_log(prefix) == text and read_log(parts[-1]) == text
+    expect = parse_log(whole, cache=False)
+    for path in (prefix, parts[0], parts[-1]):
+        record = parse_log(path, cache=False)
+        assert record.server_run.to_list() == expect.server_run.to_list(), path
+        assert record.server_res.to_list() == expect.server_res.to_list(), path
+    print(f"rotation: {len(parts)} parts, parse_log reads all of them "
+          f"({len(data)} bytes, stats at the end of the last part)")
+
+
+def main():
+    out = tempfile.mkdtemp()
+    try:
+        check_wait_for(out)
+        check_rotation(out)
+    finally:
+        shutil.rmtree(out)
+
+
+if __name__ == "__main__":
+    main()
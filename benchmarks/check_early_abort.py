@@ -0,0 +1,140 @@
+"""
+提前终止（live_monitor.LiveMonitor）的本地检查。
+
+1. 回放：排队模型（服务能力 capacity req/s，request-rate 更高时 Pending 线性增长，加噪声）
+   按 vLLM 的 5s 间隔生成指标行喂给 LiveMonitor，对比不同 request-rate 下的终止时刻与完整
+   运行时长；再用 200 组随机种子检查只有真实 P99 TTFT 超限的实验才会被终止。
+2. 端到端：本地 SSH 替身上通过 main.vllm_experiment 运行过载和正常的两个实验，过载实验
+   被提前终止并以 violated (early) 记入结果库，OptiPlan 给出减小 request-rate 的方向。
+
+用法：python benchmarks/check_early_abort.py
+"""
+import contextlib
+import io
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from live_monitor import LiveMonitor  # noqa: E402
+
+LIMITS = {"ttft_p99_limit": 3000, "tpot_p99_limit": 100}
+CFG = {"warmup": 30, "min_samples": 3, "window": 12, "margin": 1.5}
+METRICS = ("INFO metrics.py:334] Avg prompt throughput: 900.0 tokens/s, Avg generation "
+           "throughput: {gen:.1f} tokens/s, Running: {running} reqs, Swapped: 0 reqs, "
+           "Pending: {pending} reqs, GPU KV cache usage: 40.0%, CPU KV cache usage: 0.0%.\n")
+
+
+def replay(rr, capacity=8.0, num_prompts=2000, interval=5.0, seed=0):
+    """ 返回 (终止时刻或 None, 完整运行时长, 真实 P99 TTFT) """
+    rng = random.Random(seed)
+    now = [0.0]
+    monitor = LiveMonitor(rr, num_prompts, LIMITS, CFG, clock=lambda: now[0])
+    arrive = num_prompts / rr
+    growth = max(rr - capacity, 0.0)
+    # 排队请求以 capacity 的速率处理完
+    duration = arrive + growth * arrive / capacity
+    ttft_p99 = 300 + growth * 0.99 * arrive / capacity * 1000
+    t = 0.0
+    while t < duration:
+        t += interval
+        now[0] = t
+        pending = growth * min(t, arrive) - capacity * max(t - arrive, 0) if growth else 0
+        pending = max(0, int(pending + rng.gauss(0, (rr * interval) ** 0.5)))
+        monitor.feed(METRICS.format(gen=1200 + rng.gauss(0, 50), running=64,
+                                    pending=pending).encode())
+        if monitor.aborted:
+            return t, duration, ttft_p99
+    return None, duration, ttft_p99
+
+
+def check_replay():
+    print(f"{'rr':>5}{'P99 TTFT':>10}{'violated':>10}{'abort at':>10}{'full run':>10}{'saved':>7}")
+    saved = full = 0
+    for rr in (4, 7, 8, 8.2, 9, 10, 12, 16, 20):
+        t_abort, duration, ttft = replay(rr)
+        violated = ttft > LIMITS["ttft_p99_limit"]
+        # 不允许终止满足限制的实验
+        assert t_abort is None or violated, (rr, t_abort, ttft)
+        full += duration
+        saved += duration - (t_abort if t_abort is not None else duration)
+        print(f"{rr:>5}{ttft:>10.0f}{str(violated):>10}"
+              f"{(f'{t_abort:.0f}s' if t_abort is not None else '-'):>10}{duration:>9.0f}s"
+              f"{(1 - (t_abort or duration) / duration):>7.0%}")
+    print(f"replay: {saved / full:.0%} of total benchmark time saved")
+
+    false_aborts = missed = runs = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in range(200):
+            for rr in (4, 7, 8, 8.05, 8.2, 9, 12, 20):
+                t_abort, _, ttft = replay(rr, seed=seed)
+                violated = ttft > LIMITS["ttft_p99_limit"]
+                false_aborts += t_abort is not None and not violated
+                missed += t_abort is None and violated
+                runs += 1
+    assert false_aborts == 0, false_aborts
+    print(f"replay, 200 seeds: {runs} runs, {false_aborts} false aborts, "
+          f"{missed} violated runs not aborted")
+
+
+def check_stand_in():
+    from local_server import LocalSSHServer
+    import main
+    from optimizer import OptiPlan
+    from scheduler import Slot
+
+    root, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = LocalSSHServer(root_dir=root, benchmark_duration=3.0, capacity=2.0)
+    host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+            "password": server.password, "prompt": server.prompt}
+    cwd = os.getcwd()
+    early_abort_config, reuse = main.early_abort_config, main.reuse_server
+    main.early_abort_config = dict(CFG, enabled=True, warmup=0.3)
+    # 两次实验共用一个 server，耗时只比较 benchmark 部分
+    main.reuse_server = True
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ve = main.vllm_experiment(next(iter(main.config["models"])), "sharegpt", 2000, out,
+                                      slot=Slot(host, [0, 1], 9200, "/vllm_test"))
+            plan = OptiPlan(True, main.enable_chunked_config, main.config["limitation"])
+            timings = {}
+            for rr in (20, 2):
+                t0 = time.time()
+                client_res, server_run, server_res = ve.trial_result(True, 64, 512, rr)
+                timings[rr] = time.time() - t0
+                plan.report([64, 512, rr], client_res, server_run, server_res)
+            main.stop_servers()
+        history = plan.history
+        assert history.column("eva")[0] == -1 and history.column("eva")[1] == 2
+        assert list(history.metrics["opti_dir"][0]) == [0, 0, -1]
+        row = ve.store.get(ve.model_name, ve.dataset_name, 2000, True, [64, 512, 20])
+        record = ve.store.get_record(ve.model_name, ve.dataset_name, 2000, True, [64, 512, 20])
+        assert row["status"] == "done" and record.client_res["Early abort"] == 1
+        assert record.client_res["P99 TTFT (ms)"] > main.config["limitation"]["ttft_p99_limit"]
+        # TPOT 样本不足时记为未知（不写入结果），不能是 0
+        tpot = record.client_res.get("P99 TPOT (ms)")
+        assert tpot is None or tpot > 0, tpot
+        assert not history.column("tpot_p99")[0] <= 0
+        # 提前终止实验的吞吐量是预测值，宽松的 SLO 下也不作为最优结果
+        best = ve.store.best({"ttft_p99_limit": 1e12, "tpot_p99_limit": 1e12})
+        assert [row["params"]["rr"] for row in best] == [2], best
+        assert timings[20] < timings[2] / 2, timings
+        print(f"stand-in: rr=20 aborted after {timings[20]:.2f}s "
+              f"(predicted P99 TTFT {record.client_res['P99 TTFT (ms)']:.0f} ms), "
+              f"rr=2 ran to completion in {timings[2]:.2f}s")
+    finally:
+        main.early_abort_config, main.reuse_server = early_abort_config, reuse
+        server.close()
+        os.chdir(cwd)
+        shutil.rmtree(root)
+        shutil.rmtree(out)
+
+
+if __name__ == "__main__":
+    check_replay()
+    check_stand_in()
@@ -0,0 +1,135 @@
+"""
+exec 模式（SSHManager.exec_command）的本地检查。
+
+1. 输出中含有 prompt 字符串时，交互 shell 模式可能提前返回（取决于 recv 的分块），exec 模式完整返回；
+   stdout/stderr 分开，退出码正确，check=True 时非 0 退出码抛出异常。
+2. shell 中执行的 cd/export（如 pre_cmds）在 exec 模式中继续生效。
+3. 同一 Transport 上并发运行多条命令，对比串行耗时。
+4. 端到端：main 在 exec_mode 下用 exec channel 执行 reset/save；save 失败时实验立即报错，
+   不等待 server 日志中的 profiling 输出。
+
+用法：python benchmarks/check_exec_mode.py
+"""
+import contextlib
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from local_server import LocalSSHServer  # noqa: E402
+from ssh_tools import SSHManager, SSHPool  # noqa: E402
+
+
+def check_exec(server, ssh):
+    with contextlib.redirect_stdout(io.StringIO()):
+        shell_out = ssh.execute_command("echo '# not a prompt' done", max_duration=3)
+        # 命令回显与输出分两次到达时，shell 模式在回显中的 "# " 处就返回了，剩余输出留在缓冲中
+        ssh.read_until_prompt(ssh.final_prompt, max_duration=1)
+        result = ssh.exec_command("echo '# not a prompt'; echo oops >&2; exit 3")
+        try:
+            ssh.exec_command("exit 2", check=True)
+            raised = False
+        except RuntimeError:
+            raised = True
+    assert result.stdout == "# not a prompt\n" and result.stderr == "oops\n", vars(result)
+    assert result.exit_status == 3 and not result.ok and raised
+    print(f"shell mode returned {shell_out!r}; exec mode returned stdout {result.stdout!r}, "
+          f"stderr {result.stderr!r}, exit {result.exit_status}")
+
+    folder = tempfile.mkdtemp()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ssh.execute_command(f"cd {folder} && export PROBE=kept", max_duration=3)
+            result = ssh.exec_command('pwd; echo "$PROBE"', check=True)
+        assert result.stdout.split() == [os.path.realpath(folder), "kept"], result.stdout
+        print(f"persistent env: {ssh.env_cmds} -> {result.stdout.split()}")
+    finally:
+        ssh.env_cmds = []
+        shutil.rmtree(folder)
+
+    n, delay = 16, 0.5
+    with contextlib.redirect_stdout(io.StringIO()):
+        t0 = time.time()
+        results = ssh.exec_commands([f"sleep {delay}; echo {i}" for i in range(n)], workers=n)
+        parallel = time.time() - t0
+    assert [r.stdout.strip() for r in results] == [str(i) for i in range(n)]
+    assert all(r.ok for r in results) and parallel < n * delay / 4, parallel
+    assert server.state.connections == 1
+    print(f"{n} x sleep {delay}s on one transport: {parallel:.2f}s concurrent "
+          f"(serial {n * delay:.1f}s), {server.state.connections} connection")
+
+    stats = ssh.io_stats()["channels"][1]
+    assert stats["commands"] == n + 3 and stats["failed"] == 2
+    print(f"exec stats: {stats['commands']} commands, {stats['failed']} failed, "
+          f"p50 duration {1000 * stats['prompt_wait']['p50']:.0f} ms")
+
+
+def check_trial():
+    import main as vllm_main
+    from scheduler import Slot
+
+    root, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = LocalSSHServer(root_dir=root)
+    host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+            "password": server.password, "prompt": server.prompt}
+    cwd = os.getcwd()
+    exec_mode, reuse = vllm_main.exec_mode, vllm_main.reuse_server
+    vllm_main.exec_mode, vllm_main.reuse_server = True, True
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ve = vllm_main.vllm_experiment(next(iter(vllm_main.config["models"])), "sharegpt",
+                                           10, out, slot=Slot(host, [0, 1], 9500, "/vllm_test"))
+            for rr in (2, 4):
+                ve.item_test(True, 64, 512, rr)
+            vllm_main.stop_servers()
+        record = ve.store.get_record(ve.model_name, ve.dataset_name, 10, True, [64, 512, 4])
+        # 两次 save 和一次 reset 走 exec channel
+        assert server.state.execs == 3 and server.state.resets == 1, vars(server.state)
+        assert record.server_res is not None and not record.server_res.empty
+        print(f"trial: {server.state.execs} utils commands over exec channels, "
+              f"profiling stats captured")
+
+        server.state.fail_actions.add("save")
+        t0 = time.time()
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                ve.item_test(True, 64, 512, 6)
+                raise AssertionError("failed save did not raise")
+        except RuntimeError as e:
+            assert "--action save exit 2" in str(e) and "invalid choice" in str(e), e
+        finally:
+            with contextlib.redirect_stdout(io.StringIO()):
+                vllm_main.stop_servers()
+        elapsed = time.time() - t0
+        assert elapsed < 30, elapsed
+        print(f"failed save: trial raised after {elapsed:.2f}s without waiting for the log marker")
+    finally:
+        vllm_main.exec_mode, vllm_main.reuse_server = exec_mode, reuse
+        server.close()
+        os.chdir(cwd)
+        shutil.rmtree(root)
+        shutil.rmtree(out)
+
+
+def main():
+    server = LocalSSHServer()
+    pool = SSHPool()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ssh = SSHManager("127.0.0.1", server.username, server.password, "[bench]:",
+                             server.port, server.prompt, pool=pool)
+        check_exec(server, ssh)
+        ssh.close()
+    finally:
+        pool.close()
+        server.close()
+    check_trial()
+
+
+if __name__ == "__main__":
+    main()
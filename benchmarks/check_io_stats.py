@@ -0,0 +1,143 @@
+"""
+SSHManager 读取统计（io_stats.py）的本地检查。
+
+1. 命令读取：在本地 SSH 替身上用不同 buffer_size 读取大量输出，对比 recv 次数、平均块大小、
+   读满比例、多字节字符截断次数和 prompt 等待延迟，作为调 buffer_size 的依据。
+2. drain：server 高速打印日志时，分别挂上快/慢（每 4KB 2ms）两种 sink，对比 drain 延迟和
+   channel 积压，慢 sink 时应观察到积压增长到 SSH 窗口（反压）。
+3. 端到端：main.vllm_experiment 跑一次实验，检查实验目录的 io_stats.jsonl 有定期和最终快照，
+   包含 client/server shell 与 SFTP 的统计。
+4. 每次读取记录统计的开销。
+
+用法：python benchmarks/check_io_stats.py
+"""
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from io_stats import ChannelStats  # noqa: E402
+from local_server import LocalSSHServer  # noqa: E402
+from ssh_tools import SSHManager  # noqa: E402
+
+
+def manager(server, name="[bench]:"):
+    return SSHManager("127.0.0.1", server.username, server.password, name, server.port,
+                      server.prompt)
+
+
+def check_buffer_size():
+    server = LocalSSHServer()
+    print(f"{'buffer':>8}{'recv':>8}{'avg chunk':>11}{'full':>7}{'retries':>9}{'recv s':>8}"
+          f"{'wait s':>8}{'p50 prompt':>12}")
+    try:
+        for buffer_size in (1024, 8192, 32768):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ssh = manager(server)
+                ssh.reset_stats()
+                for _ in range(20):
+                    ssh.execute_command("echo hi", buffer_size=buffer_size)
+                ssh.execute_command("flood 4000000", buffer_size=buffer_size)
+                snap = ssh.io_stats()["channels"][0]
+                ssh.close()
+            assert snap["bytes"] > 4000000 and snap["prompt_wait"]["count"] == 21
+            assert snap["first_byte"]["count"] == 21
+            # 小块读取时多字节字符一定会被截断
+            assert buffer_size > 1024 or snap["decode_retries"] > 0
+            print(f"{buffer_size:>8}{snap['recv_calls']:>8}{snap['avg_chunk']:>11.0f}"
+                  f"{snap['full_chunks'] / snap['recv_calls']:>7.0%}{snap['decode_retries']:>9}"
+                  f"{snap['recv_time']:>8.2f}{snap['wait_time']:>8.2f}"
+                  f"{1000 * snap['prompt_wait']['p50']:>10.0f}ms")
+    finally:
+        server.close()
+
+
+def check_drain():
+    server = LocalSSHServer(server_log_rate=400)
+    try:
+        for name, delay in (("fast sink", 0.0), ("slow sink", 0.002)):
+            with contextlib.redirect_stdout(io.StringIO()):
+                ssh = manager(server, "[server]:")
+                ssh.execute_command_async("python -m vllm.entrypoints.openai.api_server --port 1")
+                ssh.read_until_prompt("Uvicorn running on")
+                ssh.reset_stats()
+                thread = ssh.start_recv_thread(
+                    sink=lambda data: time.sleep(delay * len(data) / 4096))
+                time.sleep(2)
+                ssh.stop_thread(thread)
+                snap = ssh.io_stats()["channels"][0]
+                ssh.execute_command("\x03", max_duration=1)
+                ssh.close()
+            lag = snap["drain_lag"]
+            print(f"{name}: {snap['bytes'] / 2**20:6.1f} MB, {snap['throughput'] / 2**20:5.1f} MB/s, "
+                  f"avg chunk {snap['avg_chunk']:.0f}, drain lag p99 {1000 * lag['p99']:.1f} ms "
+                  f"max {1000 * lag['max']:.1f} ms, backlog max {snap['backlog_max']} bytes, "
+                  f"backpressure {snap['backpressure']}")
+            if delay:
+                assert snap["backpressure"] > 0 and lag["max"] >= delay
+            else:
+                assert snap["backpressure"] == 0
+    finally:
+        server.close()
+
+
+def check_trial():
+    import main as vllm_main
+    from scheduler import Slot
+
+    root, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = LocalSSHServer(root_dir=root, benchmark_duration=1.0)
+    host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+            "password": server.password, "prompt": server.prompt}
+    cwd = os.getcwd()
+    io_stats_config = vllm_main.io_stats_config
+    vllm_main.io_stats_config = {"enabled": True, "interval": 0.25}
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ve = vllm_main.vllm_experiment(next(iter(vllm_main.config["models"])), "sharegpt",
+                                           10, out, slot=Slot(host, [0, 1], 9400, "/vllm_test"))
+            log_path = ve.item_test(True, 64, 512, 2)
+            vllm_main.stop_servers()
+        with open(os.path.join(os.path.dirname(log_path), "io_stats.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        assert len(records) >= 3 and records[-1]["final"] and not records[0]["final"]
+        final = {m["name"][1:7]: m for m in records[-1]["managers"]}
+        assert set(final) == {"client", "server"}, final.keys()
+        client, server_stats = final["client"], final["server"]
+        assert client["sftp"]["syncs"] == 1 and client["sftp"]["files"] > 0
+        assert client["channels"][0]["prompt_wait"]["count"] > 0
+        assert server_stats["channels"][0]["drain_lag"]["count"] > 0
+        print(f"trial: {len(records)} snapshots in io_stats.jsonl; client read "
+              f"{client['total']['bytes']} bytes in {client['total']['recv_calls']} recvs, "
+              f"server drained {server_stats['total']['bytes']} bytes, "
+              f"sftp {client['sftp']['files']} files {client['sftp']['bytes']} bytes")
+    finally:
+        vllm_main.io_stats_config = io_stats_config
+        server.close()
+        os.chdir(cwd)
+        shutil.rmtree(root)
+        shutil.rmtree(out)
+
+
+def check_overhead(n=200000):
+    stats = ChannelStats("x")
+    t0 = time.perf_counter()
+    for _ in range(n):
+        stats.on_recv(4096, 1e-5, 4096)
+        stats.on_drain(1e-4, 0, 2097152)
+        stats.on_wait(1e-6)
+    print(f"stats overhead: {(time.perf_counter() - t0) / n * 1e6:.2f} us per drained chunk")
+
+
+if __name__ == "__main__":
+    check_buffer_size()
+    check_drain()
+    check_trial()
+    check_overhead()
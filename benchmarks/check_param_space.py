@@ -0,0 +1,309 @@
+"""
+声明式参数空间（param_space.py）的本地检查。
+
+1. 兼容：config.yaml 中原有的三个参数得到与之前相同的默认值、实验目录名、结果库 key 和命令行。
+2. 扩展：加入 gpu_memory_utilization（步长）和 block_size（choices）后的默认值、约束、步进、
+   目录名解析、命令行和 server 复用 key。
+3. 调优：在 KV cache 容量随 gpu_memory_utilization 变化的合成响应面上，heuristic / bayes / pareto
+   在 5 维空间中完成调优，并且调整过新增的参数。
+4. 结果库和结果表：新增参数写入 params 列并在热启动时还原，旧版本的库自动加列；
+   extract_logs 的结果表中新增参数排在 rr 之后。
+5. 端到端：本地 SSH 替身上用 5 维参数运行 main.vllm_experiment.item_test，检查 server 命令行、
+   实验目录和结果库。
+
+用法：python benchmarks/check_param_space.py
+"""
+import contextlib
+import json
+import copy
+import io
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import yaml
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from log_process import LogRecord, LogTable, extract_logs  # noqa: E402
+from optimizer import OptiPlan  # noqa: E402
+from param_space import ParamSpace, extra_shorts, parse_trial_name, trial_name  # noqa: E402
+from results_store import ResultStore, trial_key  # noqa: E402
+from surfaces import SyntheticSurface, format_log  # noqa: E402
+from surrogate import make_strategy  # noqa: E402
+
+extra_cfg = {
+    "gpu_memory_utilization": {"short": "gmu", "type": "float", "default": 0.9,
+                               "step_num": 0.04, "min_step_num": 0.02, "bound": [0.8, 0.96]},
+    "block_size": {"short": "bs", "type": "int", "default": 16, "choices": [8, 16, 32]},
+}
+
+
+def table(df):
+    return LogTable(list(df.index), list(df.columns), {r: df.loc[r].tolist() for r in df.index})
+
+
+class MemorySurface:
+    """ KV cache 可容纳的序列数与 (gpu_memory_utilization - 0.5) 成正比，block_size 不影响结果 """
+
+    def __init__(self, scenario="70b-long"):
+        self.scenario = scenario
+        self.surfaces = {}
+
+    def surface(self, gmu):
+        if gmu not in self.surfaces:
+            s = SyntheticSurface(self.scenario)
+            s.p = dict(s.p, kv_seqs=s.p["kv_seqs"] * (gmu - 0.5) / 0.4)
+            self.surfaces[gmu] = s
+        return self.surfaces[gmu]
+
+    def evaluate(self, mns, mnbt, rr, gmu, bs):
+        return self.surface(gmu).evaluate(mns, mnbt, rr)
+
+
+def check_compat(config):
+    for mode, chunked, expect in (("disable_chunked_prefill", False, [128, None, 10]),
+                                  ("enable_chunked_prefill", True, [256, 512, 10])):
+        space = ParamSpace(config["params"][mode])
+        params = space.default()
+        assert params == expect, params
+        old_name = "_".join(str(v) for v in params)
+        assert space.folder_name(params) == old_name == trial_name(params)
+        assert trial_key(chunked, space.named(params)) == trial_key(chunked, params)
+        assert parse_trial_name(old_name) == space.named(params)
+        server = " --max_num_seqs=" + str(params[0])
+        if chunked:
+            server += " --max_num_batched_tokens=" + str(params[1])
+        assert " " + space.args(params, "server") == server
+        assert space.args(params, "client") == "--request-rate=10"
+        assert space.server_values(params) == (params[0], params[1])
+    # 只写 default/step 的旧格式配置得到相同的参数属性
+    legacy = {name: {k: v for k, v in cfg.items() if k in ("default", "step_num",
+                                                           "min_step_num", "bound")}
+              for name, cfg in config["params"]["enable_chunked_prefill"].items()}
+    new, old = ParamSpace(config["params"]["enable_chunked_prefill"]), ParamSpace(legacy)
+    assert [vars(p) for p in new.params] == [vars(p) for p in old.params]
+    print("compat: default spaces keep <mns>_<mnbt>_<rr> folders, store keys and command lines")
+
+
+def check_extended(config):
+    step_cfg = dict(config["params"]["enable_chunked_prefill"], **extra_cfg)
+    space = ParamSpace(step_cfg)
+    params = space.default()
+    assert space.shorts == ["mns", "mnbt", "rr", "gmu", "bs"]
+    assert params == [256, 512, 10, 0.9, 16], params
+    name = space.folder_name(params)
+    assert name == "256_512_10_gmu=0.9_bs=16", name
+    assert space.from_named(parse_trial_name(name)) == params
+    assert space.args(params, "server") == \
+        "--max_num_seqs=256 --max_num_batched_tokens=512 --gpu_memory_utilization=0.9 " \
+        "--block_size=16"
+    assert space.server_values(params) == (256, 512, 0.9, 16)
+    # mns 不大于 mnbt
+    assert space.fix([1024, 512, 10, 0.9, 16])[0] == 512
+    assert not space.valid([1024, 512, 10, 0.9, 16])
+    # 浮点步长不累积误差，choices 按位置移动，到边界后停止
+    gmu, bs = space[3], space[4]
+    assert gmu.step(0.9, 0.04) == (True, 0.94) and gmu.step(0.94, 0.04) == (True, 0.96)
+    assert gmu.step(0.96, 0.04) == (False, 0) and gmu.step(0.9, 3 * 0.02) == (True, 0.96)
+    assert bs.step(16, 1) == (True, 32) and bs.step(16, -2) == (True, 8)
+    assert bs.step(32, 1) == (False, 0)
+    assert gmu.grid() == [0.8, 0.82, 0.84, 0.86, 0.88, 0.9, 0.92, 0.94, 0.96]
+    assert bs.grid() == [8, 16, 32]
+    assert extra_shorts({"enable_chunked_prefill": step_cfg,
+                         "disable_chunked_prefill": config["params"]["disable_chunked_prefill"]}) \
+        == ["gmu", "bs"]
+    # 没有 short 的参数名中的 "_" 换成 "-"，目录名仍能还原；short 中不能有分隔符
+    swap = ParamSpace({"swap_space": {"type": "int", "default": 4}})
+    assert swap.shorts[3] == "swap-space"
+    swap_name = swap.folder_name(swap.default())
+    assert swap_name == "None_None_None_swap-space=4", swap_name
+    assert swap.from_named(parse_trial_name(swap_name)) == swap.default()
+    for short in ("s_s", "s=s"):
+        try:
+            ParamSpace({"swap_space": {"short": short, "default": 4}})
+            raise AssertionError(f"short {short} accepted")
+        except ValueError:
+            pass
+    flag = ParamSpace({"enforce_eager": {"type": "bool", "default": 0}})
+    assert flag.args([64, None, 2, 1], "server") == "--max_num_seqs=64 --enforce_eager"
+    assert flag.args([64, None, 2, 0], "server") == "--max_num_seqs=64"
+    print(f"extended: {space.names} -> {name}")
+
+
+def check_search(config):
+    step_cfg = dict(config["params"]["enable_chunked_prefill"], **extra_cfg)
+    surface = MemorySurface()
+    for strategy in ("heuristic", "bayes", "pareto"):
+        search_cfg = dict(config.get("search") or {}, strategy=strategy)
+        plan = OptiPlan(True, step_cfg, config["limitation"], make_strategy(search_cfg))
+        params, flag = plan.space.default(), True
+        with contextlib.redirect_stdout(io.StringIO()):
+            while flag:
+                flag, *params = plan.append_experiment(params, *surface.evaluate(*params))
+        trials = plan.input_params_list
+        assert all(len(p) == 5 and plan.space.valid(p) for p in trials)
+        moved = [short for dim, short in enumerate(plan.space.shorts)
+                 if len({p[dim] for p in trials}) > 1]
+        assert {"gmu", "bs"} & set(moved), (strategy, moved)
+        best = trials[plan.best_idx]
+        print(f"search {strategy:<9}: {len(trials):>3} trials, moved {moved}, "
+              f"best {plan.space.folder_name(best)} {plan.best_throughput:.2f} req/s")
+
+    # 批量模式的启发式候选也沿新增参数做线搜索
+    plan = OptiPlan(True, step_cfg, config["limitation"])
+    trials, batch = [], plan.propose_batch(1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        while batch and len(trials) < 60:
+            for params in batch:
+                plan.report(params, *surface.evaluate(*params))
+            trials += batch
+            batch = plan.propose_batch(4)
+    moved = sum(p[3] != 0.9 or p[4] != 16 for p in trials)
+    assert moved, trials
+    print(f"batch heuristic: {len(trials)} trials, {moved} move gmu/bs")
+
+
+def check_store_and_table(config):
+    out = tempfile.mkdtemp()
+    try:
+        # swap_space 没有 short，目录名和表头中为 swap-space
+        space = ParamSpace(dict(config["params"]["enable_chunked_prefill"], **extra_cfg,
+                                swap_space={"type": "int", "default": 4}))
+        surface = MemorySurface()
+        store = ResultStore(os.path.join(out, "results.sqlite"))
+        points = [space.default(), [256, 512, 12, 0.94, 32, 8]]
+        for params in points:
+            client_res, server_run, server_res = surface.evaluate(*params[:5])
+            record = LogRecord(client_res, table(server_run), table(server_res))
+            store.finish("m", "d", 2000, True, space.named(params), "", record)
+            item = os.path.join(out, "m", "d", "2000", "enable_chunked", space.folder_name(params))
+            os.makedirs(item)
+            with open(os.path.join(item, "log.txt"), "w") as f:
+                f.write(format_log(client_res, server_run, server_res))
+        # 只有 mns/mnbt/rr 的旧实验
+        legacy = [64, 512, 2]
+        store.finish("m", "d", 2000, True, legacy, "", record)
+        trials = store.trials("m", "d", 2000, True)
+        restored = [space.from_named(named) for named, _ in trials]
+        assert restored == points + [None], restored
+        assert trials[-1][0] == {"mns": 64, "mnbt": 512, "rr": 2}
+        rows = {trial_name(r["params"]) for r in store.rows("m")}
+        assert rows == {space.folder_name(p) for p in points} | {"64_512_2"}, rows
+        store.close()
+
+        # 之前版本建立的库（没有 params 列）打开时加列
+        path = os.path.join(out, "old.sqlite")
+        conn = sqlite3.connect(path)
+        conn.executescript(
+            "CREATE TABLE trials (id INTEGER PRIMARY KEY AUTOINCREMENT, model TEXT NOT NULL, "
+            "dataset TEXT NOT NULL, num_prompts INTEGER NOT NULL, chunked INTEGER NOT NULL, "
+            "trial_key TEXT NOT NULL, mns REAL, mnbt REAL, rr REAL, status TEXT NOT NULL, "
+            "log_path TEXT, started REAL, finished REAL, duration REAL, throughput REAL, "
+            "ttft_p99 REAL, tpot_p99 REAL, record TEXT, "
+            "UNIQUE (model, dataset, num_prompts, trial_key));"
+            "INSERT INTO trials (model, dataset, num_prompts, chunked, trial_key, mns, mnbt, rr, "
+            "status, throughput, ttft_p99, tpot_p99) VALUES ('m', 'd', 2000, 1, "
+            "'enable_chunked/64_512_2.5', 64, 512, 2.5, 'done', 2, 100, 50);")
+        # 提前终止的实验，吞吐量是预测值
+        conn.execute(
+            "INSERT INTO trials (model, dataset, num_prompts, chunked, trial_key, mns, mnbt, rr, "
+            "status, throughput, ttft_p99, tpot_p99, record) VALUES ('m', 'd', 2000, 1, "
+            "'enable_chunked/64_512_20', 64, 512, 20, 'done', 8, 5000, 50, ?)",
+            (json.dumps({"client_res": {"Early abort": 1.0, "Request throughput (req/s)": 8},
+                         "server_run": {}, "server_res": {}}),))
+        conn.commit()
+        conn.close()
+        old = ResultStore(path)
+        assert old.rows()[0]["params"] == {"mns": 64, "mnbt": 512, "rr": 2.5}
+        # SLO 比提前终止的阈值宽松时，提前终止的实验也不能作为最优结果
+        best = old.best({"ttft_p99_limit": 1e9, "tpot_p99_limit": 1e9})
+        assert [row["params"]["rr"] for row in best] == [2.5], best
+        old.close()
+
+        output = os.path.join(out, "table.csv")
+        with contextlib.redirect_stdout(io.StringIO()):
+            extract_logs(out, output, workers=1,
+                         extra=space.shorts[3:])
+        with open(output) as f:
+            lines = f.read().splitlines()
+        header = lines[0].split(",")
+        assert header[4:10] == ["mns", "mnbt", "rr", "gmu", "bs", "swap-space"], header
+        values = sorted(tuple(line.split(",")[4:10]) for line in lines[1:])
+        assert values == [("256", "512", "10", "0.9", "16", "4"),
+                          ("256", "512", "12", "0.94", "32", "8")], values
+        print(f"store/table: {len(points)} trials with gmu/bs/swap-space round-trip, "
+              f"legacy rows readable, table columns {header[4:10]}")
+    finally:
+        shutil.rmtree(out)
+
+
+def check_stand_in(config):
+    from local_server import LocalSSHServer
+    with contextlib.redirect_stdout(io.StringIO()):
+        import main as vllm_main
+    from scheduler import Slot
+
+    remote, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = LocalSSHServer(root_dir=remote)
+    host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+            "password": server.password, "prompt": server.prompt}
+    cwd = os.getcwd()
+    spaces = dict(vllm_main.param_spaces)
+    vllm_main.param_spaces[True] = ParamSpace(dict(config["params"]["enable_chunked_prefill"],
+                                                   **extra_cfg))
+    commands = []
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ve = vllm_main.vllm_experiment(next(iter(vllm_main.config["models"])), "sharegpt",
+                                           10, out, slot=Slot(host, [0, 1], 9400, "/vllm_test"))
+            acquire = ve.server.acquire
+
+            def record_acquire(key, cmd, reuse=True):
+                commands.append(cmd)
+                return acquire(key, cmd, reuse)
+
+            ve.server.acquire = record_acquire
+            params = [64, 512, 2, 0.92, 32]
+            log_path = ve.item_test(True, *params)
+            client_res = ve.trial_result(True, *params)[0]
+            try:
+                ve.item_test(True, 64, 512, 2)
+                raise AssertionError("item_test accepted 3 params for a 5-param space")
+            except ValueError:
+                pass
+            vllm_main.stop_servers()
+        assert log_path.endswith("/enable_chunked/64_512_2_gmu=0.92_bs=32/log.txt"), log_path
+        assert os.path.exists(log_path)
+        assert "--gpu_memory_utilization=0.92 --block_size=32 --enable_chunked_prefill" \
+            in commands[0], commands
+        assert "Request throughput (req/s)" in client_res
+        row = ve.store.get(ve.model_name, "sharegpt", 10, True,
+                           vllm_main.param_spaces[True].named(params))
+        assert row["status"] == "done" and row["trial_key"].endswith("_gmu=0.92_bs=32")
+        print(f"stand-in: item_test ran {os.path.relpath(log_path, out)}")
+    finally:
+        vllm_main.param_spaces.update(spaces)
+        server.close()
+        os.chdir(cwd)
+        shutil.rmtree(remote)
+        shutil.rmtree(out)
+
+
+def main():
+    with open(os.path.join(root, "config.yaml")) as f:
+        config = yaml.safe_load(f)
+    config = copy.deepcopy(config)
+    check_compat(config)
+    check_extended(config)
+    check_search(config)
+    check_store_and_table(config)
+    check_stand_in(config)
+
+
+if __name__ == "__main__":
+    main()
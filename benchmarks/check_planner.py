@@ -0,0 +1,238 @@
+"""
+sweep 规划（planner.py）的本地检查。
+
+1. 去重：结果库中已完成的任务回放后标记为完成，部分完成的任务从优化器的下一个实验继续。
+2. 耗时估计：从合成的 trace.jsonl 中拟合冷/热启动、reset、benchmark 和其他耗时。
+3. 排序：对比原顺序和规划后顺序的模拟总时长和模型冷加载次数（同一 GPU 上交替的模型、
+   随机的部分完成的 sweep）。
+4. 槽位亲和：SlotPool.allocate 的 prefer 槽位空闲时原样分配。
+5. 端到端：python planner.py --dry-run 打印计划和预计节省的时间。
+6. search.parallel > 1 或 fidelity 开启时不回放，不跳过任务并提示。
+
+用法：python benchmarks/check_planner.py
+"""
+import contextlib
+import copy
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+import yaml
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from log_process import LogRecord, LogTable  # noqa: E402
+from optimizer import OptiPlan, default_params  # noqa: E402
+from planner import SweepPlan, Task, CostModel, candidates, simulate  # noqa: E402
+from results_store import open_store  # noqa: E402
+from scheduler import SlotPool  # noqa: E402
+from surfaces import SyntheticSurface  # noqa: E402
+
+num_prompts = 2000
+hosts = [{"gpus": [0, 1]}, {"gpus": [0, 1]}]
+
+
+def table(df):
+    return LogTable(list(df.index), list(df.columns), {r: df.loc[r].tolist() for r in df.index})
+
+
+def run_task(store, config, model, dataset, chunked, surface, limit):
+    """ 按 opti_experiment 的顺序把最多 limit 个合成实验写入结果库，返回实验数和下一个实验 """
+    params_config = config["params"]["enable_chunked_prefill" if chunked
+                                     else "disable_chunked_prefill"]
+    plan = OptiPlan(chunked, params_config, config["limitation"])
+    params = default_params(params_config)
+    for n in range(1, limit + 1):
+        client_res, server_run, server_res = surface.evaluate(*params)
+        record = LogRecord(client_res, table(server_run), table(server_res))
+        store.finish(model, dataset, num_prompts, chunked, params, "", record)
+        with contextlib.redirect_stdout(io.StringIO()):
+            flag, *params = plan.append_experiment(params, record.client_res, record.server_run,
+                                                   record.server_res)
+        if not flag:
+            return n, None
+    return limit, params
+
+
+def write_trace(path):
+    """ 每台主机先冷启动一次，之后同一模型热启动；每个实验一次 benchmark """
+    spans, ts, ids = [], 0.0, iter(range(1, 10000))
+    for i, (model, host, reused) in enumerate([("m13", "h0", False), ("m13", "h0", False),
+                                               ("m13", "h0", True), ("m7a", "h1", False),
+                                               ("m7a", "h1", False), ("m7b", "h1", False)]):
+        trial = next(ids)
+        children = []
+        if reused:
+            children.append(("server.reset", 4.0, {}))
+        else:
+            cold = i in (0, 3, 5)
+            children.append(("server.launch", 200.0 if cold else 50.0, {}))
+        children.append(("server.acquire", 0.0, {"reused": reused}))
+        children.append(("benchmark", 240.0, {"rr": 10, "aborted": False}))
+        for name, dur, attrs in children:
+            spans.append({"id": next(ids), "parent": trial, "name": name, "ts": ts, "dur": dur,
+                          "pid": 1, "tid": 1, "thread": "t", "status": "ok", "attrs": attrs})
+        spans.append({"id": trial, "parent": None, "name": "trial", "ts": ts,
+                      "dur": sum(c[1] for c in children) + 20.0, "pid": 1, "tid": 1,
+                      "thread": "t", "status": "ok",
+                      "attrs": {"model": model, "dataset": "sharegpt", "num_prompts": num_prompts,
+                                "trial": f"enable_chunked/{i}", "slot": f"{host}:22/gpu0_1"}})
+        ts += 1000
+    with open(path, "w") as f:
+        for s in spans:
+            f.write(json.dumps(s) + "\n")
+
+
+def check_plan(config):
+    out = tempfile.mkdtemp()
+    try:
+        store = open_store(out + "/results.sqlite")
+        surface = SyntheticSurface("13b-sharegpt")
+        done, _ = run_task(store, config, "m13", "sharegpt", True, surface, 100)
+        partial, next_params = run_task(store, config, "m13", "GSM", True, surface, 3)
+        write_trace(out + "/trace.jsonl")
+        plan = SweepPlan(config, store, num_prompts, hosts, out)
+        tasks = {t.key: t for t in plan.tasks}
+        finished = tasks[("m13", "sharegpt", True)]
+        resumed = tasks[("m13", "GSM", True)]
+        assert finished.finished and finished.done == done, vars(finished)
+        assert not resumed.finished and resumed.done == partial == 3
+        assert resumed.next_params == next_params, (resumed.next_params, next_params)
+        print(f"dedupe: finished task replayed {done} trials, partial task resumes at "
+              f"{resumed.next_params} after {partial}")
+
+        costs = plan.costs
+        assert costs["launch_cold"] == 200 and costs["launch_warm"] == 50
+        assert costs["reset"] == 4 and costs["overhead"] == 20
+        assert abs(costs["benchmark_ratio"] - 240 / (num_prompts / 10)) < 1e-9
+        assert costs.source["launch_cold"].startswith("trace")
+        assert costs["trials_per_task"] == done
+        print(f"cost model: cold {costs['launch_cold']:.0f}s, warm {costs['launch_warm']:.0f}s, "
+              f"reset {costs['reset']:.0f}s, overhead {costs['overhead']:.0f}s, "
+              f"restart rate {costs['restart_rate']:.2f}, trials/task {costs['trials_per_task']}")
+
+        # 已完成的任务排在最前，同一模型的任务相邻
+        order = [t.model for t in plan.tasks if not t.finished]
+        assert plan.tasks[0].finished
+        runs = 1 + sum(a != b for a, b in zip(order, order[1:]))
+        assert runs == len(set(order)), order
+        kinds = {name: [p.kind for p in placements] for name, placements in
+                 (("naive", plan.naive_placements), ("planned", plan.placements))}
+        assert plan.planned_time <= plan.naive_time
+        assert kinds["planned"].count("cold") <= kinds["naive"].count("cold")
+        print(f"order: naive {plan.naive_time / 3600:.1f}h with {kinds['naive'].count('cold')} "
+              f"cold loads, planned {plan.planned_time / 3600:.1f}h with "
+              f"{kinds['planned'].count('cold')} cold loads "
+              f"({1 - plan.planned_time / plan.naive_time:.0%} saved)")
+        with contextlib.redirect_stdout(io.StringIO()) as f:
+            plan.print()
+        assert "predicted saving" in f.getvalue()
+
+        # 批量调优 / 多保真度调优的实验顺序与串行不同：不回放、不跳过任务，打印提示
+        for mode in ({"search": dict(config["search"], parallel=3)},
+                     {"fidelity": {"enabled": True, "rungs": [200]}}):
+            other = SweepPlan(dict(config, **mode), store, num_prompts, hosts, out)
+            tasks = {t.key: t for t in other.tasks}
+            assert not any(t.finished for t in other.tasks), mode
+            assert tasks[("m13", "sharegpt", True)].done == done
+            assert tasks[("m13", "GSM", True)].done == partial
+            with contextlib.redirect_stdout(io.StringIO()) as f:
+                other.print()
+            assert "only replays serial tuning" in f.getvalue()
+        print("non-serial modes: no replay, no task skipped, warning printed")
+    finally:
+        shutil.rmtree(out)
+
+
+def check_cache_reload():
+    """ 两个 tp=1 模型交替排在同一台主机的两张卡上时，不分组每个任务都要冷加载 """
+    costs = CostModel({"cached_models": 1, "trials_per_task": 2})
+    params = [64, 512, 10]
+    naive = [Task(m, d, True, 1, params) for d in ("a", "b", "c") for m in ("x", "y")]
+    grouped = sorted(naive, key=lambda t: t.model)
+    one_host = [{"gpus": [0]}]
+    t_naive, p_naive = simulate(naive, one_host, costs, num_prompts)
+    t_grouped, p_grouped = simulate(grouped, one_host, costs, num_prompts, affinity=True)
+    assert [p.kind for p in p_naive].count("cold") == 6
+    assert [p.kind for p in p_grouped].count("cold") == 2
+    assert t_naive - t_grouped == 4 * (costs["launch_cold"] - costs["launch_warm"])
+    print(f"alternating models on one GPU: {t_naive / 3600:.2f}h -> {t_grouped / 3600:.2f}h")
+
+
+def check_partial_sweeps(n=20):
+    """ 随机的部分完成的 sweep：规划后的顺序预计不比原顺序慢 """
+    rng = random.Random(1)
+    costs = CostModel({"cached_models": 1})
+    savings = []
+    for _ in range(n):
+        tasks = []
+        for model, tp in (("a", 1), ("b", 1), ("c", 2), ("d", 1)):
+            for dataset in ("x", "y"):
+                for chunked in (True, False):
+                    task = Task(model, dataset, chunked, tp, [256, 512, rng.choice([5, 10, 20])])
+                    task.done = rng.choice([0, 0, 6, 11])
+                    tasks.append(task)
+        naive, _ = simulate(tasks, hosts, costs, num_prompts)
+        planned = min(simulate(order, hosts, costs, num_prompts, affinity)[0]
+                      for _, order, affinity in candidates(tasks, costs, num_prompts))
+        assert planned <= naive
+        savings.append(1 - planned / naive)
+    assert max(savings) > 0
+    print(f"{n} partial sweeps: predicted saving mean {statistics.mean(savings):.1%}, "
+          f"max {max(savings):.1%}")
+
+
+def check_affinity():
+    pool = SlotPool([{"ip": "a", "port": 22, "gpus": [0, 1, 2, 3]},
+                     {"ip": "b", "port": 22, "gpus": [0, 1]}], {}, 9000, "/w")
+    busy = pool.allocate(2)
+    first = pool.allocate(2)
+    pool.release(busy)
+    pool.release(first)
+    # 没有 prefer 时选空闲卡最少的主机 b，有 prefer 时回到上次的卡
+    default = pool.allocate(2)
+    pool.release(default)
+    again = pool.allocate(2, prefer=first)
+    assert default.host["ip"] == "b" and first.host["ip"] == "a"
+    assert again.host["ip"] == "a" and again.gpus == first.gpus, (first, again)
+    pool.release(again)
+    print(f"affinity: {first} reallocated as {again}")
+
+
+def check_cli():
+    out = tempfile.mkdtemp()
+    try:
+        result = subprocess.run([sys.executable, "planner.py", "--output", out, "--dry-run"],
+                                cwd=root, capture_output=True, text=True, timeout=120)
+        assert result.returncode == 0, result.stderr
+        assert "predicted saving" in result.stdout and "naive order" in result.stdout
+        print("dry run:\n  " + "\n  ".join(result.stdout.strip().splitlines()[-4:-1]))
+    finally:
+        shutil.rmtree(out)
+
+
+def main():
+    with open(os.path.join(root, "config.yaml")) as f:
+        config = yaml.safe_load(f)
+    config = copy.deepcopy(config)
+    config["models"] = {"m13": {"tp": 2, "repath": "/m13"}, "m7a": {"tp": 1, "repath": "/m7a"},
+                        "m7b": {"tp": 1, "repath": "/m7b"}}
+    config["datasets"] = {"sharegpt": {}, "GSM": {}}
+    config["search"] = {"strategy": "heuristic"}
+    check_plan(config)
+    check_cache_reload()
+    check_partial_sweeps()
+    check_affinity()
+    check_cli()
+
+
+if __name__ == "__main__":
+    main()
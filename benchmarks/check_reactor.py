@@ -0,0 +1,113 @@
+"""
+共用 reactor（reactor.py）出错时的本地检查，用 os.pipe 模拟 paramiko channel。
+
+1. 注册生效前 channel 已关闭（fd 无效）：该注册被注销并调用 on_close，unregister 不会卡住。
+2. 读取出错（channel.recv 抛出异常）：只注销出错的 channel，其他 channel 继续被读取。
+3. 之后新注册的 channel 仍然正常工作，reactor 线程一直存活。
+
+用法：python benchmarks/check_reactor.py
+"""
+import contextlib
+import io
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from reactor import Reactor  # noqa: E402
+
+
+class PipeChannel:
+    """ 只实现 reactor 用到的 paramiko channel 接口，写入 pipe 的数据即为收到的数据 """
+
+    def __init__(self, fail=False):
+        self.r, self.w = os.pipe()
+        os.set_blocking(self.r, False)
+        self.fail = fail
+        self.in_buffer = b""
+        self.in_window_size = 0
+        self.closed = False
+        self.eof_received = False
+
+    def fileno(self):
+        return self.r
+
+    def send(self, data):
+        os.write(self.w, data)
+
+    def recv_ready(self):
+        return not self.closed and self.readable()
+
+    def readable(self):
+        import select
+        return bool(select.select([self.r], [], [], 0)[0])
+
+    def recv_stderr_ready(self):
+        return False
+
+    def recv(self, size):
+        if self.fail:
+            raise EOFError("injected recv failure")
+        return os.read(self.r, size)
+
+    def close(self):
+        self.closed = True
+        os.close(self.r)
+        os.close(self.w)
+
+
+def wait_until(cond, timeout=3):
+    deadline = time.time() + timeout
+    while not cond() and time.time() < deadline:
+        time.sleep(0.01)
+    return cond()
+
+
+def main():
+    reactor = Reactor()
+    got = []
+    closed = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        good = PipeChannel()
+        good_reg = reactor.register(good, sink=got.append)
+        good.send(b"a")
+        assert wait_until(lambda: got == [b"a"]), got
+
+        # 注册生效前关闭：reactor 线程收到的是无效的 fd（Registration 记录的是关闭前的 fd）
+        dead = PipeChannel()
+        dead.close()
+        dead_reg = reactor.register(dead, on_close=closed.append)
+        assert wait_until(dead_reg.removed.is_set), "closed channel never removed"
+        assert closed == [dead_reg] and dead_reg.error is not None
+        done = threading.Event()
+        threading.Thread(target=lambda: (reactor.unregister(dead_reg), done.set()),
+                         daemon=True).start()
+        assert done.wait(3), "unregister blocked"
+
+        # recv 出错
+        bad = PipeChannel(fail=True)
+        bad_reg = reactor.register(bad, on_close=closed.append)
+        bad.send(b"x")
+        assert wait_until(bad_reg.removed.is_set), "failing channel never removed"
+        assert isinstance(bad_reg.error, EOFError) and closed[-1] is bad_reg
+
+        # 其他 channel 和之后的注册不受影响
+        good.send(b"b")
+        later = PipeChannel()
+        later_got = []
+        later_reg = reactor.register(later, sink=later_got.append)
+        later.send(b"c")
+        assert wait_until(lambda: got == [b"a", b"b"] and later_got == [b"c"]), (got, later_got)
+        assert reactor.thread.is_alive()
+        reactor.unregister(good_reg)
+        reactor.unregister(later_reg)
+    for channel in (good, bad, later):
+        channel.close()
+    print("reactor: closed-before-register and recv errors unregister only that channel, "
+          "thread alive, other channels still drained")
+
+
+if __name__ == "__main__":
+    main()
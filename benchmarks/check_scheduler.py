@@ -0,0 +1,349 @@
+"""
+多主机 / 多 GPU 槽位调度的本地检查，不需要真实集群。
+
+1. 纯调度：3 台假主机（8/4/2 卡），不同 tp 的任务用 sleep 模拟，
+   检查同一主机上并发任务的 GPU、端口互不重叠，总耗时接近 总工作量 / 卡数。
+2. 端到端：2 个本地 SSH 替身作为假主机，通过 main.vllm_experiment.item_test
+   在各槽位上跑完整的一次实验流程，检查端口、工作目录和下载结果按槽位隔离。
+3. server 复用：同一槽位上依次运行只改变 request-rate 的实验，检查只在 mns/mnbt 变化时
+   重启 server、复用前清零 profiling 统计，并与每次重启的耗时对比；reset_action 失败时改为重启。
+4. 批量调优：search.parallel = 3 时 main.run_tasks_parallel 在 3 个槽位上并行运行一个调优任务，
+   其中一次实验失败时其他实验继续、该参数不再提出；与串行调优比较每秒完成的实验数。
+5. 实验出错：item_test 抛出异常时 client shell 同样被关闭，实验记为失败；
+   benchmark 读取中出错时 server_log 的写线程结束，gzip 部分完整可读。
+
+用法：python benchmarks/check_scheduler.py
+"""
+import contextlib
+import glob
+import gzip
+import io
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_log import log_files  # noqa: E402
+from scheduler import ExperimentScheduler, SlotPool  # noqa: E402
+
+DEFAULT_HOST = {"ip": "127.0.0.1", "port": 22, "username": "root", "password": "pw",
+                "prompt": "# "}
+
+
+def check_overlap(intervals):
+    """intervals: [(host, gpus, port, start, end)]，同主机时间重叠的任务不能共享卡或端口"""
+    for i, a in enumerate(intervals):
+        for b in intervals[i + 1:]:
+            if a[0] != b[0] or a[4] <= b[3] or b[4] <= a[3]:
+                continue
+            assert not set(a[1]) & set(b[1]), (a, b)
+            assert a[2] != b[2], (a, b)
+
+
+def fake_sweep():
+    hosts = [{"ip": "fake-a", "gpus": range(8)}, {"ip": "fake-b", "gpus": range(4)},
+             {"ip": "fake-c", "gpus": range(2)}]
+    pool = SlotPool(hosts, DEFAULT_HOST, 8181, "/work")
+    intervals = []
+    lock = threading.Lock()
+    unit = 0.05
+
+    def run(task, slot):
+        start = time.time()
+        time.sleep(task[2] * unit)
+        with lock:
+            intervals.append((slot.host["ip"], slot.gpus, slot.app_port, start, time.time()))
+        return slot.work_dir
+
+    sched = ExperimentScheduler(pool, run)
+    work = 0
+    tps = {"llama3-8b": 1, "chatglm3-6b": 1, "baichuan2-13b": 2, "qwen1.5-32b": 4,
+           "llama3-70b": 8}
+    for model, tp in tps.items():
+        for dataset in ("sharegpt", "GSM"):
+            for chunked in (True, False):
+                duration = 4
+                sched.submit((model, dataset, duration, chunked), tp)
+                work += tp * duration * unit
+    t0 = time.time()
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = sched.run()
+    makespan = time.time() - t0
+    assert all(r["status"] == "ok" for r in results.values())
+    check_overlap(intervals)
+    ideal = work / 14
+    serial = sum(r["seconds"] for r in results.values())
+    print(f"fake sweep: {len(results)} tasks on 14 GPUs, serial {serial:.2f}s, "
+          f"makespan {makespan:.2f}s, work/slots {ideal:.2f}s")
+    assert makespan < 2 * ideal + 4 * unit
+
+
+def stand_in_sweep():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_server import LocalSSHServer
+
+    roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+    out = tempfile.mkdtemp()
+    servers = [LocalSSHServer(root_dir=root) for root in roots]
+    cwd = os.getcwd()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            import main
+        hosts = [{"ip": "127.0.0.1", "port": s.port, "username": s.username,
+                  "password": s.password, "prompt": s.prompt, "gpus": gpus}
+                 for s, gpus in zip(servers, ([0, 1, 2, 3], [0, 1]))]
+        pool = SlotPool(hosts, main.default_host, 9000, "/vllm_test")
+        used = []
+
+        def run(task, slot):
+            model, dataset, chunked = task
+            ve = main.vllm_experiment(model, dataset, 10, out, slot=slot)
+            log_path = ve.item_test(chunked, 64, 512 if chunked else None, 2)
+            used.append((slot.name, slot.app_port, slot.work_dir, log_path))
+            return log_path
+
+        sched = ExperimentScheduler(pool, run)
+        model = next(iter(main.config["models"]))
+        for dataset in main.config["datasets"]:
+            for chunked in (True, False):
+                sched.submit((model, dataset, chunked), 2)
+        t0 = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = sched.run()
+        elapsed = time.time() - t0
+        assert all(r["status"] == "ok" for r in results.values()), results
+        for name, port, work_dir, log_path in used:
+            with open(log_path, encoding="utf-8") as f:
+                data = f.read()
+            assert "Request throughput" in data and "scheduler.py:118" in data, log_path
+            assert os.path.exists(os.path.join(os.path.dirname(log_path),
+                                               "scheduler_profile.json")), log_path
+        print(f"stand-in sweep: {len(used)} item_tests on 3 slots in {elapsed:.2f}s, "
+              f"slots used: {sorted(set((u[0], u[1]) for u in used))}")
+
+        # 重跑同一批实验：全部从结果库返回，不再启动 server
+        launches = sum(s.state.launches for s in servers)
+        t0 = time.time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = sched.run()
+        assert all(r["status"] == "ok" for r in results.values()), results
+        assert sum(s.state.launches for s in servers) == launches
+        store = main.open_store(out + "/results.sqlite")
+        best = store.best({"ttft_p99_limit": 1e9, "tpot_p99_limit": 1e9})
+        assert len(best) == len(results), best
+        print(f"resume: {len(results)} item_tests from results store in {time.time() - t0:.2f}s, "
+              f"0 server launches")
+    finally:
+        with contextlib.redirect_stdout(io.StringIO()):
+            main.stop_servers()
+        os.chdir(cwd)
+        for s in servers:
+            s.close()
+        for path in roots + [out]:
+            shutil.rmtree(path)
+
+
+def server_reuse(launch_delay=1.0):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_server import LocalSSHServer
+
+    import main
+    from scheduler import Slot
+    # mns/mnbt 变化两次，其余只改变 request-rate
+    trials = [(64, 512, rr) for rr in (2, 4, 6, 8)] + [(128, 512, rr) for rr in (2, 4, 6)] + \
+             [(128, 1024, 2)]
+    cwd = os.getcwd()
+    reuse, exec_mode = main.reuse_server, main.exec_mode
+    reset_action = main.client_config["reset_action"]
+    timings = {}
+    try:
+        # "bad reset"：utils 不支持 reset_action（exec 模式下退出码非 0），复用时改为重启 server
+        for mode in (False, True, "bad reset"):
+            root, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+            server = LocalSSHServer(root_dir=root, launch_delay=launch_delay)
+            host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+                    "password": server.password, "prompt": server.prompt}
+            main.reuse_server = bool(mode)
+            main.exec_mode = mode == "bad reset" or exec_mode
+            main.client_config["reset_action"] = "clear" if mode == "bad reset" else reset_action
+            try:
+                t0 = time.time()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    ve = main.vllm_experiment(next(iter(main.config["models"])), "sharegpt", 10,
+                                              out, slot=Slot(host, [0, 1], 9100, "/vllm_test"))
+                    for mns, mnbt, rr in trials:
+                        record = ve.trial_result(True, mns, mnbt, rr)
+                        assert record[0]["Request throughput (req/s)"] > 0
+                        assert len(record[2].to_list()) == 5
+                    main.stop_servers()
+                timings[mode] = time.time() - t0
+                if mode is True:
+                    assert server.state.launches == 3, server.state.launches
+                    assert server.state.resets == len(trials) - 3, server.state.resets
+                else:
+                    assert server.state.launches == len(trials), server.state.launches
+                    assert server.state.resets == 0
+                # shell 关闭后替身异步清理
+                deadline = time.time() + 5
+                while server.state.server_shells and time.time() < deadline:
+                    time.sleep(0.05)
+                assert not server.state.server_shells
+                print(f"server reuse={mode}: {len(trials)} trials, "
+                      f"{server.state.launches} launches, {server.state.resets} counter resets, "
+                      f"{timings[mode]:.2f}s")
+            finally:
+                server.close()
+                shutil.rmtree(root)
+                shutil.rmtree(out)
+    finally:
+        main.reuse_server, main.exec_mode = reuse, exec_mode
+        main.client_config["reset_action"] = reset_action
+        os.chdir(cwd)
+    print(f"server reuse saves {1 - timings[True] / timings[False]:.0%} wall-clock "
+          f"({launch_delay:.1f}s model load)")
+
+
+def parallel_search():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_server import LocalSSHServer
+
+    import main
+    roots = [tempfile.mkdtemp(), tempfile.mkdtemp()]
+    servers = [LocalSSHServer(root_dir=root) for root in roots]
+    hosts = [{"ip": "127.0.0.1", "port": s.port, "username": s.username,
+              "password": s.password, "prompt": s.prompt, "gpus": gpus}
+             for s, gpus in zip(servers, ([0, 1, 2, 3], [0, 1]))]
+    model = next(iter(main.config["models"]))
+    task = (model, "sharegpt", True)
+    cwd = os.getcwd()
+    parallel = main.parallel
+    trial_result = main.vllm_experiment.trial_result
+    failed = []
+
+    def flaky_trial(self, chunked_prefill, *params):
+        # 第一个 request-rate 为 12 的实验失败一次
+        if params[2] == 12 and not failed:
+            failed.append(list(params))
+            raise RuntimeError("injected trial failure")
+        return trial_result(self, chunked_prefill, *params)
+
+    stats = {}
+    try:
+        main.vllm_experiment.trial_result = flaky_trial
+        for n in (1, 3):
+            out = tempfile.mkdtemp()
+            main.parallel = n
+            failed.clear()
+            pool = SlotPool(hosts, main.default_host, 9200, "/vllm_test")
+            try:
+                t0 = time.time()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    if n == 1:
+                        ve = main.vllm_experiment(model, "sharegpt", 10, out,
+                                                  slot=pool.allocate(2))
+                        result = {task: {"status": "ok", "result": ve.opti_experiment(True)}}
+                    else:
+                        result = main.run_tasks_parallel([(task, 2, None)], pool, out)
+                    main.stop_servers()
+                elapsed = time.time() - t0
+                assert result[task]["status"] == "ok", result
+                store = main.open_store(out + "/results.sqlite")
+                done = store.rows(model)
+                stats[n] = (len(done), elapsed, result[task]["result"])
+                if n > 1:
+                    assert failed, "no trial failed"
+                    assert not any(r["params"] == dict(zip(("mns", "mnbt", "rr"), failed[0]))
+                                   for r in done), failed
+            finally:
+                shutil.rmtree(out)
+        for n, (trials, elapsed, best) in stats.items():
+            print(f"search parallel={n}: {trials} trials in {elapsed:.2f}s, best {best}")
+        rates = {n: trials / elapsed for n, (trials, elapsed, _) in stats.items()}
+        print(f"parallel search: {rates[1]:.2f} trials/s on 1 slot, {rates[3]:.2f} trials/s "
+              f"on 3 slots, 1 injected failure skipped")
+    finally:
+        main.vllm_experiment.trial_result = trial_result
+        main.parallel = parallel
+        os.chdir(cwd)
+        for s in servers:
+            s.close()
+        for path in roots:
+            shutil.rmtree(path)
+
+
+def failed_trial():
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from local_server import LocalSSHServer
+
+    import main
+    from scheduler import Slot
+    root, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = LocalSSHServer(root_dir=root)
+    host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+            "password": server.password, "prompt": server.prompt}
+    cwd = os.getcwd()
+    post_handle = main.vllm_experiment.post_handle
+    term_normalizer = main.TermNormalizer
+    shells = []
+
+    def failing_post_handle(self, item_folder):
+        shells.append(self.client_ssh)
+        raise RuntimeError("injected post_handle failure")
+
+    try:
+        main.vllm_experiment.post_handle = failing_post_handle
+        with contextlib.redirect_stdout(io.StringIO()):
+            ve = main.vllm_experiment(next(iter(main.config["models"])), "sharegpt", 10, out,
+                                      slot=Slot(host, [0, 1], 9300, "/vllm_test"))
+            try:
+                ve.item_test(True, 64, 512, 2)
+                raise AssertionError("item_test did not raise")
+            except RuntimeError:
+                pass
+            main.stop_servers()
+        assert shells and shells[0].ssh is None and shells[0].channel.closed, shells
+        assert ve.client_ssh is None
+        assert not main.open_store(out + "/results.sqlite").rows(ve.model_name)
+        print("failed trial: client shell closed, trial recorded as failed")
+
+        # client 输出整理出错：读取中途抛出异常
+        def failing_normalizer(*args, **kwargs):
+            def sink(text):
+                raise ValueError("injected normalizer failure")
+            return sink
+        main.vllm_experiment.post_handle = post_handle
+        main.TermNormalizer = failing_normalizer
+        with contextlib.redirect_stdout(io.StringIO()):
+            try:
+                ve.item_test(True, 64, 512, 4)
+                raise AssertionError("item_test did not raise")
+            except ValueError:
+                pass
+            main.stop_servers()
+        assert not [t for t in threading.enumerate() if t.name == "ChannelLogWriter"]
+        item_folder = glob.glob(out + "/**/64_512_4", recursive=True)[0]
+        parts = log_files(item_folder + "/server_log")
+        assert parts and parts[0] != item_folder + "/server_log", parts
+        for part in parts:
+            with gzip.open(part, "rb") as f:
+                f.read()
+        print(f"failed benchmark read: server_log writer stopped, {len(parts)} gzip parts complete")
+    finally:
+        main.TermNormalizer = term_normalizer
+        main.vllm_experiment.post_handle = post_handle
+        os.chdir(cwd)
+        server.close()
+        shutil.rmtree(root)
+        shutil.rmtree(out)
+
+
+if __name__ == "__main__":
+    fake_sweep()
+    stand_in_sweep()
+    server_reuse()
+    parallel_search()
+    failed_trial()
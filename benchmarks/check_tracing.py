@@ -0,0 +1,102 @@
+"""
+分阶段计时（tracing.py）的本地检查。
+
+在本地 SSH 替身上打开 trace，跑几次实验（两次只改 request-rate 复用 server，一次重启），
+检查 trace.jsonl 中各阶段 span 齐全、嵌套关系完整、字节数已记录，打印按模型分组的汇总，
+并导出 Chrome trace；最后测量 span 在关闭/打开时的单次开销。
+
+用法：python benchmarks/check_tracing.py [--keep trace.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import tracing  # noqa: E402
+
+PHASES = ["trial", "client.setup", "server.acquire", "server.launch", "server.setup",
+          "server.model_load", "server.reset", "benchmark", "profiling.save", "post_cmds",
+          "sftp.sync", "link_tree", "ssh.connect", "ssh.exec", "server.stop"]
+
+
+def span_overhead(n=100000):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        with tracing.span("x"):
+            pass
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keep", default=None, help="保存 Chrome trace 到该路径")
+    args = parser.parse_args()
+
+    from local_server import LocalSSHServer
+    import main as vllm_main
+    from scheduler import Slot
+
+    root, out = tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = LocalSSHServer(root_dir=root, launch_delay=0.5)
+    host = {"ip": "127.0.0.1", "port": server.port, "username": server.username,
+            "password": server.password, "prompt": server.prompt}
+    cwd = os.getcwd()
+    tracing_config, reuse = vllm_main.tracing_config, vllm_main.reuse_server
+    vllm_main.tracing_config, vllm_main.reuse_server = {"enabled": True}, True
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            ve = vllm_main.vllm_experiment(next(iter(vllm_main.config["models"])), "sharegpt",
+                                           10, out, slot=Slot(host, [0, 1], 9300, "/vllm_test"))
+            for params in ([64, 512, 2], [64, 512, 4], [128, 512, 2]):
+                ve.item_test(True, *params)
+            vllm_main.stop_servers()
+        tracing.close_trace()
+        spans = tracing.load(os.path.join(out, "trace.jsonl"))
+        names = {s["name"] for s in spans}
+        assert not set(PHASES) - names, set(PHASES) - names
+        ids = {(s["pid"], s["id"]) for s in spans}
+        assert all(s["parent"] is None or (s["pid"], s["parent"]) in ids for s in spans)
+        trials = [s for s in spans if s["name"] == "trial"]
+        assert len(trials) == 3 and all(s["status"] == "ok" for s in trials)
+        acquire = [s["attrs"]["reused"] for s in spans if s["name"] == "server.acquire"]
+        assert acquire == [False, True, False], acquire
+        assert sum(s["attrs"].get("bytes", 0) for s in spans if s["name"] == "benchmark") > 0
+        assert sum(s["attrs"].get("bytes", 0) for s in spans if s["name"] == "sftp.sync") > 0
+
+        print(f"{len(spans)} spans for {len(trials)} trials, all phases present, tree intact\n")
+        tracing.print_summary(spans, by="model")
+        chrome = args.keep or os.path.join(out, "trace.json")
+        tracing.to_chrome(spans, chrome)
+        with open(chrome) as f:
+            events = json.load(f)["traceEvents"]
+        assert sum(e["ph"] == "X" for e in events) == len(spans)
+        print(f"\nchrome trace: {len(events)} events" + (f" -> {chrome}" if args.keep else ""))
+    finally:
+        vllm_main.tracing_config, vllm_main.reuse_server = tracing_config, reuse
+        tracing.close_trace()
+        server.close()
+        os.chdir(cwd)
+        shutil.rmtree(root)
+        shutil.rmtree(out)
+
+    disabled = span_overhead()
+    scratch = tempfile.mkdtemp()
+    try:
+        tracing.open_trace(os.path.join(scratch, "t.jsonl"))
+        enabled = span_overhead(20000)
+    finally:
+        tracing.close_trace()
+        shutil.rmtree(scratch)
+    print(f"span overhead: {disabled:.2f} us disabled, {enabled:.1f} us enabled (incl. write)")
+
+
+if __name__ == "__main__":
+    main()
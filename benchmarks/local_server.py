@@ -0,0 +1,481 @@
+"""
+本地 paramiko SSH 服务端替身，供 benchmarks 下的脚本使用。
+
+交互 shell 模拟远端 vLLM 环境：回显命令、打印 prompt，支持 cd/export/echo/sleep，
+模拟 vllm api_server 启动与日志刷屏、benchmark_serving2.py 进度条与结果、
+post_scheduler_view_action.py 触发的 profiling 输出。
+exec 请求交给本地 /bin/sh 执行，SFTP 子系统映射到 root_dir。
+"""
+import os
+import re
+import shlex
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+
+_host_key = None
+
+
+def get_host_key():
+    global _host_key
+    if _host_key is None:
+        _host_key = paramiko.RSAKey.generate(2048)
+    return _host_key
+
+
+SERVER_RUN_LINES = [
+    "INFO scheduler.py:117] Max   10.0  128.0  0.0  50.0  2.0  9,000.0  0.95  0.80  0.01",
+    "INFO scheduler.py:117] Mean   3.0   90.0  0.0  10.0  0.5  2,000.0  0.60  0.50  0.00",
+    "INFO scheduler.py:117] Min    0.0    1.0  0.0   0.0  0.0      0.0  0.01  0.01  0.00",
+]
+SERVER_RES_LINES = [
+    "INFO scheduler.py:118] Sum  900.0  300.0  200.0  5,000.0  40.0  400,000.0",
+    "INFO scheduler.py:118] Max    2.0    1.0    0.5     20.0   0.08    2,000.0",
+    "INFO scheduler.py:118] Mean   0.5    0.2    0.1      3.0   0.03      200.0",
+    "INFO scheduler.py:118] Min    0.1    0.0    0.0      0.1   0.01        1.0",
+    "INFO scheduler.py:118] P99    1.5    0.8    0.4     15.0   0.06    1,500.0",
+]
+CLIENT_RES_TEMPLATE = """============ Serving Benchmark Result ============
+Successful requests:                     {num}
+Benchmark duration (s):                  {duration:.2f}
+Total input tokens:                      {tin}
+Total generated tokens:                  {tout}
+Mean input tokens:                       200.00
+Median input tokens:                     180.00
+Max input tokens:                        1000
+Mean generated tokens:                   250.00
+Median generated tokens:                 240.00
+Max generated tokens:                    1200
+Request throughput (req/s):              {rps:.2f}
+Input token throughput (tok/s):          {itps:.2f}
+Output token throughput (tok/s):         {otps:.2f}
+Mean Latency (ms):                       5000.00
+Median Latency (ms):                     4800.00
+P99 Latency (ms):                        12000.00
+Mean TTFT (ms):                          300.00
+Median TTFT (ms):                        250.00
+P99 TTFT (ms):                           {ttft:.2f}
+Mean TPOT (ms):                          40.00
+Median TPOT (ms):                        38.00
+P99 TPOT (ms):                           {tpot:.2f}
+=================================================="""
+
+
+class _SharedState:
+    """同一个替身服务端内，各连接共享的“远端”状态"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.server_shells = []  # 正在运行 api_server 的 shell
+        self.launches = 0
+        self.resets = 0
+        self.execs = 0
+        self.connections = 0
+        self.benches = {}  # port -> (request-rate, 开始时间)，正在运行的 benchmark
+        self.fail_actions = set()  # 模拟失败的 utils action（如 save）
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    def __init__(self, owner):
+        self.owner = owner
+
+    def check_auth_password(self, username, password):
+        if username == self.owner.username and password == self.owner.password:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height,
+                                  pixelwidth, pixelheight, modes):
+        return True
+
+    def check_channel_shell_request(self, channel):
+        shell = FakeShell(self.owner, channel)
+        threading.Thread(target=shell.run, daemon=True).start()
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.owner.run_exec, args=(channel, command),
+                         daemon=True).start()
+        return True
+
+
+class _SFTPHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+
+class _SFTPServer(paramiko.SFTPServerInterface):
+    """只读为主的 SFTP 替身，路径映射到 root_dir"""
+    root = "/"
+
+    def _local(self, path):
+        return os.path.join(self.root, os.path.normpath("/" + path).lstrip("/"))
+
+    def list_folder(self, path):
+        local = self._local(path)
+        try:
+            out = []
+            for name in os.listdir(local):
+                attr = paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(local, name)))
+                attr.filename = name
+                out.append(attr)
+            return out
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def stat(self, path):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.stat(self._local(path)))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    lstat = stat
+
+    def open(self, path, flags, attr):
+        local = self._local(path)
+        try:
+            binary_flag = getattr(os, "O_BINARY", 0)
+            fd = os.open(local, flags | binary_flag, 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & (os.O_WRONLY | os.O_RDWR):
+            mode = "ab" if flags & os.O_APPEND else "r+b" if flags & os.O_RDWR else "wb"
+        else:
+            mode = "rb"
+        f = os.fdopen(fd, mode)
+        handle = _SFTPHandle(flags)
+        handle.filename = local
+        handle.readfile = f
+        handle.writefile = f
+        return handle
+
+
+class FakeShell:
+    """交互 shell 模拟：pty 回显 + prompt"""
+
+    def __init__(self, owner, channel):
+        self.owner = owner
+        self.channel = channel
+        self.cwd = "/"
+        self.env = {}
+        self.interrupt = threading.Event()
+        self.serving = False
+        self.profiling_save = threading.Event()
+
+    def send(self, text):
+        try:
+            self.channel.sendall(text.replace("\n", "\r\n").encode("utf-8"))
+        except (OSError, EOFError):
+            pass
+
+    def run(self):
+        self.send(self.owner.banner + self.owner.prompt)
+        pending = ""
+        worker = None
+        while True:
+            try:
+                data = self.channel.recv(4096)
+            except (OSError, EOFError):
+                break
+            if not data:
+                break
+            pending += data.decode("utf-8", errors="replace")
+            while True:
+                if "\x03" in pending:
+                    # Ctrl-C 打断当前命令
+                    pending = pending.replace("\x03", "", 1)
+                    self.interrupt.set()
+                    if worker is not None and worker.is_alive():
+                        worker.join()
+                        worker = None
+                    else:
+                        self.send("^C\n" + self.owner.prompt)
+                    continue
+                if "\r" not in pending:
+                    break
+                cmd, pending = pending.split("\r", 1)
+                self.send(cmd + "\n")
+                if worker is not None and worker.is_alive():
+                    # 前台命令运行中，输入被吞掉
+                    continue
+                self.interrupt.clear()
+                worker = threading.Thread(target=self._run_cmd, args=(cmd,), daemon=True)
+                worker.start()
+        self.interrupt.set()
+        with self.owner.state.lock:
+            if self in self.owner.state.server_shells:
+                self.owner.state.server_shells.remove(self)
+
+    def _run_cmd(self, cmd):
+        try:
+            self.execute(cmd.strip())
+        finally:
+            self.send(self.owner.prompt)
+
+    def execute(self, cmd):
+        if not cmd:
+            return
+        if " && " in cmd:
+            for part in cmd.split(" && "):
+                self.execute(part.strip())
+            return
+        try:
+            args = shlex.split(cmd)
+        except ValueError:
+            args = cmd.split()
+        name = args[0]
+        if name == "cd":
+            self.cwd = args[1] if len(args) > 1 else "/"
+        elif name == "mkdir":
+            for path in args[1:]:
+                if not path.startswith("-"):
+                    os.makedirs(os.path.join(self.owner.root_dir, path.lstrip("/")),
+                                exist_ok=True)
+        elif name == "export":
+            for item in args[1:]:
+                k, _, v = item.partition("=")
+                self.env[k] = v
+        elif name == "echo":
+            self.send(" ".join(args[1:]) + "\n")
+        elif name == "sleep":
+            self.interrupt.wait(float(args[1]))
+        elif name == "flood":
+            # flood <bytes>：一次性输出大量日志
+            self.send(_log_bytes(int(args[1])))
+        elif name in ("python", "python3") and "vllm.entrypoints.openai.api_server" in cmd:
+            self._serve(cmd)
+        elif name in ("python", "python3") and "benchmark_serving2.py" in cmd:
+            self._benchmark(cmd)
+        elif name in ("python", "python3") and "post_scheduler_view_action.py" in cmd:
+            self._utils(cmd)
+        else:
+            self.send("sh: " + name + ": command not found\n")
+
+    def _serve(self, cmd):
+        owner = self.owner
+        with owner.state.lock:
+            owner.state.launches += 1
+            owner.state.server_shells.append(self)
+        if self.interrupt.wait(owner.launch_delay):
+            self._stop_serving()
+            return
+        m = re.search(r"--port (\d+)", cmd)
+        port = m.group(1) if m else "8000"
+        self.send("INFO:     Uvicorn running on http://0.0.0.0:%s (Press CTRL+C to quit)\n"
+                  % port)
+        self.serving = True
+        line = ("INFO metrics.py:334] Avg prompt throughput: 0.0 tokens/s, Avg generation "
+                "throughput: 1200.0 tokens/s, Running: 64 reqs, Swapped: 0 reqs, "
+                "Pending: 0 reqs, GPU KV cache usage: 40.0%, CPU KV cache usage: 0.0%.\n")
+        while not self.interrupt.is_set():
+            if self.profiling_save.is_set():
+                self.profiling_save.clear()
+                folder = os.path.join(owner.root_dir, self.cwd.lstrip("/"))
+                if os.path.isdir(folder):
+                    with open(os.path.join(folder, "scheduler_profile.json"), "w") as f:
+                        f.write('{"cmd": %r}\n' % cmd)
+                self.send("vLLM scheduler profiling save...\n" +
+                          "\n".join(SERVER_RUN_LINES + SERVER_RES_LINES) + "\n" +
+                          'INFO:     127.0.0.1:5000 - "POST /v1/completions HTTP/1.1" 200 OK\n')
+            bench = owner.state.benches.get(port)
+            if bench is not None:
+                # benchmark 运行中：服务能力 capacity req/s，request-rate 更高时排队线性增长
+                rr, start = bench
+                pending = int(max(rr - owner.capacity, 0) * (time.time() - start))
+                self.send("INFO metrics.py:334] Avg prompt throughput: 900.0 tokens/s, Avg "
+                          "generation throughput: 1200.0 tokens/s, Running: 64 reqs, Swapped: "
+                          "0 reqs, Pending: %d reqs, GPU KV cache usage: 40.0%%, CPU KV cache "
+                          "usage: 0.0%%.\n" % pending)
+            if owner.server_log_rate > 0:
+                self.send(line * owner.server_log_rate)
+            self.interrupt.wait(0.01 if owner.server_log_rate > 0 else 0.05)
+        self._stop_serving()
+
+    def _stop_serving(self):
+        self.serving = False
+        with self.owner.state.lock:
+            if self in self.owner.state.server_shells:
+                self.owner.state.server_shells.remove(self)
+        self.send("^C\n")
+
+    def _benchmark(self, cmd):
+        owner = self.owner
+        m = re.search(r"--num-prompts=(\d+)", cmd)
+        num = int(m.group(1)) if m else 100
+        m = re.search(r"--request-rate=([\d.]+)", cmd)
+        rr = float(m.group(1)) if m else 10.0
+        m = re.search(r"--port (\d+)", cmd)
+        port = m.group(1) if m else "8000"
+        start = time.time()
+        owner.state.benches[port] = (rr, start)
+        steps = 20
+        try:
+            for i in range(steps + 1):
+                bar = "█" * i + " " * (steps - i)
+                self.send("\r %3d%%|%s| %d/%d [00:0%d<00:00]" % (i * 5, bar, i * num // steps, num, i % 10))
+                if self.interrupt.wait(owner.benchmark_duration / steps):
+                    self.send("\nKeyboardInterrupt\n")
+                    return
+        finally:
+            owner.state.benches.pop(port, None)
+        duration = time.time() - start
+        rps = min(rr, owner.capacity)
+        self.send("\n" + CLIENT_RES_TEMPLATE.format(
+            num=num, duration=duration, tin=num * 200, tout=num * 250, rps=rps,
+            itps=rps * 200, otps=rps * 250, ttft=600.0 + 100 * rr, tpot=40.0 + 2 * rr) + "\n")
+
+    def _utils(self, cmd):
+        self.send("ok\n" if self.owner.utils_action(cmd) else "error: invalid choice\n")
+
+
+def _log_bytes(n):
+    line = "INFO 05-01 12:00:00 scheduler.py:200] waiting 3 running 64 swapped 0 ñ\n"
+    return (line * (n // len(line) + 1))[:n]
+
+
+class LocalSSHServer:
+    """
+    在后台线程中监听 127.0.0.1 的 SSH 替身服务
+    launch_delay，模拟模型加载耗时(s)
+    benchmark_duration，模拟 benchmark 耗时(s)
+    server_log_rate，server 每 10ms 打印的日志行数
+    handshake_delay，模拟广域网下每次握手额外耗时(s)
+    capacity，模拟的服务能力(req/s)，request-rate 超过时 server 的 Pending 请求数持续增长
+    """
+
+    def __init__(self, root_dir="/", username="root", password="pw", prompt="# ",
+                 launch_delay=0.2, benchmark_duration=0.2, server_log_rate=0,
+                 handshake_delay=0.0, capacity=8.0):
+        self.root_dir = root_dir
+        self.username = username
+        self.password = password
+        self.prompt = prompt
+        self.banner = "Welcome to local stand-in\n"
+        self.launch_delay = launch_delay
+        self.benchmark_duration = benchmark_duration
+        self.server_log_rate = server_log_rate
+        self.capacity = capacity
+        self.handshake_delay = handshake_delay
+        self.state = _SharedState()
+        self.transports = []
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(128)
+        self.port = self.sock.getsockname()[1]
+        self.running = True
+        self.thread = threading.Thread(target=self._accept_loop, daemon=True)
+        self.thread.start()
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(client,), daemon=True).start()
+
+    def _handle(self, client):
+        if self.handshake_delay:
+            time.sleep(self.handshake_delay)
+        with self.state.lock:
+            self.state.connections += 1
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        t = paramiko.Transport(client)
+        t.add_server_key(get_host_key())
+        root = self.root_dir
+
+        class _Root(_SFTPServer):
+            pass
+        _Root.root = root
+        t.set_subsystem_handler("sftp", paramiko.SFTPServer, _Root)
+        self.transports.append(t)
+        try:
+            t.start_server(server=_ServerInterface(self))
+        except (paramiko.SSHException, EOFError, OSError):
+            return
+
+    def utils_action(self, cmd):
+        """post_scheduler_view_action.py：reset 计数，save 让各 server shell 打印 profiling 统计，
+        其他 action 和 state.fail_actions 中的 action 返回 False"""
+        if any("--action " + action in cmd for action in self.state.fail_actions):
+            return False
+        if "--action reset" in cmd:
+            with self.state.lock:
+                self.state.resets += 1
+            return True
+        if "--action save" in cmd:
+            with self.state.lock:
+                shells = list(self.state.server_shells)
+            for shell in shells:
+                shell.profiling_save.set()
+            return True
+        return False
+
+    def run_exec(self, channel, command):
+        if isinstance(command, bytes):
+            command = command.decode("utf-8")
+        with self.state.lock:
+            self.state.execs += 1
+        if "post_scheduler_view_action.py" in command:
+            # exec 模式的 utils 命令，前面的 cd/export 忽略
+            # 等 exec 请求的应答先发出，否则客户端会先收到 close
+            time.sleep(0.01)
+            if self.utils_action(command):
+                channel.sendall(b"ok\n")
+                channel.send_exit_status(0)
+            else:
+                channel.sendall_stderr(b"error: invalid choice\n")
+                channel.send_exit_status(2)
+            channel.close()
+            return
+        proc = subprocess.Popen(["/bin/sh", "-c", command], cwd=self.root_dir,
+                                stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+
+        def pump_in():
+            try:
+                for chunk in iter(lambda: channel.recv(65536), b""):
+                    proc.stdin.write(chunk)
+                    proc.stdin.flush()
+            except (OSError, EOFError, ValueError):
+                pass
+            try:
+                proc.stdin.close()
+            except OSError:
+                pass
+        threading.Thread(target=pump_in, daemon=True).start()
+
+        def pump_err():
+            for chunk in iter(lambda: proc.stderr.read1(65536), b""):
+                channel.sendall_stderr(chunk)
+        err = threading.Thread(target=pump_err, daemon=True)
+        err.start()
+        try:
+            for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+                channel.sendall(chunk)
+        except (OSError, EOFError):
+            proc.kill()
+        err.join()
+        channel.send_exit_status(proc.wait())
+        channel.close()
+
+    def close(self):
+        self.running = False
+        self.sock.close()
+        for t in self.transports:
+            t.close()
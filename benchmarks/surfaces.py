@@ -0,0 +1,171 @@
+"""
+合成的 vLLM 吞吐量/延迟响应面，供离线调优基准使用，不需要 GPU。
+
+模型很粗糙，只保留调优关心的形状：
+- TPOT 随并发序列数线性增长，max_num_seqs 受 KV cache 容量限制，超出后发生抢占
+- 负载 rho = request-rate / 服务能力，接近 1 时排队时间急剧上升，超过 1 后积压
+- enable_chunked 时 max_num_batched_tokens 决定 prefill 分块数，影响 TTFT 和服务能力
+server 端统计量按同样的模型生成，get_opti_dir 可以正常工作。
+"""
+import hashlib
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+from log_process import server_run_columns, server_run_rows, server_res_columns, \
+    server_res_rows
+
+# 场景参数
+# t0/k，TPOT(ms) = t0 + k * 并发数
+# kv_seqs，KV cache 最多容纳的序列数
+# in_len/out_len，平均输入/输出 token 数
+SCENARIOS = {
+    "13b-sharegpt": {"t0": 18.0, "k": 0.30, "kv_seqs": 300, "in_len": 220, "out_len": 250},
+    "7b-gsm": {"t0": 12.0, "k": 0.12, "kv_seqs": 640, "in_len": 120, "out_len": 180},
+    "70b-long": {"t0": 45.0, "k": 0.45, "kv_seqs": 96, "in_len": 900, "out_len": 300},
+}
+
+
+class SyntheticSurface:
+    # noise，吞吐量和延迟的相对噪声，同一参数点的噪声固定
+    def __init__(self, scenario="13b-sharegpt", num_prompts=2000, noise=0.0, seed=0):
+        self.name = scenario
+        self.p = SCENARIOS[scenario]
+        self.num_prompts = num_prompts
+        self.noise = noise
+        self.seed = seed
+
+    def jitter(self, params, salt):
+        if not self.noise:
+            return 1.0
+        key = f"{self.seed}/{salt}/{params}".encode()
+        rng = np.random.default_rng(int(hashlib.md5(key).hexdigest()[:8], 16))
+        return max(0.5, 1.0 + self.noise * rng.standard_normal())
+
+    def model(self, mns, mnbt, rr):
+        """ 返回响应面的各个标量，grid_optimum 穷举时不构造 DataFrame """
+        p = self.p
+        seqs = min(mns, p["kv_seqs"])
+        preempt = max(0.0, (mns - p["kv_seqs"]) / mns)
+        # 每个 decode 步里 prefill 占用的时间比例
+        if mnbt is None:
+            chunks = 1
+            prefill_cost = 0.15
+        else:
+            chunks = math.ceil(p["in_len"] / mnbt)
+            prefill_cost = 0.05 + 0.02 * chunks + 60.0 / mnbt
+        tpot_full = (p["t0"] + p["k"] * seqs) * (1 + prefill_cost) * (1 + preempt)
+        cap = seqs / (p["out_len"] * tpot_full / 1000)
+
+        rho = rr / cap
+        running = seqs * min(1.0, rho)
+        tpot = (p["t0"] + p["k"] * running) * (1 + prefill_cost) * (1 + preempt)
+        context = chunks * tpot + 0.08 * p["in_len"]
+        duration = self.num_prompts / min(rr, cap)
+        if rho < 0.95:
+            queue = 30 * rho / (1 - rho)
+        else:
+            # 积压时队尾请求的等待时间
+            queue = 30 * 19 + 1000 * duration * max(0.0, 1 - 1 / rho)
+        params = (mns, mnbt, rr)
+        thr = min(rr, cap) * self.jitter(params, "thr")
+        ttft = (queue + context) * 1.3 * self.jitter(params, "ttft")
+        tpot99 = tpot * 1.15 * self.jitter(params, "tpot")
+
+        return {"seqs": seqs, "preempt": preempt, "cap": cap, "running": running, "tpot": tpot,
+                "context": context, "queue": queue, "duration": duration,
+                "thr": thr, "ttft": ttft, "tpot99": tpot99}
+
+    def evaluate(self, mns, mnbt, rr):
+        """ 返回与 extract_log 相同结构的 (client_res, server_run_df, server_res_df) """
+        p = self.p
+        m = self.model(mns, mnbt, rr)
+        running, preempt, cap, duration = m["running"], m["preempt"], m["cap"], m["duration"]
+        thr, ttft, tpot, tpot99 = m["thr"], m["ttft"], m["tpot"], m["tpot99"]
+        queue, context = m["queue"], m["context"]
+        tin = self.num_prompts * p["in_len"]
+        tout = self.num_prompts * p["out_len"]
+        client_res = {
+            "Successful requests": self.num_prompts,
+            "Benchmark duration (s)": duration,
+            "Total input tokens": tin,
+            "Total generated tokens": tout,
+            "Request throughput (req/s)": thr,
+            "Input token throughput (tok/s)": thr * p["in_len"],
+            "Output token throughput (tok/s)": thr * p["out_len"],
+            "Mean TTFT (ms)": ttft / 2,
+            "P99 TTFT (ms)": ttft,
+            "Mean TPOT (ms)": tpot,
+            "P99 TPOT (ms)": tpot99,
+        }
+        batch_utils = running / mns
+        block_utils = min(1.0, running / p["kv_seqs"])
+        waiting = max(0.0, rr - cap) * duration
+        run = [[waiting, running, 0, rr, preempt * rr, rr * p["in_len"], batch_utils,
+                block_utils, preempt],
+               [waiting / 2, running * 0.8, 0, rr / 2, preempt * rr / 2, rr * p["in_len"] / 2,
+                batch_utils * 0.8, block_utils * 0.8, preempt / 2],
+               [0, 1, 0, 0, 0, 0, 1 / mns, 0.01, 0]]
+        server_run_df = pd.DataFrame(run, columns=server_run_columns, index=server_run_rows,
+                                     dtype=float)
+        row = [ttft / 1000, queue / 1000, context / 1000, tpot * p["out_len"] / 1000,
+               tpot / 1000, p["out_len"]]
+        res = [[v * self.num_prompts for v in row], [v * 1.5 for v in row], row,
+               [v * 0.1 for v in row], [v * 1.3 for v in row]]
+        server_res_df = pd.DataFrame(res, columns=server_res_columns, index=server_res_rows,
+                                     dtype=float)
+        return client_res, server_run_df, server_res_df
+
+    def grid_optimum(self, step_cfg, limits):
+        """ 在 bound/min_step_num 网格上穷举，返回满足约束的最大吞吐量及其参数 """
+        axes = []
+        for name in ("max_num_seqs", "max_num_batched_tokens", "request-rate"):
+            cfg = step_cfg[name]
+            if cfg["min_step_num"] is None:
+                axes.append([cfg["default"]])
+            else:
+                values = np.arange(cfg["bound"][0], cfg["bound"][1] + cfg["min_step_num"] / 2,
+                                   cfg["min_step_num"]).tolist()
+                axes.append([int(v) if v.is_integer() else v for v in values])
+        best, best_params = -1, None
+        for mns in axes[0]:
+            for mnbt in axes[1]:
+                if mnbt is not None and mns > mnbt:
+                    continue
+                for rr in axes[2]:
+                    m = self.model(mns, mnbt, rr)
+                    if m["ttft"] > limits["ttft_p99_limit"] or \
+                       m["tpot99"] > limits["tpot_p99_limit"]:
+                        continue
+                    if m["thr"] > best:
+                        best, best_params = m["thr"], [mns, mnbt, rr]
+        return best, best_params
+
+
+def format_log(client_res, server_run_df, server_res_df):
+    """ 按 item_test 写出的 log.txt 格式生成文本 """
+    lines = ["============ Serving Benchmark Result ============"]
+    for key, value in client_res.items():
+        lines.append(f"{key + ':':<41}{value:.2f}")
+    lines.append("==================================================")
+    lines.append("data split")
+    for row in server_run_rows:
+        values = "  ".join(f"{v:,.2f}" for v in server_run_df.loc[row])
+        lines.append(f"INFO scheduler.py:117] {row}  {values}")
+    for row in server_res_rows:
+        values = "  ".join(f"{v:,.4f}" for v in server_res_df.loc[row])
+        lines.append(f"INFO scheduler.py:118] {row}  {values}")
+    return "\n".join(lines) + "\n"
+
+
+def write_tree(surface, folder, model, dataset, chunked_prefill, points):
+    """ 把若干参数点的结果写成 output_folder/model/dataset/num_prompts/... 的目录结构 """
+    chunked_str = "enable_chunked" if chunked_prefill else "disable_chunked"
+    for mns, mnbt, rr in points:
+        item = os.path.join(folder, model, dataset, str(surface.num_prompts), chunked_str,
+                            f"{mns}_{mnbt}_{rr}")
+        os.makedirs(item, exist_ok=True)
+        with open(os.path.join(item, "log.txt"), "w") as f:
+            f.write(format_log(*surface.evaluate(mns, mnbt, rr)))
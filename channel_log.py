@@ -0,0 +1,225 @@
+import gzip
+import os
+import re
+import threading
+import time
+from collections import deque
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def open_compressed(path, mode='rt'):
+    """ 按后缀打开 .gz/.zst 压缩日志，其余按普通文本打开 """
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8', errors='replace') if 't' in mode \
+            else gzip.open(path, mode)
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise RuntimeError("reading .zst logs requires the zstandard package")
+        import io
+        raw = open(path, 'rb')
+        stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        if 't' in mode:
+            return io.TextIOWrapper(stream, encoding='utf-8', errors='replace')
+        return stream
+    return open(path, mode, encoding='utf-8', errors='replace') if 't' in mode \
+        else open(path, mode)
+
+
+def log_parts(prefix):
+    """ 按轮转顺序返回 prefix.0.gz, prefix.1.gz ... """
+    folder = os.path.dirname(prefix) or '.'
+    base = os.path.basename(prefix) + '.'
+    parts = []
+    for name in os.listdir(folder):
+        if not name.startswith(base):
+            continue
+        idx = name[len(base):].split('.')[0]
+        if idx.isdigit():
+            parts.append((int(idx), os.path.join(folder, name)))
+    return [path for _, path in sorted(parts)]
+
+
+def log_files(path):
+    """
+    path 为 ChannelLog 的前缀（如 server_log）或其中一个分段（server_log.0.gz）时，
+    按轮转顺序返回所有分段，其余返回 [path]
+    """
+    m = re.match(r'(.*)\.\d+\.(?:gz|zst)$', path)
+    if m is not None or not os.path.exists(path):
+        parts = log_parts(m.group(1) if m is not None else path)
+        if parts:
+            return parts
+    return [path]
+
+
+def read_log(path):
+    """ 读取日志全文；ChannelLog 的各分段按顺序拼接后再解码，轮转处被截断的字符不会损坏 """
+    files = log_files(path)
+    if len(files) == 1:
+        with open_compressed(files[0], 'rt') as f:
+            return f.read()
+    chunks = []
+    for part in files:
+        with open_compressed(part, 'rb') as f:
+            chunks.append(f.read())
+    return b''.join(chunks).decode('utf-8', errors='replace')
+
+
+# 持续接收的 channel 输出落盘
+# feed 只做内存操作，永不阻塞 drain 线程；压缩和写文件在单独的写线程中完成
+# 最近 ring_size 字节保存在内存环形缓冲中，供 tail/wait_for 快速查询
+class ChannelLog:
+    # prefix，输出文件前缀，实际文件为 prefix.0.gz、prefix.1.gz ...
+    # ring_size，内存中保留的最近字节数
+    # rotate_size，单个文件写入多少未压缩字节后轮转
+    # max_files，最多保留的文件数，None 表示全部保留
+    # max_pending，写线程积压的上限，超过后丢弃最旧的待写数据并计数
+    # codec，'gzip' 或 'zstd'
+    def __init__(self, prefix, ring_size=8 * 2**20, rotate_size=256 * 2**20,
+                 max_files=None, max_pending=256 * 2**20, codec='gzip', level=1):
+        if codec == 'zstd' and zstandard is None:
+            print("zstandard not installed, fall back to gzip")
+            codec = 'gzip'
+        self.prefix = prefix
+        self.ring_size = ring_size
+        self.rotate_size = rotate_size
+        self.max_files = max_files
+        self.max_pending = max_pending
+        self.codec = codec
+        self.level = level
+
+        self.cond = threading.Condition()
+        self.ring = deque()  # (起始偏移, bytes)
+        self.ring_bytes = 0
+        self.total_bytes = 0
+        self.pending = deque()
+        self.pending_bytes = 0
+        self.dropped_bytes = 0
+        self.closed = False
+
+        self.part = 0
+        self.part_bytes = 0
+        self.file = None
+        self.files = []
+        self.writer = threading.Thread(target=self.write_loop, name="ChannelLogWriter",
+                                       daemon=True)
+        self.writer.start()
+
+    def feed(self, data):
+        """ drain 线程调用，输入新收到的字节 """
+        if not data:
+            return
+        with self.cond:
+            self.ring.append((self.total_bytes, data))
+            self.ring_bytes += len(data)
+            self.total_bytes += len(data)
+            while self.ring_bytes > self.ring_size and len(self.ring) > 1:
+                self.ring_bytes -= len(self.ring.popleft()[1])
+
+            self.pending.append(data)
+            self.pending_bytes += len(data)
+            # 写线程跟不上时丢弃最旧的待写数据，而不是阻塞 channel
+            while self.pending_bytes > self.max_pending and len(self.pending) > 1:
+                dropped = self.pending.popleft()
+                self.pending_bytes -= len(dropped)
+                self.dropped_bytes += len(dropped)
+            self.cond.notify_all()
+
+    __call__ = feed
+
+    def open_part(self):
+        suffix = '.zst' if self.codec == 'zstd' else '.gz'
+        path = f"{self.prefix}.{self.part}{suffix}"
+        if self.codec == 'zstd':
+            raw = open(path, 'wb')
+            self.file = zstandard.ZstdCompressor(level=self.level).stream_writer(raw)
+        else:
+            self.file = gzip.open(path, 'wb', compresslevel=self.level)
+        self.files.append(path)
+        if self.max_files is not None and len(self.files) > self.max_files:
+            os.remove(self.files.pop(0))
+
+    def write_loop(self):
+        os.makedirs(os.path.dirname(self.prefix) or '.', exist_ok=True)
+        self.open_part()
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if not self.pending and self.closed:
+                    break
+                chunks = list(self.pending)
+                self.pending.clear()
+                self.pending_bytes = 0
+            data = b''.join(chunks)
+            self.file.write(data)
+            self.part_bytes += len(data)
+            if self.part_bytes >= self.rotate_size:
+                self.file.close()
+                self.part += 1
+                self.part_bytes = 0
+                self.open_part()
+        self.file.close()
+
+    def slice_at(self, start):
+        """
+        环形缓冲中偏移 start 之后的字节，返回 (实际起始偏移, bytes)
+        start 之后的部分已被挤出时，实际起始偏移为缓冲中最早的字节
+        """
+        with self.cond:
+            chunks = []
+            first = self.total_bytes
+            for offset, data in reversed(self.ring):
+                if offset + len(data) <= start:
+                    break
+                chunks.append(data[max(0, start - offset):])
+                first = max(start, offset)
+        return first, b''.join(reversed(chunks))
+
+    def slice(self, start):
+        """ 返回环形缓冲中偏移 start 之后的字节（已被挤出的部分会丢失） """
+        return self.slice_at(start)[1]
+
+    def tail(self, size=64 * 1024):
+        """ 最近 size 字节，解码为字符串 """
+        with self.cond:
+            start = max(0, self.total_bytes - size)
+        return self.slice(start).decode('utf-8', errors='replace')
+
+    def wait_for(self, pattern, since=0, timeout=360):
+        """
+        等待偏移 since 之后出现 pattern，返回 pattern 末尾的绝对偏移，超时返回 -1
+        每次唤醒只检查新数据和 len(pattern)-1 字节的重叠窗口
+        """
+        if isinstance(pattern, str):
+            pattern = pattern.encode('utf-8')
+        deadline = time.time() + timeout
+        checked = since
+        while True:
+            with self.cond:
+                total = self.total_bytes
+            if total > checked:
+                # 窗口从缓冲中实际的起始偏移算起，start 之前的字节被挤出时偏移仍然正确
+                start, window = self.slice_at(max(since, checked - len(pattern) + 1))
+                idx = window.find(pattern)
+                if idx >= 0:
+                    return start + idx + len(pattern)
+                checked = max(total, start + len(window))
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return -1
+            with self.cond:
+                if self.total_bytes == checked:
+                    self.cond.wait(remaining)
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        self.writer.join()
+        if self.dropped_bytes:
+            print(self.prefix, f"dropped {self.dropped_bytes} bytes while writer was behind")
@@ -0,0 +1,60 @@
+import math
+
+
+def fidelity_rungs(fidelity_cfg, num_prompts):
+    """ 各级的 num-prompts，从小到大，最后一级为完整实验的 num_prompts """
+    rungs = sorted({n for n in fidelity_cfg.get("rungs") or [] if 0 < n < num_prompts})
+    return rungs + [num_prompts]
+
+
+# 多保真度调优（successive halving）
+# 优化器在最低一级（少量 prompt）上完成完整的搜索，满足约束的实验按吞吐量排序，
+# 每级只把前 1/eta（至少 min_survivors 个）用下一级的 num-prompts 复测，最终结果只取最后一级
+# prompt 少时排队来不及积累，低一级满足约束的实验在高一级可能超限：
+# 晋级的实验超限时按排名依次补测后面的候选，直到凑够该级的名额或候选用完
+class SuccessiveHalving:
+    def __init__(self, rungs, eta=3, min_survivors=2):
+        self.rungs = rungs
+        self.eta = eta
+        self.min_survivors = min_survivors
+        self.results = []   # (num_prompts, params, eva)，按运行顺序
+
+    def keep(self, n):
+        return min(n, max(self.min_survivors, math.ceil(n / self.eta)))
+
+    # plan，已在 rungs[0] 上完成搜索的 OptiPlan，用于排序和按 limitation 评估
+    # evaluate(num_prompts, params)，运行（或从结果库读取）一次实验，返回 client_res
+    # 返回最后一级吞吐量最大的参数，没有满足约束的实验时返回 None
+    def run(self, plan, evaluate):
+        ranked = sorted((eva, i) for i, eva in enumerate(plan.eva_list) if eva > 0)
+        ranked = [plan.input_params_list[i] for _, i in reversed(ranked)]
+        for params, eva in zip(plan.input_params_list, plan.eva_list):
+            self.results.append((self.rungs[0], params, eva))
+        for num_prompts in self.rungs[1:]:
+            keep = self.keep(len(ranked))
+            if keep >= len(ranked) and num_prompts != self.rungs[-1]:
+                # 候选不多于名额，这一级筛选不掉任何实验，直接进入下一级
+                continue
+            survivors = []
+            for params in ranked:
+                if len(survivors) >= keep:
+                    break
+                print(f"\n======Promote {params} to num_prompts={num_prompts}======\n")
+                eva = plan.evaluate_experiment(evaluate(num_prompts, params))
+                self.results.append((num_prompts, params, eva))
+                if eva > 0:
+                    survivors.append((eva, params))
+            survivors.sort(key=lambda x: -x[0])
+            ranked = [params for _, params in survivors]
+        return ranked[0] if ranked else None
+
+    def trials(self, num_prompts):
+        return [r for r in self.results if r[0] == num_prompts]
+
+    def print_summary(self):
+        for num_prompts in self.rungs:
+            trials = self.trials(num_prompts)
+            feasible = [r for r in trials if r[2] > 0]
+            best = max(feasible, key=lambda r: r[2]) if feasible else None
+            print(f"num_prompts={num_prompts}: {len(trials)} trials, {len(feasible)} feasible"
+                  + (f", best {best[1]} {best[2]:.2f} req/s" if best else ""))
@@ -0,0 +1,158 @@
+import bisect
+
+import numpy as np
+
+from log_process import LogTable, server_run_columns, server_run_rows, \
+    server_res_columns, server_res_rows
+from param_space import core_names
+
+
+def param_dtype(names):
+    """ 实验参数，None（如 disable_chunked 时的 mnbt）存为 nan """
+    return np.dtype([(name, "f8") for name in names])
+
+
+def metric_dtype(dims):
+    """ 每次实验的指标；server 端两张表按 log_process 中的行列顺序存为定长数组 """
+    return np.dtype([
+        ("eva", "f8"),
+        ("throughput", "f8"),
+        ("ttft_p99", "f8"),
+        ("tpot_p99", "f8"),
+        ("input_tokens", "f8"),
+        ("generated_tokens", "f8"),
+        ("opti_dir", "f8", (dims,)),
+        ("server_run", "f8", (len(server_run_rows), len(server_run_columns))),
+        ("server_res", "f8", (len(server_res_rows), len(server_res_columns))),
+    ])
+
+
+client_fields = {
+    "throughput": "Request throughput (req/s)",
+    "ttft_p99": "P99 TTFT (ms)",
+    "tpot_p99": "P99 TPOT (ms)",
+    "input_tokens": "Total input tokens",
+    "generated_tokens": "Total generated tokens",
+}
+
+
+def table_array(df, rows, columns):
+    """ DataFrame 或 LogTable 转为定长数组，缺失的行列填 nan """
+    out = np.full((len(rows), len(columns)), np.nan)
+    if df is None or df.empty:
+        return out
+    if isinstance(df, LogTable):
+        return np.array(df.to_list(), dtype=float)
+    df = df.reindex(index=rows, columns=columns)
+    return df.to_numpy(dtype=float, na_value=np.nan)
+
+
+def to_value(x):
+    if np.isnan(x):
+        return None
+    return int(x) if float(x).is_integer() else float(x)
+
+
+# OptiPlan 的实验历史
+# 参数和指标存放在 numpy 结构化数组中，按需扩容
+# index，参数 -> 实验序号，查重 O(1)
+# lines，每个维度一张表：其余参数 -> 该维度取值有序的 [(取值, 实验序号)]，
+# 即参数空间中一条直线上的所有实验，邻居查询 O(log n)
+# names，参数名，与 param_space.ParamSpace.names 的顺序一致
+class TrialHistory:
+    def __init__(self, names=core_names, capacity=64):
+        self.names = list(names)
+        self.params = np.empty(capacity, dtype=param_dtype(self.names))
+        self.metrics = np.empty(capacity, dtype=metric_dtype(len(self.names)))
+        self.size = 0
+        self.index = {}
+        self.lines = [{} for _ in self.names]
+
+    def __len__(self):
+        return self.size
+
+    @staticmethod
+    def key(params):
+        return tuple(params)
+
+    @staticmethod
+    def line_key(params, dim):
+        return tuple(v for d, v in enumerate(params) if d != dim)
+
+    def grow(self):
+        capacity = 2 * len(self.params)
+        for name in ("params", "metrics"):
+            old = getattr(self, name)
+            new = np.empty(capacity, dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, name, new)
+
+    def append(self, params, eva, client_res, server_run_df=None, server_res_df=None):
+        """ 记录一次实验，返回实验序号 """
+        if self.size == len(self.params):
+            self.grow()
+        idx = self.size
+        self.params[idx] = tuple(np.nan if v is None else v for v in params)
+        row = self.metrics[idx]
+        row["eva"] = eva
+        for field, key in client_fields.items():
+            row[field] = client_res.get(key, np.nan)
+        row["opti_dir"] = 0
+        row["server_run"] = table_array(server_run_df, server_run_rows, server_run_columns)
+        row["server_res"] = table_array(server_res_df, server_res_rows, server_res_columns)
+        self.size += 1
+
+        self.index[self.key(params)] = idx
+        for dim in range(len(self.names)):
+            line = self.lines[dim].setdefault(self.line_key(params, dim), [])
+            bisect.insort(line, (params[dim], idx))
+        return idx
+
+    def find(self, params):
+        """ 参数对应的实验序号，不存在返回 -1 """
+        return self.index.get(self.key(params), -1)
+
+    def exist(self, params):
+        return self.key(params) in self.index
+
+    def get_params(self, idx):
+        return [to_value(v) for v in self.params[idx].tolist()]
+
+    def params_list(self):
+        return [self.get_params(i) for i in range(self.size)]
+
+    def column(self, name):
+        """ 指标列的只读视图 """
+        if name in self.params.dtype.names:
+            view = self.params[name][:self.size]
+        else:
+            view = self.metrics[name][:self.size]
+        view = view.view()
+        view.flags.writeable = False
+        return view
+
+    def set_opti_dir(self, idx, opti):
+        self.metrics["opti_dir"][idx] = opti
+
+    def line(self, idx, dim):
+        """ 与第 idx 次实验只在 dim 维不同的所有实验，按该维取值升序的 [(取值, 实验序号)] """
+        params = self.get_params(idx)
+        return self.lines[dim].get(self.line_key(params, dim), [])
+
+    def neighbors(self, params, dim):
+        """ dim 维上紧邻 params 的两个实验序号 (更小, 更大)，没有时为 -1 """
+        line = self.lines[dim].get(self.line_key(params, dim), [])
+        pos = bisect.bisect_left(line, (params[dim], -1))
+        lower = line[pos - 1][1] if pos > 0 else -1
+        if pos < len(line) and line[pos][0] == params[dim]:
+            pos += 1
+        upper = line[pos][1] if pos < len(line) else -1
+        return lower, upper
+
+    def server_run_table(self, idx):
+        values = self.metrics["server_run"][idx].tolist()
+        return LogTable(server_run_rows, server_run_columns, dict(zip(server_run_rows, values)))
+
+    def server_res_table(self, idx):
+        values = self.metrics["server_res"][idx].tolist()
+        return LogTable(server_res_rows, server_res_columns, dict(zip(server_res_rows, values)))
@@ -0,0 +1,209 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+# 延迟直方图的桶上界(s)，最后一个桶为 > 1000
+latency_buckets = (0.001, 0.003, 0.01, 0.03, 0.1, 0.3, 1, 3, 10, 30, 100, 300, 1000)
+
+
+class Histogram:
+    def __init__(self, bounds=latency_buckets):
+        self.bounds = bounds
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """ 按桶估计分位数，返回所在桶的上界（最后一个桶返回 max） """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(self.bounds[i], self.max) if i < len(self.bounds) else self.max
+        return self.max
+
+    def snapshot(self):
+        labels = [f"<={b:g}" for b in self.bounds] + [f">{self.bounds[-1]:g}"]
+        return {"count": self.count, "mean": self.total / self.count if self.count else 0.0,
+                "p50": self.quantile(0.5), "p99": self.quantile(0.99), "max": self.max,
+                "buckets": {label: n for label, n in zip(labels, self.counts) if n}}
+
+
+# 一个 channel 上的读取统计
+# 每个 channel 只有一个读取线程（read_until_prompt 所在线程或 drain 线程）写入，
+# 计数不加锁；snapshot/reset 可在其他线程调用，与正在进行的更新之间最多差一次采样
+# exec 模式的每条命令先单独统计，结束时 merge 到 SSHManager 的 exec 统计中
+class ChannelStats:
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.since = time.time()
+        self.bytes = 0
+        self.recv_calls = 0
+        # recv 读满 buffer_size 的次数，占比高说明 buffer_size 偏小
+        self.full_chunks = 0
+        # 被 recv 截断的多字节字符，需要等下一块数据才能解码
+        self.decode_retries = 0
+        self.recv_time = 0.0
+        # select 等待/drain 线程 sleep 的时间
+        self.wait_time = 0.0
+        self.wait_calls = 0
+        # sink 回调（ChannelLog、LiveMonitor、TermNormalizer）的时间
+        self.sink_time = 0.0
+        # 发出命令到第一个字节、到读到 prompt 的时间
+        self.first_byte = Histogram()
+        self.prompt_wait = Histogram()
+        self.timeouts = 0
+        # drain 线程两次读取之间的间隔，即数据到达后最长要等多久才被读走
+        self.drain_lag = Histogram()
+        # 每次读取前 channel 缓冲中积压的字节数；接近 SSH 窗口时远端写入被阻塞（反压）
+        self.backlog_max = 0
+        self.backpressure = 0
+        # exec 模式：命令数、退出码非 0 的命令数
+        self.commands = 0
+        self.failed = 0
+
+    def merge(self, other):
+        for key in ("bytes", "recv_calls", "full_chunks", "decode_retries", "recv_time",
+                    "wait_time", "wait_calls", "sink_time", "timeouts", "backpressure",
+                    "commands", "failed"):
+            setattr(self, key, getattr(self, key) + getattr(other, key))
+        for key in ("first_byte", "prompt_wait", "drain_lag"):
+            getattr(self, key).merge(getattr(other, key))
+        self.backlog_max = max(self.backlog_max, other.backlog_max)
+
+    def on_recv(self, size, elapsed, buffer_size):
+        self.bytes += size
+        self.recv_calls += 1
+        self.recv_time += elapsed
+        if size >= buffer_size:
+            self.full_chunks += 1
+
+    def on_wait(self, elapsed):
+        self.wait_time += elapsed
+        self.wait_calls += 1
+
+    def on_drain(self, lag, backlog, window):
+        self.drain_lag.observe(lag)
+        if backlog > self.backlog_max:
+            self.backlog_max = backlog
+        if window and backlog >= 0.9 * window:
+            self.backpressure += 1
+
+    def snapshot(self):
+        elapsed = max(time.time() - self.since, 1e-9)
+        return {"name": self.name, "elapsed": elapsed, "bytes": self.bytes,
+                "recv_calls": self.recv_calls,
+                "avg_chunk": self.bytes / self.recv_calls if self.recv_calls else 0.0,
+                "full_chunks": self.full_chunks, "decode_retries": self.decode_retries,
+                "recv_time": self.recv_time, "wait_time": self.wait_time,
+                "wait_calls": self.wait_calls, "sink_time": self.sink_time,
+                "throughput": self.bytes / elapsed,
+                "first_byte": self.first_byte.snapshot(),
+                "prompt_wait": self.prompt_wait.snapshot(), "timeouts": self.timeouts,
+                "drain_lag": self.drain_lag.snapshot(), "backlog_max": self.backlog_max,
+                "backpressure": self.backpressure, "commands": self.commands,
+                "failed": self.failed}
+
+
+# SFTP 同步的传输统计
+class SFTPStats:
+    def __init__(self, name="sftp"):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.since = time.time()
+        self.syncs = 0
+        self.bytes = 0
+        self.files = 0
+        self.skipped = 0
+        self.seconds = 0.0
+
+    def on_sync(self, stats, elapsed):
+        self.syncs += 1
+        self.bytes += stats.get("bytes", 0)
+        self.files += stats.get("files", 0)
+        self.skipped += stats.get("skipped", 0)
+        self.seconds += elapsed
+
+    def snapshot(self):
+        return {"name": self.name, "syncs": self.syncs, "bytes": self.bytes,
+                "files": self.files, "skipped": self.skipped, "seconds": self.seconds,
+                "throughput": self.bytes / self.seconds if self.seconds else 0.0}
+
+
+def merge(snapshots):
+    """ 多个 channel 的合计 """
+    keys = ("bytes", "recv_calls", "full_chunks", "decode_retries", "recv_time", "wait_time",
+            "sink_time", "timeouts", "backpressure")
+    total = {key: sum(s.get(key, 0) for s in snapshots) for key in keys}
+    total["avg_chunk"] = total["bytes"] / total["recv_calls"] if total["recv_calls"] else 0.0
+    return total
+
+
+# 定期把若干 SSHManager 的 io_stats 追加到 JSON-lines 文件（如实验目录下的 io_stats.jsonl）
+# managers，要记录的 SSHManager，关闭后统计仍然保留
+# interval，记录间隔(s)，为 0 时只在 stop 时记录一次
+class StatsDumper:
+    def __init__(self, path, managers, interval=10):
+        self.path = path
+        self.managers = [m for m in managers if m is not None]
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def start(self):
+        if self.interval and self.interval > 0:
+            self.thread = threading.Thread(target=self.run, name="StatsDump", daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.dump()
+
+    def dump(self, final=False):
+        record = {"ts": time.time(), "final": final,
+                  "managers": [m.io_stats() for m in self.managers]}
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def stop(self):
+        """ 停止定期记录，并写入最后一次快照 """
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.dump(final=True)
+        for m in self.managers:
+            stats = m.stats
+            if stats.backpressure:
+                print(m.ssh_name, f"drain fell behind: {stats.backpressure} reads with the SSH "
+                      f"window nearly full, max backlog {stats.backlog_max} bytes")
@@ -0,0 +1,154 @@
+import math
+import re
+import threading
+import time
+from collections import deque
+
+# vLLM 每隔几秒打印的运行指标行
+metrics_line_pattern = re.compile(
+    rb'Avg prompt throughput: [\d.]+ tokens/s, Avg generation throughput: (?P<gen>[\d.]+) '
+    rb'tokens/s, Running: (?P<running>\d+) reqs, Swapped: \d+ reqs, Pending: (?P<pending>\d+) reqs')
+# scheduler profiling 打印的排队计数，"waiting 3 running 64"
+queue_line_pattern = re.compile(rb'\bwaiting[ :=]+(?P<pending>\d+)[ ,]+running[ :=]+(?P<running>\d+)')
+# 被 recv 截断的最后一行的最大缓存长度
+partial_limit = 4096
+
+# 提前终止的实验写入 log.txt 的结果块，键与 benchmark_serving2.py 的结果一致，
+# 解析后由 OptiPlan 识别为 violated (early)
+early_abort_title = "============ Early Abort ============"
+
+
+def least_squares(points):
+    """ 直线拟合 v = a + b * t，返回 (斜率 b, 斜率的标准误差, 残差标准差) """
+    n = len(points)
+    mean_t = sum(t for t, _ in points) / n
+    mean_v = sum(v for _, v in points) / n
+    var = sum((t - mean_t) ** 2 for t, _ in points)
+    if var <= 0:
+        return 0.0, float('inf'), float('inf')
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in points) / var
+    if n <= 2:
+        return slope, float('inf'), float('inf')
+    ssr = sum((v - mean_v - slope * (t - mean_t)) ** 2 for t, v in points)
+    sd = (ssr / (n - 2)) ** 0.5
+    return slope, sd / var ** 0.5, sd
+
+
+# 实验运行中解析 server 实时输出，预测 P99 TTFT/TPOT 必然超限时提前终止 client
+# 作为 VllmServer.attach 的 sink 在 drain 线程中调用，只做正则匹配和少量算术
+# TTFT：拟合最近 window 个样本中排队请求数的增长速度 g，服务速率 mu = rr - g，
+#       按 g 外推到 99% 请求到达时刻的排队数（最多外推已观察时长的 extrapolate 倍），
+#       排队时间 = 排队数 / mu
+#       g 不显著（小于 significance 倍标准误差），或当前排队数没有显著高于波动时视为排队不增长，
+#       避免噪声被外推放大；当前排队时间不到 min_wait * ttft 限制时也不外推
+# 每个样本都会重新判断，连续 confirm 个样本都预测超限才终止
+# TPOT：每个运行中的序列每步生成一个 token，TPOT ~ running / 生成吞吐量，取最近样本的中位数
+class LiveMonitor:
+    # rr，num_prompts，client 的请求速率和请求数
+    # limits，config 的 limitation
+    # cfg，config 的 early_abort：warmup 最短观察时间(s)，min_samples 最少样本数，
+    #      window 拟合使用的样本数，margin 预测值超过 限制*margin 才终止，
+    #      significance 排队增长显著性（斜率 / 标准误差），confirm 连续超限的样本数，
+    #      min_wait 外推前当前排队时间至少达到 ttft 限制的比例，extrapolate 最多外推的时长倍数
+    # on_abort()，决定终止时调用一次（如向 client shell 发送 Ctrl-C）
+    def __init__(self, rr, num_prompts, limits, cfg=None, on_abort=None, clock=time.time):
+        cfg = cfg or {}
+        self.rr = float(rr)
+        self.num_prompts = num_prompts
+        self.limits = limits
+        self.warmup = cfg.get("warmup", 30)
+        self.min_samples = cfg.get("min_samples", 3)
+        self.window = cfg.get("window", 12)
+        self.margin = cfg.get("margin", 1.5)
+        self.significance = cfg.get("significance", 3)
+        self.confirm = cfg.get("confirm", 3)
+        self.min_wait = cfg.get("min_wait", 0.25)
+        self.extrapolate = cfg.get("extrapolate", 1.0)
+        self.violations = 0
+        self.on_abort = on_abort
+        self.clock = clock
+        self.start = clock()
+        self.queue = deque(maxlen=self.window)   # (t, pending)
+        self.tpot = deque(maxlen=self.min_samples)
+        self.partial = b''
+        self.lock = threading.Lock()
+        self.aborted = False
+        self.stopped = False
+        self.reason = None
+        self.predicted = {}
+
+    def __call__(self, data):
+        self.feed(data)
+
+    def feed(self, data):
+        if self.aborted or self.stopped:
+            return
+        data = self.partial + data
+        end = data.rfind(b'\n') + 1
+        self.partial = data[end:][-partial_limit:]
+        if end == 0:
+            return
+        now = self.clock()
+        for m in metrics_line_pattern.finditer(data, 0, end):
+            self.sample(now, int(m.group('pending')), int(m.group('running')),
+                        float(m.group('gen')))
+        for m in queue_line_pattern.finditer(data, 0, end):
+            self.sample(now, int(m.group('pending')), int(m.group('running')))
+
+    def sample(self, now, pending, running, gen=None):
+        with self.lock:
+            if self.aborted or self.stopped:
+                return
+            t = now - self.start
+            self.queue.append((t, pending))
+            if gen:
+                self.tpot.append(running / gen * 1000)
+            if t < self.warmup or len(self.queue) < self.min_samples:
+                return
+            reason = self.predict(t, pending)
+            self.violations = self.violations + 1 if reason is not None else 0
+            if self.violations < self.confirm:
+                return
+            self.aborted = True
+            self.reason = reason
+            print("[early abort]", reason)
+            if self.on_abort is not None:
+                self.on_abort()
+
+    def stop(self):
+        """ client 结束后调用，之后不会再触发 on_abort """
+        with self.lock:
+            self.stopped = True
+
+    def predict(self, t, pending):
+        """ 返回终止原因，不需要终止时返回 None """
+        growth, stderr, sd = least_squares(list(self.queue))
+        if growth < self.significance * stderr or pending < self.significance * sd:
+            growth = 0.0
+        mu = max(self.rr - growth, 1e-3)
+        if pending / mu * 1000 < self.min_wait * self.limits["ttft_p99_limit"]:
+            growth = 0.0
+            mu = self.rr
+        # 99% 的请求到达的时刻
+        t99 = 0.99 * self.num_prompts / self.rr
+        queued = pending + growth * min(max(t99 - t, 0.0), self.extrapolate * t)
+        ttft = max(pending, queued) / mu * 1000
+        # 样本不足时 TPOT 未知，记为 nan（写入 log.txt 为 nan，解析时不计入结果），不能当作 0
+        tpot = sorted(self.tpot)[len(self.tpot) // 2] if len(self.tpot) >= self.min_samples \
+            else math.nan
+        self.predicted = {"Request throughput (req/s)": min(mu, self.rr),
+                          "P99 TTFT (ms)": ttft, "P99 TPOT (ms)": tpot}
+        if ttft > self.margin * self.limits["ttft_p99_limit"]:
+            return (f"queue grows {growth:.1f} req/s, {pending} pending, "
+                    f"predicted P99 TTFT {ttft:.0f} ms > {self.limits['ttft_p99_limit']} ms")
+        if tpot > self.margin * self.limits["tpot_p99_limit"]:
+            return f"predicted P99 TPOT {tpot:.0f} ms > {self.limits['tpot_p99_limit']} ms"
+        return None
+
+    def result_lines(self):
+        """ 写入 log.txt 的提前终止结果块 """
+        lines = [early_abort_title, f"Early abort reason: {self.reason}",
+                 f"{'Early abort:':<41}1"]
+        for key, value in self.predicted.items():
+            lines.append(f"{key + ':':<41}{value:.2f}")
+        return [line + "\n" for line in lines]
@@ -1,6 +1,9 @@
+import json
 import os
 import re
-import pandas as pd
+import time
+from channel_log import log_files, read_log
+from param_space import core_shorts, extra_shorts, split_trial_name
 
 client_res_pattern = [
   "Successful requests",
@@ -24,48 +27,160 @@ client_res_pattern = [
   "P99 TTFT (ms)",
   "Mean TPOT (ms)",
   "Median TPOT (ms)",
-  "P99 TPOT (ms)"
+  "P99 TPOT (ms)",
+  # live_monitor 提前终止的实验，值为 1
+  "Early abort"
 ]
 
 server_run_columns = ["waiting", "running", "swapped",
               "wait_to_run_reqs", "run_to_wait_reqs", "wait_to_run_tokens",
               "batch_utils", "block_utils", "preempt_ratio"]
 server_run_rows = ["Max", "Mean", "Min"]
-server_run_pattern = re.compile(r'scheduler.py:117\]\s(?:Max|Mean|Min)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)')
 
 server_res_columns = ["ttft/s", "time_in_queue/s", "context_latency/s",
               "decoder_latency/s", "per_token_latency/s", "decoder_tokens"]
 server_res_rows = ["Sum", "Max", "Mean", "Min", "P99"]
-server_res_pattern = re.compile(r'scheduler.py:118\]\s(?:Sum|Max|Mean|Min|P99)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)\s+([\d.,]+)')
 
-def extract_log(logpath):
-    with open(logpath, 'r', encoding='utf-8') as file:
-        data = file.read()
+# client 端结果行，"Request throughput (req/s):   10.5"
+client_line_pattern = re.compile(
+    r'(?P<key>' + '|'.join(re.escape(key) for key in client_res_pattern) + r')'
+    r'[ \t]*:[ \t]*(?P<value>[-+]?[\d., ]*\d)')
+# scheduler 打印的两张统计表中的一行，以字面量开头，扫描大段 server 日志时走快速查找
+table_line_pattern = re.compile(
+    r'scheduler\.py:(?P<table>11[78])\][ \t](?P<row>Max|Mean|Min|Sum|P99)'
+    r'(?P<values>(?:[ \t]+[\d.,]+)+)')
 
-    client_data, server_data = data.split("data split")
+# 解析结果缓存目录，键为 路径+mtime+大小，日志未变化时不重复解析
+parse_cache_dir = os.environ.get("LOG_PARSE_CACHE",
+                                 os.path.join(os.path.expanduser("~"), ".cache",
+                                              "vllm_opti", "log_parse"))
+# 解析逻辑变化时加一，旧缓存自动失效
+parse_cache_version = 2
 
-    client_data_lines = client_data.split('\n')
 
+# 轻量的二维表，支持与 DataFrame 相同的 table.loc[row, col] 取值，需要时再转为 DataFrame
+class LogTable:
+    def __init__(self, rows, columns, values=None):
+        self.rows = rows
+        self.columns = columns
+        self.values = values if values is not None else {}  # 行名 -> 数值列表
+
+    @property
+    def loc(self):
+        return self
+
+    @property
+    def empty(self):
+        return not self.values
+
+    def __getitem__(self, key):
+        row, col = key
+        return self.values[row][self.columns.index(col)]
+
+    def to_list(self):
+        """ 按 rows/columns 顺序的二维列表，缺失的行为 nan """
+        nan = float('nan')
+        return [self.values.get(row, [nan] * len(self.columns)) for row in self.rows]
+
+    def to_frame(self):
+        import pandas as pd
+        return pd.DataFrame(self.to_list(), columns=self.columns, index=self.rows)
+
+
+# 一个 log.txt 的解析结果
+class LogRecord:
+    def __init__(self, client_res, server_run, server_res):
+        self.client_res = client_res  # dict，单位为 ms
+        self.server_run = server_run  # LogTable，server_run_rows x server_run_columns
+        self.server_res = server_res  # LogTable，server_res_rows x server_res_columns，单位为 s
+
+    def frames(self):
+        """ 与旧版 extract_log 相同的 (client_res, server_run_df, server_res_df) """
+        return self.client_res, self.server_run.to_frame(), self.server_res.to_frame()
+
+    def to_dict(self):
+        return {"client_res": self.client_res, "server_run": self.server_run.values,
+                "server_res": self.server_res.values}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d["client_res"],
+                   LogTable(server_run_rows, server_run_columns, d["server_run"]),
+                   LogTable(server_res_rows, server_res_columns, d["server_res"]))
+
+
+def parse_text(data):
+    """
+    一次扫描解析 log.txt 内容，每段文本只被对应的正则扫描一遍
+    "data split" 之前只取 client 结果，之后只取 server 统计表；没有分隔时整个文本按 server 日志处理
+    统计表出现多次时取最后一次
+    """
+    split = data.find("data split")
     client_res = {}
-    for line in client_data_lines:
-        for key in client_res_pattern:
-            if key in line:
-                value = line.split(":")[-1]
-                client_res[key] = float(value.replace(' ', ''))
-
-    matches = server_run_pattern.findall(server_data)
-    server_run_df = pd.DataFrame(matches, columns=server_run_columns,
-                                 index=server_run_rows)
-    server_run_df = server_run_df.applymap(
-        lambda x: float(x.replace(',', '')) if isinstance(x, str) else x)
-
-    matches = server_res_pattern.findall(server_data)
-    server_res_df = pd.DataFrame(matches, columns=server_res_columns,
-                                 index=server_res_rows)
-    server_res_df = server_res_df.applymap(
-        lambda x: float(x.replace(',', '')) if isinstance(x, str) else x)
-
-    return client_res, server_run_df, server_res_df
+    if split >= 0:
+        for m in client_line_pattern.finditer(data, 0, split):
+            client_res[m.group('key')] = float(m.group('value').replace(' ', '').replace(',', ''))
+    tables = {"117": {}, "118": {}}
+    for m in table_line_pattern.finditer(data, split + 1 if split >= 0 else 0):
+        tables[m.group('table')][m.group('row')] = \
+            [float(v.replace(',', '')) for v in m.group('values').split()]
+    server_run = {row: v for row, v in tables["117"].items()
+                  if row in server_run_rows and len(v) == len(server_run_columns)}
+    server_res = {row: v for row, v in tables["118"].items()
+                  if len(v) == len(server_res_columns)}
+    return LogRecord(client_res,
+                     LogTable(server_run_rows, server_run_columns, server_run),
+                     LogTable(server_res_rows, server_res_columns, server_res))
+
+
+def cache_file(logpath):
+    import hashlib
+    name = hashlib.sha1(os.path.abspath(logpath).encode('utf-8')).hexdigest()
+    return os.path.join(parse_cache_dir, name + ".json")
+
+
+def parse_log(logpath, cache=True):
+    """
+    解析 log.txt（或 .gz/.zst），返回 LogRecord；cache 为 True 时读写磁盘缓存
+    logpath 为 ChannelLog 的前缀或其中一个分段时，按顺序读取所有轮转的分段
+    """
+    stamp = [parse_cache_version]
+    for path in log_files(logpath):
+        st = os.stat(path)
+        stamp += [st.st_mtime_ns, st.st_size]
+    if cache:
+        try:
+            with open(cache_file(logpath)) as f:
+                entry = json.load(f)
+            if entry["stamp"] == stamp:
+                return LogRecord.from_dict(entry["record"])
+        except (OSError, ValueError, KeyError):
+            pass
+
+    record = parse_text(read_log(logpath))
+
+    if cache:
+        # 先写临时文件再替换，多进程同时解析也不会读到半个文件
+        try:
+            os.makedirs(parse_cache_dir, exist_ok=True)
+            path = cache_file(logpath)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            with open(tmp, 'w') as f:
+                json.dump({"stamp": stamp, "record": record.to_dict()}, f)
+            os.replace(tmp, path)
+        except OSError as e:
+            print("parse cache write failed:", e)
+    return record
+
+
+# logpath 可以是 log.txt，也可以是 .gz/.zst 压缩文件（如 ChannelLog 落盘的 server 日志，
+# 给出前缀 server_log 或任一分段时读取所有轮转的分段）
+# as_frame，True 返回 pandas DataFrame，False 返回 LogTable（同样支持 .loc[row, col]，不依赖 pandas）
+def extract_log(logpath, as_frame=True, cache=True):
+    record = parse_log(logpath, cache)
+    if as_frame:
+        return record.frames()
+    return record.client_res, record.server_run, record.server_res
 
 def handle_r_str(str):
     output = []
@@ -77,56 +192,292 @@ def handle_r_str(str):
             output.append(split_r_lines[ll - 2] + "\n")
     return output
 
+
+# 终端控制序列：CSI（颜色、擦除、光标移动）、OSC（窗口标题）、其他两字节 ESC 序列，以及 \r \n \b
+term_token_pattern = re.compile(
+    r'\x1b\[(?P<csi>[0-?]*)[ -/]*(?P<final>[@-~])|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|'
+    r'\x1b[ -/]*[0-~]|[\r\n\b]')
+# 被 recv 截断在末尾的不完整 ESC 序列，留到下一块再处理
+term_partial_pattern = re.compile(r'\x1b(?:\[[0-?]*[ -/]*|\][^\x07\x1b]*\x1b?|[ -/]*)\Z')
+# 不完整序列的最大缓存长度，超过时视为无效序列丢弃
+term_partial_limit = 4096
+
+
+# 流式终端输出整理，替代 handle_r_str
+# 按 read_until_prompt 收到的顺序输入文本块，模拟终端的 \r 回到行首覆盖写（进度条）、\b 退格、
+# ESC[K 擦除，丢弃其他 ANSI 控制序列，每得到完整的一行就交给 write，内存只保留当前行
+# echo，发送的命令，跳过终端回显（自动换行插入的空格和 \r 也一并跳过）
+# prompt，结束时末尾未换行的行如果是 shell 提示符则丢弃
+class TermNormalizer:
+    def __init__(self, write, echo=None, prompt=None):
+        self.write = write
+        self.echo = echo or None
+        self.echo_pos = 0
+        self.prompt = prompt.rstrip() if prompt else None
+        self.line = ''
+        self.col = 0
+        self.partial = ''
+        self.lines = 0
+
+    def put(self, text):
+        """ 在光标处覆盖写 """
+        line = self.line
+        if self.col > len(line):
+            line += ' ' * (self.col - len(line))
+        self.line = line[:self.col] + text + line[self.col + len(text):]
+        self.col += len(text)
+
+    def newline(self):
+        self.write(self.line.rstrip() + '\n')
+        self.line = ''
+        self.col = 0
+        self.lines += 1
+
+    def erase(self, mode):
+        if mode in ('', '0'):
+            self.line = self.line[:self.col]
+        elif mode == '1':
+            self.line = ' ' * self.col + self.line[self.col:]
+        elif mode == '2':
+            self.line = ''
+
+    def skip_echo(self, text):
+        """ 消费回显的命令，返回剩余文本；遇到不属于回显的字符时结束回显匹配 """
+        i = 0
+        while i < len(text):
+            c = text[i]
+            if self.echo_pos < len(self.echo) and c == self.echo[self.echo_pos]:
+                self.echo_pos += 1
+            elif c == '\n':
+                # 回显以换行结束
+                self.echo = None
+                return text[i + 1:]
+            elif c not in ' \r':
+                self.echo = None
+                return text[i:]
+            i += 1
+        return ''
+
+    def feed(self, text):
+        if self.partial:
+            text = self.partial + text
+            self.partial = ''
+        partial = term_partial_pattern.search(text)
+        if partial is not None:
+            if len(text) - partial.start() <= term_partial_limit:
+                self.partial = text[partial.start():]
+            text = text[:partial.start()]
+        if self.echo is not None:
+            # 回显中也可能有控制序列，先去掉
+            text = self.skip_echo(term_token_pattern.sub(
+                lambda m: m.group() if m.group() in '\r\n' else '', text))
+            if not text:
+                return
+        pos = 0
+        for m in term_token_pattern.finditer(text):
+            if m.start() > pos:
+                self.put(text[pos:m.start()])
+            pos = m.end()
+            token = m.group()
+            if token == '\n':
+                self.newline()
+            elif token == '\r':
+                self.col = 0
+            elif token == '\b':
+                self.col = max(self.col - 1, 0)
+            elif m.group('final') == 'K':
+                self.erase(m.group('csi'))
+        if pos < len(text):
+            self.put(text[pos:])
+
+    def __call__(self, text):
+        self.feed(text)
+
+    def close(self):
+        """ 输出最后一行（不含 shell 提示符） """
+        line = self.line.rstrip()
+        if line and not (self.prompt and line.endswith(self.prompt)):
+            self.newline()
+        self.line = ''
+        self.col = 0
+
+
 def write_to_file(strlines, output_path):
     with open(output_path, 'a', encoding='utf-8') as file:
         file.writelines(strlines)
 
-def extract_logs(folder_path, output_path):
-    outfile = open(output_path, 'w')
-    title = "model_name,dataset_name,enable_chunked,num_prompts,mns,mnbt,rr," \
-            "max_batch_utils,mean_block_utils,max_block_utils,preempt_ratio," \
-            "request_throughput,output_token_throughput,mean_ttft,p99_ttft," \
-            "mean_tpot,p99_tpot,p99_time_in_queue,p99_time_context,p99_time_decoder\n"
-    outfile.write(title)
+table_title = "model_name,dataset_name,enable_chunked,num_prompts,mns,mnbt,rr," \
+              "max_batch_utils,mean_block_utils,max_block_utils,preempt_ratio," \
+              "request_throughput,output_token_throughput,mean_ttft,p99_ttft," \
+              "mean_tpot,p99_tpot,p99_time_in_queue,p99_time_context,p99_time_decoder\n"
+
+
+def table_header(extra=()):
+    """ 结果表的表头，extra 为 mns/mnbt/rr 以外的参数简称，依次排在 rr 之后 """
+    return table_title.replace(",rr,", ",rr," + "".join(short + "," for short in extra), 1)
+
+
+def log_row(folder_path, rel_path, extra=()):
+    """ 解析一个 log.txt，返回表格中的一行；结果不完整时返回 None。在进程池中执行 """
+    file_path = os.path.join(folder_path, rel_path)
+    # model/dataset/num_prompts/<chunked>/<mns_mnbt_rr[_short=值...]>/log.txt
+    tmp = rel_path.split(os.sep)
+    model_name = tmp[0]
+    dataset_name = tmp[1]
+    num_prompts = tmp[2]
+    enable_chunked = tmp[3]
+    # 目录名见 param_space.trial_name，该实验没有的参数留空
+    named = split_trial_name(tmp[4])
+    if enable_chunked == "disable_chunked":
+        named["mnbt"] = "None"
+    params = ",".join([named[short] for short in core_shorts] +
+                      [named.get(short, "") for short in extra])
+    client_res, server_run_df, server_res_df = extract_log(file_path, as_frame=False)
+    if int(num_prompts) != int(client_res.get("Successful requests", -1)):
+        print(f"{file_path} is wrong")
+        return None
+
+    max_batch_utils = server_run_df.loc["Max", "batch_utils"]
+    mean_block_utils = server_run_df.loc["Mean", "block_utils"]
+    max_block_utils = server_run_df.loc["Max", "block_utils"]
+    preempt_ratio = server_run_df.loc["Max", "preempt_ratio"]
+    request_throughput = client_res["Request throughput (req/s)"]
+    output_token_throughput = client_res["Output token throughput (tok/s)"]
+    mean_ttft = client_res["Mean TTFT (ms)"]
+    p99_ttft = client_res["P99 TTFT (ms)"]
+    mean_tpot = client_res["Mean TPOT (ms)"]
+    p99_tpot = client_res["P99 TPOT (ms)"]
+
+    p99_time_in_queue = 1000 * server_res_df.loc["P99", "time_in_queue/s"]
+    p99_time_context = 1000 * server_res_df.loc["P99", "context_latency/s"]
+    p99_time_decoder = 1000 * server_res_df.loc["P99", "per_token_latency/s"]
+
+    return f"{model_name},{dataset_name},{enable_chunked},{num_prompts},{params}," \
+        f"{max_batch_utils},{mean_block_utils},{max_block_utils},{preempt_ratio}," \
+        f"{request_throughput},{output_token_throughput},{mean_ttft},{p99_ttft}," \
+        f"{mean_tpot},{p99_tpot},{p99_time_in_queue:.0f},{p99_time_context:.0f},{p99_time_decoder:.0f}\n"
+
+
+def log_row_safe(folder_path, rel_path, extra=()):
+    try:
+        return log_row(folder_path, rel_path, extra)
+    except Exception as e:
+        print(f"{os.path.join(folder_path, rel_path)} parse failed: {e}")
+        return None
 
+
+def scan_logs(folder_path):
+    """ 找出所有 log.txt，返回 {相对路径: [mtime_ns, size]}；跳过 . 开头的目录（如 .remote_mirror） """
+    found = {}
     for root, dirs, files in os.walk(folder_path):
-        for name in files:
-            if 'log.txt' != name:
-                continue
-            file_path = os.path.join(root, name)
-            tmp = file_path.split(folder_path)[1].split('/')
-            model_name = tmp[1]
-            dataset_name = tmp[2]
-            num_prompts = tmp[3]
-            enable_chunked = tmp[4]
-            mns, mnbt, rr = tmp[5].split('_')
-            if enable_chunked == "disable_chunked":
-                mnbt = None
-            client_res, server_run_df, server_res_df = extract_log(file_path)
-            if int(num_prompts) != int(client_res["Successful requests"]):
-                print(f"{file_path} is wrong")
-                continue
-
-            max_batch_utils = server_run_df.loc["Max", "batch_utils"]
-            mean_block_utils = server_run_df.loc["Mean", "block_utils"]
-            max_block_utils = server_run_df.loc["Max", "block_utils"]
-            preempt_ratio = server_run_df.loc["Max", "preempt_ratio"]
-            request_throughput = client_res["Request throughput (req/s)"]
-            output_token_throughput = client_res["Output token throughput (tok/s)"]
-            mean_ttft = client_res["Mean TTFT (ms)"]
-            p99_ttft = client_res["P99 TTFT (ms)"]
-            mean_tpot = client_res["Mean TPOT (ms)"]
-            p99_tpot = client_res["P99 TPOT (ms)"]
-
-            p99_time_in_queue = 1000 * server_res_df.loc["P99", "time_in_queue/s"]
-            p99_time_context = 1000 * server_res_df.loc["P99", "context_latency/s"]
-            p99_time_decoder = 1000 * server_res_df.loc["P99", "per_token_latency/s"]
-
-            write_str = f"{model_name},{dataset_name},{enable_chunked},{num_prompts},{mns},{mnbt},{rr}," \
-                f"{max_batch_utils},{mean_block_utils},{max_block_utils},{preempt_ratio}," \
-                f"{request_throughput},{output_token_throughput},{mean_ttft},{p99_ttft}," \
-                f"{mean_tpot},{p99_tpot},{p99_time_in_queue:.0f},{p99_time_context:.0f},{p99_time_decoder:.0f}\n"
-            outfile.write(write_str)
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        if 'log.txt' not in files:
+            continue
+        file_path = os.path.join(root, 'log.txt')
+        st = os.stat(file_path)
+        found[os.path.relpath(file_path, folder_path)] = [st.st_mtime_ns, st.st_size]
+    return found
+
+
+def write_atomic(path, write_fn, mode='w'):
+    tmp = path + ".tmp"
+    with open(tmp, mode) as f:
+        write_fn(f)
+    os.replace(tmp, path)
+
+
+def write_columnar(output_path, rows, formats, title=table_title):
+    """ 额外输出 csv.gz / parquet，供下游快速加载 """
+    base = output_path[:-4] if output_path.endswith('.csv') else output_path
+    if 'csv.gz' in formats:
+        import gzip
+        with gzip.open(base + '.csv.gz.tmp', 'wt') as f:
+            f.write(title)
+            f.writelines(rows)
+        os.replace(base + '.csv.gz.tmp', base + '.csv.gz')
+    if 'parquet' in formats:
+        try:
+            import pandas as pd
+            import pyarrow  # noqa: F401
+        except ImportError:
+            print("writing parquet requires pandas and pyarrow, skipped")
+            return
+        import io
+        df = pd.read_csv(io.StringIO(title + "".join(rows)))
+        df.to_parquet(base + '.parquet.tmp', index=False)
+        os.replace(base + '.parquet.tmp', base + '.parquet')
+
+
+# 增量构建结果表
+# 清单文件 output_path.manifest.json 记录每个 log.txt 的 mtime/大小和解析出的行，
+# 只有新增或变化的 log.txt 才会在进程池中重新解析
+# 只有新增实验时直接追加到 table.csv，有变化或删除时整表重写
+# workers，解析进程数，默认等于 CPU 核数，1 表示在当前进程中解析
+# formats，除 table.csv 外额外输出的格式：'csv.gz'、'parquet'
+# extra，mns/mnbt/rr 以外的参数简称（param_space.extra_shorts），作为附加列
+def extract_logs(folder_path, output_path, workers=None, formats=(), extra=()):
+    start = time.time()
+    title = table_header(extra)
+    manifest_path = output_path + ".manifest.json"
+    manifest = None
+    try:
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest.get("title") != title or not os.path.exists(output_path):
+            manifest = None
+    except (OSError, ValueError):
+        pass
+    # 没有可用的清单时，已有的表无法确定包含哪些实验，整表重写
+    append_ok = manifest is not None
+    if manifest is None:
+        manifest = {"title": title, "logs": {}}
+    entries = manifest["logs"]
+
+    found = scan_logs(folder_path)
+    removed = [p for p in entries if p not in found]
+    todo = sorted(p for p, stamp in found.items()
+                  if p not in entries or entries[p]["stamp"] != stamp)
+    changed = [p for p in todo if p in entries]
+
+    if todo:
+        workers = workers or os.cpu_count() or 1
+        if workers > 1 and len(todo) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as executor:
+                chunksize = max(1, len(todo) // (4 * workers))
+                rows = list(executor.map(log_row_safe, [folder_path] * len(todo), todo,
+                                         [extra] * len(todo), chunksize=chunksize))
+        else:
+            rows = [log_row_safe(folder_path, p, extra) for p in todo]
+    else:
+        rows = []
+
+    for p in removed:
+        del entries[p]
+    for p, row in zip(todo, rows):
+        entries[p] = {"stamp": found[p], "row": row}
+
+    new_rows = [row for row in rows if row is not None]
+    if append_ok and not removed and not changed:
+        # 只有新增实验，追加到已有的表
+        if new_rows:
+            with open(output_path, 'a') as f:
+                f.writelines(new_rows)
+    else:
+        all_rows = [entries[p]["row"] for p in sorted(entries) if entries[p]["row"] is not None]
+        write_atomic(output_path, lambda f: (f.write(title), f.writelines(all_rows)))
+    write_atomic(manifest_path, lambda f: json.dump(manifest, f))
+
+    if formats:
+        write_columnar(output_path, [entries[p]["row"] for p in sorted(entries)
+                                     if entries[p]["row"] is not None], formats, title)
+    print(f"extract_logs {folder_path}: {len(found)} logs, parsed {len(todo)}, "
+          f"removed {len(removed)}, {time.time() - start:.2f}s")
+
 
 if __name__ == "__main__":
-    extract_logs('2-A100', '2-A100/table.csv')
+    import yaml
+    with open('config.yaml', encoding='utf-8') as f:
+        params_config = yaml.safe_load(f)["params"]
+    extract_logs('2-A100', '2-A100/table.csv', formats=('csv.gz', 'parquet'),
+                 extra=extra_shorts(params_config))
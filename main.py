@@ -5,10 +5,26 @@ current_folder = os.path.dirname(os.path.abspath(__file__))
 os.chdir(current_folder)
 
 import yaml
-from ssh_tools import SSHManager
-from log_process import extract_log, handle_r_str, write_to_file
-from optimizer import OptiPlan
+from ssh_tools import SSHManager, SSHPool
+from channel_log import ChannelLog
+from sftp_sync import link_tree
+from log_process import parse_log, parse_text, write_to_file, TermNormalizer
+from live_monitor import LiveMonitor
+from results_store import open_store
+from tracing import span, open_trace, load, print_summary, to_chrome
+from io_stats import StatsDumper
+from server_lifecycle import server_for, stop_servers
+from optimizer import OptiPlan, default_params
+from param_space import ParamSpace
+from surrogate import make_strategy
+from scheduler import Slot, SlotPool, ExperimentScheduler
+from planner import SweepPlan
+from fidelity import SuccessiveHalving, fidelity_rungs
+from pareto import ParetoStrategy, print_front, save_front
 import getpass
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 with open('config.yaml', 'r', encoding='utf-8') as file:
     config = yaml.safe_load(file)
@@ -19,6 +35,8 @@ username = config["ssh_setting"]["username"]
 password = config["ssh_setting"]["password"]
 # password = getpass.getpass(prompt="请输入密码:")
 prompt = config["ssh_setting"]["prompt"]
+# 各次实验复用已认证的连接，只在首次使用时握手
+ssh_pool = SSHPool(config["ssh_setting"].get("keepalive", 30))
 server_config = config["server_config"]
 client_config = config["client_config"]
 app_ip = server_config["app_ip"]
@@ -26,160 +44,523 @@ app_port = server_config["app_port"]
 num_prompts = config["params"]["num-prompts"]
 disable_chunked_config = config["params"]["disable_chunked_prefill"]
 enable_chunked_config = config["params"]["enable_chunked_prefill"]
+# 两种 chunked 模式下的参数空间，决定 server/client 命令行参数和实验目录名
+param_spaces = {True: ParamSpace(enable_chunked_config), False: ParamSpace(disable_chunked_config)}
 models_folder = config["models_folder"]
 datasets_folder = config["datasets_folder"]
+work_dir = server_config["work_dir"]
+# 只改变 request-rate 时复用正在运行的 server，两次实验之间用 reset_action 清零 profiling 统计
+# 没有配置 reset_action 时统计会跨实验累加，只能每次重启
+reuse_server = bool(server_config.get("reuse_server", False) and
+                    client_config.get("reset_action"))
+early_abort_config = config.get("early_abort") or {}
+search_config = config.get("search") or {}
+# 每个调优任务同时运行的实验数，大于 1 时各实验分别申请 GPU 槽位，调优任务依次执行
+parallel = int(search_config.get("parallel", 1))
+# pareto 调优时 early_abort 只终止超出 SLO 范围（ttft_max/tpot_max）的实验
+if search_config.get("strategy") == "pareto":
+    monitor_limits = dict(config["limitation"], ttft_p99_limit=search_config.get("ttft_max", 10000),
+                          tpot_p99_limit=search_config.get("tpot_max", 300))
+else:
+    monitor_limits = config["limitation"]
+# utils 命令（profiling save/reset）在独立的 exec channel 中运行，进程退出即返回，退出码非 0 时打印错误
+exec_mode = bool(client_config.get("exec_mode", False))
+# 各阶段耗时记录到 output_folder/trace.jsonl
+tracing_config = config.get("tracing") or {}
+# 实验期间 client/server shell 的读取统计定期写入实验目录的 io_stats.jsonl
+io_stats_config = config.get("io_stats") or {}
+# 多保真度调优：候选先用少量 prompt 筛选，排名靠前的才用完整的 num-prompts 复测
+fidelity_config = config.get("fidelity") or {}
+# sweep 的任务规划（planner.py）：去掉已完成的任务，同一模型的任务排在一起
+planner_config = config.get("planner") or {}
+default_host = {"ip": ip, "port": port, "username": username, "password": password,
+                "prompt": prompt}
+
+# 未指定槽位时，使用 ssh_setting 主机、app_port 和 work_dir，不限制可见 GPU
+def default_slot():
+    return Slot(default_host, [], app_port, work_dir)
 
 class vllm_experiment:
-    def __init__(self, model_name, dataset_name, num_prompts, output_folder='output'):
+    # slot，调度器分配的主机/GPU 槽位，决定 ssh 主机、可见 GPU、app_port 和远端工作目录
+    def __init__(self, model_name, dataset_name, num_prompts, output_folder='output',
+                 slot=None):
         self.model_name = model_name
         self.dataset_name = dataset_name
         self.num_prompts = num_prompts
-        self.server_ssh = None
+        self.slot = slot if slot is not None else default_slot()
+        self.host = self.slot.host
+        self.app_port = self.slot.app_port
+        self.output_folder = output_folder
         self.client_ssh = None
+        self.stats_dumper = None
         self.folder_path = output_folder + '/' + model_name + '/' + dataset_name + '/' + \
                             str(num_prompts) + '/'
-
-    # 前处理，只需处理一次
-    def set_env(self):
-        self.server_ssh = SSHManager(ip, username, password, "[server]:", port, prompt)
-        self.client_ssh = SSHManager(ip, username, password, "[client]:", port, prompt)
-
+        # 实验结果库，同一输出目录下的所有实验共用
+        self.store = open_store(output_folder + '/results.sqlite')
+        if tracing_config.get("enabled"):
+            open_trace(output_folder + '/trace.jsonl')
+        # 槽位上常驻的 server，同一槽位上的实验共用
+        self.server = server_for(self.slot, self.new_server_ssh, self.set_server_env,
+                                 server_config["post_cmds"])
+
+    def ssh_tag(self):
+        return "" if not self.slot.gpus else self.slot.name
+
+    def new_server_ssh(self):
+        host = self.host
+        return SSHManager(host["ip"], host["username"], host["password"],
+                          "[server" + self.ssh_tag() + "]:", host["port"], host["prompt"],
+                          pool=ssh_pool)
+
+    # server shell 前处理，每次启动 server 前执行
+    def set_server_env(self, server_ssh):
+        # pre_cmds 可能进入其他 shell（如 docker exec -it），工作目录和 GPU 在其后设置
         if server_config["pre_cmds"] != None:
             for cmd in server_config["pre_cmds"]:
-                self.server_ssh.execute_command(cmd, max_duration=3)
+                server_ssh.execute_command(cmd, max_duration=3)
+        # 每个槽位使用独立的远端工作目录和 GPU
+        server_ssh.execute_command("mkdir -p " + self.slot.work_dir + " && cd " +
+                                   self.slot.work_dir, max_duration=3)
+        if self.slot.gpus:
+            server_ssh.execute_command("export CUDA_VISIBLE_DEVICES=" +
+                                       ",".join(str(g) for g in self.slot.gpus),
+                                       max_duration=3)
+
+    # client shell 前处理，每次实验执行一次
+    def set_env(self):
+        host = self.host
+        self.client_ssh = SSHManager(host["ip"], host["username"], host["password"],
+                                     "[client" + self.ssh_tag() + "]:", host["port"],
+                                     host["prompt"], pool=ssh_pool)
 
         if client_config["pre_cmds"] != None:
             for cmd in client_config["pre_cmds"]:
                 self.client_ssh.execute_command(cmd, max_duration=3)
 
+    # params，参数值，顺序见 param_space.ParamSpace：
     # mns means max_num_seqs
     # mnbt means max_num_batched_tokens
     # rr means request_rate
-    def item_test(self, chunked_prefill, mns, mnbt, rr):
+    # 之后是 config.yaml 中声明的其他参数
+    def item_test(self, chunked_prefill, *params):
+        space = param_spaces[chunked_prefill]
+        if len(params) != len(space):
+            raise ValueError(f"expected {len(space)} params {space.names}, got {list(params)}")
+        params = list(params)
         chunked_str = "enable_chunked" if chunked_prefill else "disable_chunked"
-        son_folder = chunked_str + "/" + str(mns) + "_" + str(mnbt) + "_" + str(rr)
+        son_folder = chunked_str + "/" + space.folder_name(params)
         print("\n======ItemTest:", son_folder, "======\n")
 
         item_folder = self.folder_path + son_folder
         log_path = item_folder + "/log.txt"
+        key = (self.model_name, self.dataset_name, self.num_prompts, chunked_prefill,
+               space.named(params))
 
         # 如果实验已经存在
+        row = self.store.get(*key)
+        if row is not None and row["status"] == "done":
+            print(f"The experiment has been completed. Result in {row['log_path']}")
+            return row["log_path"]
         if os.path.exists(log_path):
-            print(f"The experiment has been completed. Result in {log_path}")
-            return log_path
-        else:
-            os.makedirs(item_folder, exist_ok=True)
+            if row is None:
+                # 结果库建立之前完成的实验，登记后直接使用
+                print(f"The experiment has been completed. Result in {log_path}")
+                self.store.import_log(*key, log_path)
+                return log_path
+            # 上次运行中断时留下的不完整日志
+            os.remove(log_path)
+        os.makedirs(item_folder, exist_ok=True)
+
+        self.store.start(*key)
+        start = time.time()
+        try:
+            with span("trial", model=self.model_name, dataset=self.dataset_name,
+                      num_prompts=self.num_prompts, trial=son_folder, slot=self.slot.name):
+                self.run_item(chunked_prefill, params, item_folder, log_path)
+        except Exception:
+            self.stop_stats_dump()
+            self.store.fail(*key)
+            # server 状态未知，下次实验重新启动
+            self.server.stop()
+            raise
+        finally:
+            # 关闭 client shell（出错时也关闭），连接保留在 ssh_pool 中供下一次实验使用
+            if self.client_ssh is not None:
+                self.client_ssh.close()
+                self.client_ssh = None
+        self.store.finish(*key, log_path, parse_log(log_path), time.time() - start)
+        return log_path
 
-        # 每次重启环境，稳定性更好
-        self.set_env()
+    # 运行一次实验：启动 server、运行 client，结果写入 log_path
+    def run_item(self, chunked_prefill, params, item_folder, log_path):
+        with span("client.setup"):
+            self.set_env()
 
         # server launch
+        space = param_spaces[chunked_prefill]
         model_config = config["models"][self.model_name]
         model_path = models_folder + model_config["repath"]
         server_cmd = "python -m vllm.entrypoints.openai.api_server --trust-remote-code --model " + \
             model_path + " -tp " + str(model_config["tp"]) + " --host " + app_ip + \
-            " --port " + str(app_port) + " --max_num_seqs=" + str(mns)
+            " --port " + str(self.app_port) + " " + space.args(params, "server")
         if chunked_prefill:
-            server_cmd += " --enable_chunked_prefill --max_num_batched_tokens=" + str(mnbt)
-
-        self.server_ssh.execute_command_async(server_cmd)
-        self.server_ssh.read_until_prompt("Uvicorn running on", show_log=True)
-        print("\nserver launched\n")
+            server_cmd += " --enable_chunked_prefill"
+
+        # 模型和 server 参数不变时复用已启动的 server，只清零 profiling 统计
+        server_key = (self.model_name, chunked_prefill) + space.server_values(params)
+        with span("server.acquire") as s:
+            reused = self.server.acquire(server_key, server_cmd, reuse=reuse_server)
+            s.set(reused=reused)
+        if reused:
+            print("\nserver reused\n")
+            with span("server.reset") as s:
+                reset = self.reset_server()
+                s.set(ok=reset)
+            if not reset:
+                # 无法清零 profiling 统计时不能复用，重启 server
+                print("\nserver reset failed, relaunch\n")
+                with span("server.acquire") as s:
+                    self.server.acquire(server_key, server_cmd, reuse=False)
+                    s.set(reused=False)
+        else:
+            print("\nserver launched\n")
 
         dataset_config = config["datasets"][self.dataset_name]
         dataset_path = datasets_folder + dataset_config["repath"]
+        rr = space.value(params, "request-rate")
         client_cmd = "python benchmark_serving2.py --backend vllm --trust-remote-code --model " + \
                     model_path + " --dataset-name " + self.dataset_name + \
                     " --dataset-path " + dataset_path + " --num-prompts=" + \
-                    str(self.num_prompts) + " --request-rate=" + str(rr) + \
-                    " --host " + app_ip + " --port " + str(app_port)
-
-        self.client_ssh.execute_command_async(client_cmd)
-        # 必须马上读取，否则服务器端有过多的日志，使得缓冲区堵塞，会导致程序卡住
-        thread_num = self.server_ssh.start_recv_thread()
-        log_data = self.client_ssh.read_until_prompt(prompt, show_log=True)
-        self.server_ssh.stop_thread(thread_num)
-
-        write_to_file(handle_r_str(log_data), log_path)
-        write_to_file("\ndata split\n", log_path)
-
-        # 额外信息抓取
-        client_cmd = "python3 " + client_config["utils_path"] + " --host " + \
-                    app_ip + " --port " + str(app_port) + " --action save"
-        log_data = self.client_ssh.execute_command(client_cmd)
-
-        # 只存储 vLLM scheduler profiling save... 之后的字符
-        log_data = self.server_ssh.read_until_prompt("vLLM scheduler profiling save...") \
-                                  .split("vLLM scheduler profiling save...")[1]
-        log_data += self.server_ssh.read_until_prompt("/v1/completions HTTP/", max_duration=3)
-        print("[running statistics]:", log_data)
-        write_to_file(log_data, log_path)
-        print("\n======ItemTest finish======\n")
+                    str(self.num_prompts) + " " + space.args(params, "client") + \
+                    " --host " + app_ip + " --port " + str(self.app_port)
+
+        if io_stats_config.get("enabled"):
+            # server shell 跨实验复用，统计从本次实验开始重新计算
+            self.server.ssh.reset_stats()
+            self.stats_dumper = StatsDumper(item_folder + "/io_stats.jsonl",
+                                            [self.client_ssh, self.server.ssh],
+                                            io_stats_config.get("interval", 10)).start()
+
+        # server 输出压缩落盘到 server_log.*.gz，最近的部分保留在内存中供后续查询
+        server_log = ChannelLog(item_folder + "/server_log")
+        # 实时监控 server 指标，预测必然超限时向 client 发送 Ctrl-C 提前终止
+        monitor = None
+        try:
+            if early_abort_config.get("enabled"):
+                monitor = LiveMonitor(rr, self.num_prompts, monitor_limits, early_abort_config,
+                                      on_abort=lambda: self.client_ssh.channel.send("\x03"))
+                self.server.attach(server_log, monitor)
+            else:
+                self.server.attach(server_log)
+            with span("benchmark", rr=rr) as s:
+                self.client_ssh.execute_command_async(client_cmd)
+                # client 输出边读边整理（进度条覆盖、去除控制序列和命令回显），逐行写入 log.txt
+                with open(log_path, 'a', encoding='utf-8') as log_file:
+                    normalizer = TermNormalizer(log_file.write, echo=client_cmd,
+                                                prompt=self.host["prompt"])
+                    self.client_ssh.read_until_prompt(self.host["prompt"], show_log=True,
+                                                      sink=normalizer)
+                    normalizer.close()
+                aborted = False
+                if monitor is not None:
+                    monitor.stop()
+                    # Ctrl-C 可能在 client 正常结束后才送达，此时以实际结果为准
+                    with open(log_path, encoding='utf-8') as f:
+                        client_res = parse_text(f.read() + "\ndata split\n").client_res
+                    aborted = monitor.aborted and "Request throughput (req/s)" not in client_res
+                    if aborted:
+                        write_to_file(monitor.result_lines(), log_path)
+                s.set(aborted=aborted)
+            write_to_file("\ndata split\n", log_path)
+            # 提前终止的实验没有完整的 profiling 统计，不再 save
+            log_data = None if aborted else self.save_profiling(server_log)
+        finally:
+            # 出错时同样停止监控、停止写入并关闭 server_log，结束写线程并写完最后一个 gzip 部分
+            if monitor is not None:
+                monitor.stop()
+            self.server.detach()
+            server_log.close()
+
+        if aborted:
+            print("\n======ItemTest aborted early======\n")
+        else:
+            print("[running statistics]:", log_data)
+            write_to_file(log_data, log_path)
+            print("\n======ItemTest finish======\n")
 
         self.post_handle(item_folder)
-        return log_path
-
-    def post_handle(self, item_folder):
-        if server_config["post_cmds"] != None:
-            for cmd in server_config["post_cmds"]:
-                self.server_ssh.execute_command(cmd, max_duration=3)
-
-        if client_config["post_cmds"] != None:
-            for cmd in client_config["post_cmds"]:
-                self.client_ssh.execute_command(cmd, max_duration=3)
 
-        # 远端文件下载到本地
-        self.client_ssh.download_directory("/workspace/volume/chenqiyang/vllm_test", item_folder)
+    def save_profiling(self, server_log):
+        """ 执行 utils save，返回 server 日志中 profiling 统计的文本 """
+        with span("profiling.save"):
+            # 额外信息抓取
+            mark = server_log.total_bytes
+            # save 失败时立即报错，不再等待不会出现的 profiling 输出
+            self.run_utils("save", check=True)
+
+            # 只存储 vLLM scheduler profiling save... 之后的字符，直接从 drain 线程的缓冲中查找
+            save_end = server_log.wait_for("vLLM scheduler profiling save...", since=mark)
+            if save_end < 0:
+                raise RuntimeError("vLLM scheduler profiling save... not found")
+            stat_end = server_log.wait_for("/v1/completions HTTP/", since=save_end, timeout=3)
+            start, data = server_log.slice_at(save_end)
+            if stat_end >= 0:
+                # 截取到该请求日志行的行尾
+                line_end = data.find(b'\n', max(0, stat_end - start))
+                data = data[:line_end + 1] if line_end >= 0 else data
+            return data.decode('utf-8', errors='replace')
+
+    # post_scheduler_view_action.py，save 输出 profiling 统计，reset 清零
+    def utils_cmd(self, action):
+        return "python3 " + client_config["utils_path"] + " --host " + app_ip + \
+            " --port " + str(self.app_port) + " --action " + action
+
+    def reset_server(self):
+        """ 复用 server 前清零 profiling 统计，失败（如 utils 不支持 reset_action）返回 False """
+        try:
+            return self.run_utils(client_config["reset_action"]) is not None
+        except Exception as e:
+            print("reset action failed:", e)
+            return False
+
+    # 返回命令输出；exec_mode 下退出码非 0 或超时时打印错误并返回 None，与 shell 模式一样不抛出
+    # check，exec_mode 下失败时抛出 RuntimeError（附 stderr 的最后几行），shell 模式无法判断成败
+    def run_utils(self, action, check=False):
+        if exec_mode:
+            result = self.client_ssh.exec_command(self.utils_cmd(action), timeout=600)
+            if not result.ok:
+                status = "timed out" if result.exit_status is None else f"exit {result.exit_status}"
+                tail = "\n".join(result.stderr.strip().splitlines()[-10:])
+                print(f"utils --action {action} {status}:", tail)
+                if check:
+                    raise RuntimeError(f"utils --action {action} {status}: {tail}")
+                return None
+            return result.stdout
+        return self.client_ssh.execute_command(self.utils_cmd(action))
+
+    def trial_result(self, chunked_prefill, *params):
+        """ 运行实验（已完成的直接取结果库），返回 (client_res, server_run, server_res) """
+        self.item_test(chunked_prefill, *params)
+        record = self.store.get_record(self.model_name, self.dataset_name, self.num_prompts,
+                                       chunked_prefill, param_spaces[chunked_prefill].named(params))
+        return record.client_res, record.server_run, record.server_res
 
-        # 关闭连接
-        self.server_ssh.close()
-        self.client_ssh.close()
-
-    def opti_experiment(self, chunked_prefill):
+    def post_handle(self, item_folder):
+        # 不复用时每次实验后停止 server（执行 server 的 post_cmds）
+        if not reuse_server:
+            self.server.stop()
+
+        with span("post_cmds"):
+            if client_config["post_cmds"] != None:
+                for cmd in client_config["post_cmds"]:
+                    self.client_ssh.execute_command(cmd, max_duration=3)
+
+        # 远端文件增量同步到本地镜像，再以硬链接快照到实验目录，未变化的文件不再重复下载
+        mirror_folder = self.output_folder + "/.remote_mirror/" + \
+            self.slot.name.replace(":", "_").replace("/", "_")
+        # 镜像目录只保存远端文件，删除远端已删除或改名的文件
+        self.client_ssh.download_directory(self.slot.work_dir, mirror_folder, prune=True)
+        with span("link_tree"):
+            link_tree(mirror_folder, item_folder)
+
+        self.stop_stats_dump()
+
+    def stop_stats_dump(self):
+        if self.stats_dumper is not None:
+            self.stats_dumper.stop()
+            self.stats_dumper = None
+
+    # slot_pool，search.parallel 大于 1 时各实验从中申请槽位并行运行，见 search_parallel
+    def opti_experiment(self, chunked_prefill, slot_pool=None):
+        if fidelity_config.get("enabled"):
+            return self.opti_experiment_fidelity(chunked_prefill)
         chunked_str = "enable_chunked" if chunked_prefill else "disable_chunked"
+        if slot_pool is not None and parallel > 1:
+            vllm_opti = self.search_parallel(chunked_prefill, slot_pool, parallel)
+        else:
+            vllm_opti = self.search(chunked_prefill)
 
+        print(f"\n======{chunked_str} Opti Finish======")
+        if isinstance(vllm_opti.strategy, ParetoStrategy):
+            # 任意 SLO 下的最优参数从前沿中选取，见 pareto.py
+            rows = vllm_opti.strategy.rows(vllm_opti)
+            save_front(rows, self.folder_path + chunked_str + "/pareto.json")
+            print(f"pareto front ({len(rows)} of {len(vllm_opti.history)} trials):")
+            print_front(rows, config["limitation"]["ttft_p99_limit"],
+                        config["limitation"]["tpot_p99_limit"])
+        print("best params:", vllm_opti.input_params_list[vllm_opti.best_idx])
+        return vllm_opti.input_params_list[vllm_opti.best_idx]
+
+    # 串行调优：按优化器给出的下一个实验依次运行，返回 OptiPlan
+    def search(self, chunked_prefill):
         if chunked_prefill:
             params_config = enable_chunked_config
         else:
             params_config = disable_chunked_config
 
-        mns_cfg = params_config["max_num_seqs"]
-        mnbt_cfg = params_config["max_num_batched_tokens"]
-        rr_cfg = params_config["request-rate"]
-
-        mns = mns_cfg["default"]
-        mnbt = mnbt_cfg["default"]
-        rr = rr_cfg["default"]
-        if mnbt != None and mns > mnbt:
-            mns = mnbt
-        result_txt = self.item_test(chunked_prefill, mns, mnbt, rr)
-
-        input_params = [mns, mnbt, rr]
-        cli_res, ser_run, ser_res = extract_log(result_txt)
-
-        vllm_opti = OptiPlan(chunked_prefill, params_config, config["limitation"])
-        flag, mns, mnbt, rr = vllm_opti.append_experiment(input_params, cli_res,
-                                                          ser_run, ser_res)
+        params = default_params(params_config)
+        vllm_opti = OptiPlan(chunked_prefill, params_config, config["limitation"],
+                             make_strategy(search_config))
 
+        flag = True
         while flag:
-            result_txt = self.item_test(chunked_prefill, mns, mnbt, rr)
+            # 结果库中已完成的实验不会重新运行，中断后重跑即从断点继续
+            cli_res, ser_run, ser_res = self.trial_result(chunked_prefill, *params)
+            flag, *params = vllm_opti.append_experiment(params, cli_res, ser_run, ser_res)
+        return vllm_opti
+
+    # 多保真度调优：在最小的 num-prompts 上搜索，再逐级用更多 prompt 复测排名靠前的实验
+    # 各级的实验按 num_prompts 分目录、分别登记在结果库中
+    def opti_experiment_fidelity(self, chunked_prefill):
+        chunked_str = "enable_chunked" if chunked_prefill else "disable_chunked"
+        rungs = fidelity_rungs(fidelity_config, self.num_prompts)
+        experiments = {n: self if n == self.num_prompts else
+                       vllm_experiment(self.model_name, self.dataset_name, n,
+                                       self.output_folder, slot=self.slot) for n in rungs}
+        vllm_opti = experiments[rungs[0]].search(chunked_prefill)
 
-            input_params = [mns, mnbt, rr]
-            cli_res, ser_run, ser_res = extract_log(result_txt)
+        def evaluate(num_prompts, params):
+            return experiments[num_prompts].trial_result(chunked_prefill, *params)[0]
 
-            flag, mns, mnbt, rr = vllm_opti.append_experiment(input_params, cli_res,
-                                                              ser_run, ser_res)
+        halving = SuccessiveHalving(rungs, fidelity_config.get("eta", 3),
+                                    fidelity_config.get("min_survivors", 2))
+        best = halving.run(vllm_opti, evaluate)
 
         print(f"\n======{chunked_str} Opti Finish======")
-        print("best params:", vllm_opti.input_params_list[vllm_opti.best_idx])
-
-
-for model, _ in config["models"].items():
-    for dataset, _ in config["datasets"].items():
-        from datetime import datetime
-        current_time_str = datetime.now().strftime("%Y-%m-%d-%H:%M")
-        ve = vllm_experiment(model, dataset, num_prompts, "2-A100")
-        # enable_chunked 调优
-        ve.opti_experiment(True)
-        # disable_chunked 调优
-        ve.opti_experiment(False)
\ No newline at end of file
+        halving.print_summary()
+        if best is None:
+            # 低 num-prompts 下的最优参数没有在最后一级复测通过，不能作为调优结果
+            print(f"no params meet the limitation at num_prompts={self.num_prompts}")
+            return None
+        print("best params:", best)
+        return best
+
+    # 批量调优：每轮提出多个候选实验，分别申请 GPU 槽位并行运行，结果按完成顺序返回给优化器
+    # slot_pool，scheduler.SlotPool；parallel，同时运行的实验数；返回 OptiPlan
+    def search_parallel(self, chunked_prefill, slot_pool, parallel):
+        params_config = enable_chunked_config if chunked_prefill else disable_chunked_config
+        tp = config["models"][self.model_name]["tp"]
+        if tp > slot_pool.max_tp():
+            raise ValueError(f"{self.model_name}: no host has {tp} GPUs")
+        vllm_opti = OptiPlan(chunked_prefill, params_config, config["limitation"],
+                             make_strategy(search_config))
+        # 热启动：结果库中已完成的实验先交给优化器，不再重复运行
+        for named, record in self.store.trials(self.model_name, self.dataset_name,
+                                               self.num_prompts, chunked_prefill):
+            params = vllm_opti.space.from_named(named)
+            if params is None:
+                # 参数空间改变之前的实验，缺少或多出参数，不参与本次调优
+                continue
+            vllm_opti.report(params, record.client_res, record.server_run, record.server_res)
+
+        def run_trial(params):
+            slot = slot_pool.allocate(tp)
+            try:
+                ve = vllm_experiment(self.model_name, self.dataset_name, self.num_prompts,
+                                     self.output_folder, slot=slot)
+                return ve.trial_result(chunked_prefill, *params)
+            finally:
+                slot_pool.release(slot)
+
+        running = {}
+        with ThreadPoolExecutor(max_workers=parallel) as executor:
+            while True:
+                if not vllm_opti.finished:
+                    for params in vllm_opti.propose_batch(parallel - len(running)):
+                        running[executor.submit(run_trial, params)] = params
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    params = running.pop(future)
+                    try:
+                        cli_res, ser_run, ser_res = future.result()
+                    except Exception as e:
+                        # 单个实验失败不影响其他进行中的实验，该参数不再提出
+                        print(f"trial {vllm_opti.space.folder_name(params)} failed: {e!r}")
+                        vllm_opti.cancel(params, failed=True)
+                        continue
+                    vllm_opti.report(params, cli_res, ser_run, ser_res)
+        if vllm_opti.best_idx < 0:
+            raise RuntimeError(f"{self.model_name}/{self.dataset_name}: all trials failed")
+        return vllm_opti
+
+
+def sweep_hosts():
+    # 未配置 hosts 时，只用 ssh_setting 主机，卡数按最大的 tp 计
+    max_tp = max(model_config["tp"] for model_config in config["models"].values())
+    return config.get("hosts") or [{"gpus": list(range(max_tp))}]
+
+
+def plan_sweep(output_folder="2-A100"):
+    """ 展开 sweep 的所有任务，按结果库去重并估计耗时（planner.SweepPlan） """
+    return SweepPlan(config, open_store(output_folder + '/results.sqlite'), num_prompts,
+                     SlotPool(sweep_hosts(), default_host, app_port, work_dir).hosts,
+                     output_folder, reuse_server)
+
+
+def run_tasks_parallel(tasks, slot_pool, output_folder):
+    """ 依次执行各调优任务，每个任务同时运行 parallel 个实验，返回格式同 ExperimentScheduler.run """
+    results = {}
+    for order, (task, tp, _) in enumerate(tasks):
+        model, dataset, chunked_prefill = task
+        start = time.time()
+        print(f"[sweep] start {task}, {parallel} trials in parallel")
+        try:
+            ve = vllm_experiment(model, dataset, num_prompts, output_folder)
+            result = ve.opti_experiment(chunked_prefill, slot_pool)
+            status = "ok"
+        except Exception:
+            traceback.print_exc()
+            result = None
+            status = "failed"
+        elapsed = time.time() - start
+        print(f"[sweep] {status} {task} in {elapsed:.1f}s")
+        results[task] = {"status": status, "result": result, "slot": None,
+                         "start": start, "seconds": elapsed, "order": order}
+    return results
+
+
+def run_sweep(output_folder="2-A100"):
+    """ 所有 模型 x 数据集 x chunked 模式 的调优任务，按 GPU 槽位并发执行 """
+    slot_pool = SlotPool(sweep_hosts(), default_host, app_port, work_dir)
+
+    def run_task(task, slot):
+        model, dataset, chunked_prefill = task
+        ve = vllm_experiment(model, dataset, num_prompts, output_folder, slot=slot)
+        return ve.opti_experiment(chunked_prefill)
+
+    tasks = []
+    if planner_config.get("reorder", True):
+        # 同一模型的任务相邻并优先回到上次的槽位，减少模型重新加载；已完成的任务只回放结果
+        plan = plan_sweep(output_folder)
+        plan.print()
+        for task in plan.tasks:
+            tasks.append((task.key, task.tp, task.model if plan.affinity else None))
+    else:
+        for model, model_config in config["models"].items():
+            for dataset, _ in config["datasets"].items():
+                # enable_chunked 调优
+                tasks.append(((model, dataset, True), model_config["tp"], None))
+                # disable_chunked 调优
+                tasks.append(((model, dataset, False), model_config["tp"], None))
+    sched = ExperimentScheduler(slot_pool, run_task)
+    for task, tp, group in tasks:
+        sched.submit(task, tp, group=group)
+    try:
+        if parallel > 1:
+            # 批量调优：任务依次执行，每个任务的实验分别从槽位池申请槽位并行运行
+            return run_tasks_parallel(tasks, slot_pool, output_folder)
+        return sched.run()
+    finally:
+        stop_servers()
+        # 整个 sweep 各阶段耗时汇总，按模型分组
+        trace_path = output_folder + '/trace.jsonl'
+        if tracing_config.get("enabled") and os.path.exists(trace_path):
+            spans = load(trace_path)
+            print_summary(spans, by="model")
+            to_chrome(spans, output_folder + '/trace.json')
+
+
+if __name__ == "__main__":
+    run_sweep()
@@ -1,53 +1,81 @@
+from history import TrialHistory
+from param_space import ParamSpace
+
+
+def default_params(step_cfg):
+    """ 调优的起点，参数顺序见 param_space.ParamSpace，mns 不大于 mnbt """
+    return ParamSpace(step_cfg).default()
+
+
+# 调优策略接口：根据 OptiPlan 中的实验历史提出候选实验
+class SearchStrategy:
+    # 返回至多 k 个候选参数列表（顺序同 plan.space），由 OptiPlan 负责去重
+    def propose(self, plan, k):
+        raise NotImplementedError
+
+    # 是否停止调优，默认连续 opti_loss_limit 次未优化时停止（批量模式下按批计）
+    def finished(self, plan):
+        return plan.opti_loss_times >= plan.limits["opti_loss_limit"]
+
+
+# 原有的启发式规则：按 get_opti_dir1/2 给出的方向逐参数调整
+class HeuristicStrategy(SearchStrategy):
+    def propose(self, plan, k):
+        return plan.heuristic_batch(k)
+
+
 class OptiPlan:
-    def __init__(self, chunked_prefill, step_cfg, limits):
+    # strategy，SearchStrategy 实例，默认使用 HeuristicStrategy
+    def __init__(self, chunked_prefill, step_cfg, limits, strategy=None):
         self.chunked_prefill = chunked_prefill
         self.step_cfg = step_cfg
         self.limits = limits
+        self.strategy = strategy if strategy is not None else HeuristicStrategy()
+        # 参数的类型、范围、步长和约束，见 param_space.ParamSpace
+        self.space = ParamSpace(step_cfg)
 
-        self.input_params_list = []
-        self.client_res_list = []
-        self.eva_list = []
-        self.server_run_df_list = []
-        self.server_res_df_list = []
-        self.opti_dir_list = []
+        # 实验参数、结果和调优方向，见 history.TrialHistory
+        self.history = TrialHistory(self.space.names)
 
         self.best_throughput = -1
         self.best_idx = -1
         self.opti_loss_times = 0
+        # 批量模式下已提出、尚未返回结果的实验
+        self.pending_list = []
+        # 批量模式下每次 propose_batch 为一批：批号 -> [未返回的实验数, 是否有优化]
+        # 一批的实验全部返回后才更新 opti_loss_times，k 个并行实验相当于串行模式的一步
+        self.batches = {}
+        self.batch_of = {}
+        self.batch_count = 0
+        # 批量模式下运行失败的实验，不再提出
+        self.failed_list = []
 
     def exist(self, input_params):
-        for item in self.input_params_list:
-            if item == input_params:
-                return True
-        return False
+        return self.history.exist(input_params)
 
-    def get_next_by_step(self, param_str, input, step):
-        cfg = self.step_cfg[param_str]
+    @property
+    def input_params_list(self):
+        return self.history.params_list()
 
-        if abs(step) < cfg["min_step_num"]:
-            return False, 0
-        else:
-            step = int(step / cfg["min_step_num"]) * cfg["min_step_num"]
+    @property
+    def eva_list(self):
+        return self.history.column("eva")
 
-        if input + step <= cfg["bound"][0]:
-            if input == cfg["bound"][0]:
-                return False, 0
-            else:
-                return True, cfg["bound"][0]
+    @property
+    def opti_dir_list(self):
+        return self.history.column("opti_dir")
 
-        if input + step >= cfg["bound"][1]:
-            if input == cfg["bound"][1]:
-                return False, 0
-            else:
-                return True, cfg["bound"][1]
-
-        res = input + step
-        if abs(res - int(res)) < 0.01:
-            res = int(res)
+    @property
+    def finished(self):
+        return self.strategy.finished(self)
 
-        return True, res
+    def get_next_by_step(self, param_str, input, step):
+        return self.space[self.space.dims[param_str]].step(input, step)
 
     def evaluate_experiment(self, client_res):
+        if client_res.get("Early abort"):
+            print("violated (early)")
+            return -1
         if client_res["P99 TTFT (ms)"] > self.limits["ttft_p99_limit"]:
             print("TTFT overtime")
             return -1
@@ -56,21 +84,20 @@ class OptiPlan:
             return -1
         return client_res["Request throughput (req/s)"]
 
-    # max_num_seqs 变化, idx 为实验序号
-    def find_dir0(self, idx):
-        inputs_in_dir = []
-        for i in range(len(self.input_params_list)):
-            if self.input_params_list[i][1] == self.input_params_list[idx][1] and \
-               self.input_params_list[i][2] == self.input_params_list[idx][2]:
-                inputs_in_dir.append([i, self.input_params_list[i][0]])
-
-        value = self.input_params_list[idx][0]
-        opti_dir = self.opti_dir_list[idx][0]
-        param_str = "max_num_seqs"
-        step = opti_dir * self.step_cfg[param_str]["step_num"]
-
+    # 第 dim 维参数变化, idx 为实验序号
+    def find_dir(self, idx, dim):
+        param = self.space[dim]
+        value = self.history.get_params(idx)[dim]
+        opti_dir = self.opti_dir_list[idx][dim]
+        step = opti_dir * param.step_num
+        if not param.line_search:
+            # 如 max_num_batched_tokens，只按步长走一步
+            return param.step(value, step)
+
+        # 其余参数相同的实验，即该维方向上的一条线
+        inputs_in_dir = [[i, v] for v, i in self.history.line(idx, dim)]
         if len(inputs_in_dir) == 1:
-            return self.get_next_by_step(param_str, value, step)
+            return param.step(value, step)
         # 按值大小排序
         inputs_in_dir = sorted(inputs_in_dir, key=lambda x: opti_dir * x[1])
 
@@ -82,10 +109,10 @@ class OptiPlan:
                 cur_step = item[1] - value
                 # 如果调优后，结果变差
                 if self.eva_list[idx] > self.eva_list[item[0]]:
-                    return self.get_next_by_step(param_str, value, cur_step / 2)
+                    return param.step(value, cur_step / 2)
                 # 如果调优方向上，出现有效值，但本次是无效值
                 if self.eva_list[idx] == -1 and self.eva_list[item[0]] > 0:
-                    return self.get_next_by_step(param_str, value, cur_step / 2)
+                    return param.step(value, cur_step / 2)
             if item[0] == idx:
                 tmp = True
 
@@ -99,150 +126,227 @@ class OptiPlan:
                 mulpy = 1
             last_eva = self.eva_list[item[0]]
 
-        return self.get_next_by_step(param_str, value, mulpy * step)
-
-    # max_num_batched_tokens 变化, idx 为实验序号
-    def find_dir1(self, idx):
-        inputs_in_dir = []
-        for i in range(len(self.input_params_list)):
-            if self.input_params_list[i][0] == self.input_params_list[idx][0] and \
-               self.input_params_list[i][2] == self.input_params_list[idx][2]:
-                inputs_in_dir.append([i, self.input_params_list[i][1]])
-
-        value = self.input_params_list[idx][1]
-        opti_dir = self.opti_dir_list[idx][1]
-        param_str = "max_num_batched_tokens"
-        step = opti_dir * self.step_cfg[param_str]["step_num"]
-
-        return self.get_next_by_step(param_str, value, step)
-        # if len(inputs_in_dir) == 1:
-        #     return self.get_next_by_step(param_str, value, step)
-        # inputs_in_dir = sorted(inputs_in_dir, key=lambda x: opti_dir * x[1])
-
-        # tmp = False
-        # last_eva = self.eva_list[inputs_in_dir[0][0]]
-        # mulpy = 1
-        # for item in inputs_in_dir:
-        #     if tmp:
-        #         cur_step = item[1] - value
-        #         # 如果调优后，结果变差
-        #         if self.eva_list[idx] > self.eva_list[item[0]]:
-        #             return self.get_next_by_step(param_str, value, cur_step / 2)
-        #         # 如果调优方向上，出现有效值，但本次是无效值
-        #         if self.eva_list[idx] == -1 and self.eva_list[item[0]] > 0:
-        #             return self.get_next_by_step(param_str, value, cur_step / 2)
-        #     if item[0] == idx:
-        #         tmp = True
-
-        #     if self.eva_list[item[0]] > last_eva and last_eva > 0:
-        #         mulpy += 1
-        #     elif self.eva_list[item[0]] == -1 and last_eva == -1:
-        #         mulpy += 1
-        #     else:
-        #         mulpy = 1
-        #     last_eva = self.eva_list[item[0]]
-
-        # return self.get_next_by_step(param_str, value, mulpy * step)
-
-    # request-rate 变化, idx 为实验序号
-    def find_dir2(self, idx):
-        inputs_in_dir = []
-        for i in range(len(self.input_params_list)):
-            if self.input_params_list[i][0] == self.input_params_list[idx][0] and \
-               self.input_params_list[i][1] == self.input_params_list[idx][1]:
-                inputs_in_dir.append([i, self.input_params_list[i][2]])
-
-        value = self.input_params_list[idx][2]
-        opti_dir = self.opti_dir_list[idx][2]
-        param_str = "request-rate"
-        step = opti_dir * self.step_cfg[param_str]["step_num"]
-
-        if len(inputs_in_dir) == 1:
-            return self.get_next_by_step(param_str, value, step)
-        inputs_in_dir = sorted(inputs_in_dir, key=lambda x: opti_dir * x[1])
-
-        tmp = False
-        last_eva = 0
-        mulpy = 1
-        for item in inputs_in_dir:
-            if tmp:
-                cur_step = item[1] - value
-                # 如果调优后，结果变差
-                if self.eva_list[idx] > self.eva_list[item[0]]:
-                    return self.get_next_by_step(param_str, value, cur_step / 2)
-                # 如果调优方向上，出现有效值，但本次是无效值
-                if self.eva_list[idx] == -1 and self.eva_list[item[0]] > 0:
-                    return self.get_next_by_step(param_str, value, cur_step / 2)
-            if item[0] == idx:
-                tmp = True
-
-            if self.eva_list[item[0]] > last_eva and last_eva > 0:
-                mulpy += 1
-            elif self.eva_list[item[0]] == -1 and last_eva == -1:
-                mulpy += 1
-            else:
-                mulpy = 1
-            last_eva = self.eva_list[item[0]]
-
-        return self.get_next_by_step(param_str, value, mulpy * step)
+        return param.step(value, mulpy * step)
 
     def Choose_next_by_dir(self, idx):
         flag = True
-        mns = self.input_params_list[idx][0]
-        mnbt = self.input_params_list[idx][1]
-        rr = self.input_params_list[idx][2]
-
-        if self.opti_dir_list[idx][0] != 0:
-            flag, mns = self.find_dir0(idx)
-        if self.opti_dir_list[idx][1] != 0:
-            flag, mnbt = self.find_dir1(idx)
-        if self.opti_dir_list[idx][2] != 0:
-            flag, rr = self.find_dir2(idx)
+        params = self.history.get_params(idx)
+
+        for dim in range(len(self.space)):
+            if self.opti_dir_list[idx][dim] != 0:
+                flag, params[dim] = self.find_dir(idx, dim)
         # 如果存在该实验，返回错误
-        if self.exist([mns, mnbt, rr]):
-            return False, 0, 0, 0
+        if self.exist(params):
+            return (False, *self.space.zeros())
         # mnbt 不小于 mns
-        if mnbt != None and mns > mnbt:
-                mns = mnbt
-        return flag, mns, mnbt, rr
+        self.space.fix(params)
+        return (flag, *params)
 
-    def append_experiment(self, input_params, client_res, server_run_df, server_res_df):
-        # 实验参数
-        self.input_params_list.append(input_params)
-        # client端结果，字典数据，单位为 ms
-        self.client_res_list.append(client_res)
+    # 记录一次实验结果，更新最优值和未优化次数，返回实验序号
+    def record_experiment(self, input_params, client_res, server_run_df, server_res_df):
+        if input_params in self.pending_list:
+            self.pending_list.remove(input_params)
         eva = self.evaluate_experiment(client_res)
-        self.eva_list.append(eva)
-        # server端抓取信息，pandas 的 dataframe 数据，单位为 s
-        self.server_run_df_list.append(server_run_df)
-        self.server_res_df_list.append(server_res_df)
-        cur_idx = len(self.input_params_list) - 1
+        # client端结果单位为 ms，server端抓取信息单位为 s
+        cur_idx = self.history.append(input_params, eva, client_res, server_run_df, server_res_df)
 
-        if eva > self.best_throughput:
+        improved = eva > self.best_throughput
+        if improved:
             self.best_throughput = eva
             self.best_idx = cur_idx
+        batch = self.batch_of.pop(tuple(input_params), None)
+        if batch is None:
+            # 串行模式，每次实验计一次
+            self.count_loss(improved)
+        else:
+            self.batches[batch][1] |= improved
+            self.finish_batch(batch)
+        return cur_idx
+
+    def count_loss(self, improved):
+        if improved:
             self.opti_loss_times = 0
         elif self.best_throughput > 0:
             self.opti_loss_times += 1
-        if self.opti_loss_times >= self.limits["opti_loss_limit"]:
-            return False, 0, 0, 0
+
+    # 一批中的一个实验返回或取消，全部返回后按整批计一次
+    def finish_batch(self, batch):
+        self.batches[batch][0] -= 1
+        if self.batches[batch][0] == 0:
+            _, improved = self.batches.pop(batch)
+            self.count_loss(improved)
+
+    def get_opti_dir(self, input_params, client_res, server_run_df, server_res_df):
+        if client_res.get("Early abort"):
+            return self.get_opti_dir_early(client_res)
+        if self.chunked_prefill:
+            opti = self.get_opti_dir2(input_params, client_res, server_run_df, server_res_df)
+        else:
+            opti = self.get_opti_dir1(input_params, client_res, server_run_df, server_res_df)
+        return self.explore_extra(self.history.find(input_params), opti)
+
+    # 启发式规则只调整内置的三个参数。规则没有给出方向且实验满足约束时，依次沿其他可调参数
+    # 探索一步：该参数的直线上还没有更大的实验时调大，没有更小的实验时调小
+    def explore_extra(self, idx, opti):
+        if any(opti) or idx < 0 or self.eva_list[idx] <= 0:
+            return opti
+        params = self.history.get_params(idx)
+        for dim in self.space.extra_dims:
+            param = self.space[dim]
+            if not param.tunable:
+                continue
+            values = [v for v, _ in self.history.line(idx, dim)]
+            if params[dim] < param.bound[1] and not any(v > params[dim] for v in values):
+                opti[dim] = 1
+                return opti
+            if params[dim] > param.bound[0] and not any(v < params[dim] for v in values):
+                opti[dim] = -1
+                return opti
+        return opti
+
+    def append_experiment(self, input_params, client_res, server_run_df, server_res_df):
+        if not isinstance(self.strategy, HeuristicStrategy):
+            # 其他策略：串行模式即每次提出一个候选的批量模式
+            self.report(input_params, client_res, server_run_df, server_res_df)
+            candidates = self.propose_batch(1)
+            if not candidates:
+                return (False, *self.space.zeros())
+            return (True, *candidates[0])
+
+        cur_idx = self.record_experiment(input_params, client_res, server_run_df, server_res_df)
+        if self.finished:
+            return (False, *self.space.zeros())
 
         # 如果调优后结果变差
         if len(self.eva_list) > 1 and \
             self.eva_list[self.best_idx] > self.eva_list[-1]:
             # 沿用最优次的调优方向，重新调优
-            opti = self.opti_dir_list[self.best_idx]
-            self.opti_dir_list.append(opti)
-            return self.Choose_next_by_dir(self.best_idx)
+            self.history.set_opti_dir(cur_idx, self.opti_dir_list[self.best_idx])
+            result = self.Choose_next_by_dir(self.best_idx)
         else:
-            if self.chunked_prefill:
-                opti = self.get_opti_dir2(input_params, client_res,
-                                           server_run_df, server_res_df)
-            else:
-                opti = self.get_opti_dir1(input_params, client_res,
-                                           server_run_df, server_res_df)
-        self.opti_dir_list.append(opti)
-        return self.Choose_next_by_dir(cur_idx)
+            opti = self.get_opti_dir(input_params, client_res, server_run_df, server_res_df)
+            self.history.set_opti_dir(cur_idx, opti)
+            result = self.Choose_next_by_dir(cur_idx)
+        if not result[0]:
+            result = self.explore_next()
+        return result
+
+    # 内置参数的规则无法继续时，从最优实验出发沿其他参数探索，
+    # 最优实验改用该方向，之后结果变差时沿该方向做线搜索；没有其他参数时调优结束
+    def explore_next(self):
+        if self.best_idx < 0:
+            return (False, *self.space.zeros())
+        opti = self.explore_extra(self.best_idx, self.space.zeros())
+        if not any(opti):
+            return (False, *self.space.zeros())
+        self.history.set_opti_dir(self.best_idx, opti)
+        return self.Choose_next_by_dir(self.best_idx)
+
+    def is_new(self, input_params):
+        return not self.exist(input_params) and input_params not in self.pending_list and \
+            input_params not in self.failed_list
+
+    # 从第 idx 次实验出发，只沿 dim 维移动 scale 倍 step_num
+    def step_from(self, idx, dim, scale):
+        param = self.space[dim]
+        if not param.tunable:
+            return False, None
+        params = self.history.get_params(idx)
+        flag, value = param.step(params[dim], scale * param.step_num)
+        if not flag:
+            return False, None
+        params[dim] = value
+        # mnbt 不小于 mns
+        return True, self.space.fix(params)
+
+    # 批量模式：一次提出至多 k 个互不重复的候选实验，供多个槽位并行评估
+    def propose_batch(self, k):
+        candidates = []
+
+        def add(params):
+            if len(candidates) < k and self.is_new(params) and params not in candidates:
+                candidates.append(params)
+
+        if not len(self.history):
+            # 还没有结果，从默认值出发
+            add(self.space.default())
+        elif not self.finished:
+            for params in self.strategy.propose(self, k):
+                add(params)
+        if candidates:
+            self.batches[self.batch_count] = [len(candidates), False]
+            for params in candidates:
+                self.batch_of[tuple(params)] = self.batch_count
+            self.batch_count += 1
+        self.pending_list += candidates
+        return candidates
+
+    # 启发式策略的批量候选
+    # 首选与串行模式相同的下一步，其余沿最优实验的调优方向做多倍步长的线搜索，
+    # 再向其他方向探索，最后做半步细化
+    def heuristic_batch(self, k):
+        candidates = []
+
+        def add(params):
+            if len(candidates) < k and self.is_new(params) and params not in candidates:
+                candidates.append(params)
+
+        # 以最优实验为锚点，其次是最近的实验
+        anchors = [self.best_idx] if self.best_idx >= 0 else []
+        anchors += [i for i in range(len(self.history) - 1, -1, -1)
+                    if i not in anchors][:2]
+        for idx in anchors:
+            flag, *params = self.Choose_next_by_dir(idx)
+            if flag:
+                add(params)
+            opti = self.opti_dir_list[idx]
+            dims = sorted(range(len(self.space)), key=lambda d: opti[d] == 0)
+            # 沿调优方向并行做线搜索：1, 2, ... 倍步长
+            for mult in range(1, k + 1):
+                for dim in dims:
+                    if opti[dim] != 0:
+                        flag, params = self.step_from(idx, dim, mult * opti[dim] / abs(opti[dim]))
+                        if flag:
+                            add(params)
+            # 再试其他维度的两个方向，最后半步细化
+            for scale in (1, 0.5):
+                for dim in dims:
+                    signs = [1 if opti[dim] >= 0 else -1]
+                    signs.append(-signs[0])
+                    for sign in signs:
+                        flag, params = self.step_from(idx, dim, sign * scale)
+                        if flag:
+                            add(params)
+            if len(candidates) >= k:
+                break
+        return candidates
+
+    # 批量模式：任意顺序返回的实验结果，返回 False 表示调优结束
+    def report(self, input_params, client_res, server_run_df, server_res_df):
+        cur_idx = self.record_experiment(input_params, client_res, server_run_df, server_res_df)
+        self.history.set_opti_dir(cur_idx, self.get_opti_dir(input_params, client_res,
+                                                             server_run_df, server_res_df))
+        return not self.finished
+
+    # 批量模式：放弃一个已提出但未能完成的实验，failed 为 True 时之后不再提出
+    def cancel(self, input_params, failed=False):
+        if input_params in self.pending_list:
+            self.pending_list.remove(input_params)
+        if failed and input_params not in self.failed_list:
+            self.failed_list.append(input_params)
+        batch = self.batch_of.pop(tuple(input_params), None)
+        if batch is not None:
+            self.finish_batch(batch)
+
+    # 提前终止的实验没有完整的 server 统计，按预测超限的指标调整：排队增长减小 request-rate，
+    # TPOT 超限减小 max_num_seqs
+    def get_opti_dir_early(self, client_res):
+        opti = self.space.zeros()
+        if client_res["P99 TTFT (ms)"] > self.limits["ttft_p99_limit"]:
+            opti[2] = -1
+        else:
+            opti[0] = -1
+        return opti
 
     # disable_chunked_prefill 评估实验结果，指示调优方向
     def get_opti_dir1(self, input_params, client_res, server_run_df, server_res_df):
@@ -254,7 +358,7 @@ class OptiPlan:
         T_context_infer = 1000 * server_res_df.loc["P99", "context_latency/s"]
         T_decoder_infer = 1000 * server_res_df.loc["P99", "per_token_latency/s"]
 
-        opti = [0,0,0]
+        opti = self.space.zeros()
 
         if client_res["P99 TTFT (ms)"] > self.limits["ttft_p99_limit"] or \
             client_res["P99 TPOT (ms)"] > self.limits["tpot_p99_limit"]:
@@ -301,7 +405,7 @@ class OptiPlan:
         T_context_infer = 1000 * server_res_df.loc["P99", "context_latency/s"]
         T_decoder_infer = 1000 * server_res_df.loc["P99", "per_token_latency/s"]
 
-        opti = [0,0,0]
+        opti = self.space.zeros()
 
         if client_res["P99 TTFT (ms)"] > self.limits["ttft_p99_limit"] or \
             client_res["P99 TPOT (ms)"] > self.limits["tpot_p99_limit"]:
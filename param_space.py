@@ -0,0 +1,240 @@
+import math
+
+# 内置的三个参数，在参数空间中固定排在最前面，config.yaml 中缺少时按 default: null 处理
+# 实验目录名中按位置写出，与之前的 <mns>_<mnbt>_<rr> 相同；其他参数追加为 _<short>=<值>
+# short，目录名、结果库和结果表中的简称，不能含有 "_" 和 "="（目录名的分隔符），
+# 默认为参数名中的 "_" 换成 "-"，如 block_size -> block-size
+# side，server 为 api_server 参数（改变时重启 server），client 为 benchmark 参数
+# flag，命令行参数名，默认为 --<name>
+# log，贝叶斯优化中按对数尺度建模
+# line_search，启发式调优沿该维移动时参考同一直线上已有的实验，否则只按 step_num 走一步
+# le，取值不大于另一参数（为 None 时不限制）
+core_params = {
+    "max_num_seqs": {"short": "mns", "side": "server", "type": "int", "log": True,
+                     "le": "max_num_batched_tokens"},
+    "max_num_batched_tokens": {"short": "mnbt", "side": "server", "type": "int", "log": True,
+                               "line_search": False},
+    "request-rate": {"short": "rr", "side": "client", "type": "float"},
+}
+core_names = list(core_params)
+core_shorts = [core_params[name]["short"] for name in core_names]
+
+
+def to_number(v):
+    if v is None:
+        return None
+    v = round(float(v), 6)
+    return int(v) if v.is_integer() else v
+
+
+def parse_value(text):
+    """ 目录名中的参数值 """
+    if text == "None":
+        return None
+    return to_number(text)
+
+
+def trial_name(named):
+    """ 实验目录名，named 为 {简称: 值}，旧的 [mns, mnbt, rr] 列表也可以 """
+    if not isinstance(named, dict):
+        named = dict(zip(core_shorts, named))
+    name = "_".join(str(named.get(short)) for short in core_shorts)
+    for short, v in named.items():
+        if short not in core_shorts:
+            name += f"_{short}={v}"
+    return name
+
+
+def split_trial_name(name):
+    """ 实验目录名拆为 {简称: 值的原文} """
+    parts = name.split("_")
+    if len(parts) < len(core_shorts):
+        raise ValueError(f"bad trial name: {name}")
+    named = dict(zip(core_shorts, parts[:len(core_shorts)]))
+    for part in parts[len(core_shorts):]:
+        short, sep, v = part.partition("=")
+        if not sep:
+            raise ValueError(f"bad trial name: {name}")
+        named[short] = v
+    return named
+
+
+def parse_trial_name(name):
+    """ trial_name 的逆过程，返回 {简称: 值} """
+    return {short: parse_value(v) for short, v in split_trial_name(name).items()}
+
+
+# 一个可调参数，配置见 config.yaml 的 params
+# type：int、float、bool（取 0/1，为 1 时只写出 flag）
+# 有 choices 时只在其中取值，step_num/min_step_num 按 choices 中的位置计算
+# default 为 None 时该模式下不使用此参数（如 disable_chunked 时的 max_num_batched_tokens）
+class Param:
+    def __init__(self, name, cfg=None):
+        spec = dict(core_params.get(name, {}))
+        spec.update(cfg or {})
+        self.name = name
+        self.short = spec.get("short", name.replace("_", "-"))
+        if not self.short or "_" in self.short or "=" in self.short:
+            raise ValueError(f"param {name}: short {self.short!r} must be non-empty "
+                             f"without '_' or '='")
+        self.side = spec.get("side", "server")
+        self.flag = spec.get("flag", "--" + name)
+        self.type = spec.get("type", "float")
+        self.default = spec.get("default")
+        self.step_num = spec.get("step_num")
+        self.min_step_num = spec.get("min_step_num")
+        self.bound = spec.get("bound") or [None, None]
+        self.choices = spec.get("choices")
+        if self.type == "bool" and self.choices is None:
+            self.choices = [0, 1]
+        if self.choices is not None:
+            self.choices = sorted(to_number(v) for v in self.choices)
+            self.bound = [self.choices[0], self.choices[-1]]
+            self.step_num = self.step_num or 1
+            self.min_step_num = self.min_step_num or 1
+        self.log = spec.get("log", False)
+        self.line_search = spec.get("line_search", True)
+        self.le = spec.get("le")
+        if self.side not in ("server", "client"):
+            raise ValueError(f"param {name}: side must be server or client, got {self.side}")
+
+    @property
+    def tunable(self):
+        return self.default is not None and self.step_num is not None and \
+            None not in self.bound
+
+    def __repr__(self):
+        return f"Param({self.name}, default={self.default})"
+
+    def cast(self, v):
+        if v is None:
+            return None
+        return int(round(v)) if self.type in ("int", "bool") else to_number(v)
+
+    def step(self, value, step):
+        """ 从 value 移动 step，返回 (是否移动, 新值)，规则与原来的 get_next_by_step 相同 """
+        if self.choices is not None:
+            # 按 choices 中的位置移动
+            return self.step_choice(value, step)
+        if abs(step) < self.min_step_num:
+            return False, 0
+        # 步长取最小步长的整数倍，round 去掉浮点误差（如 0.06 / 0.02）
+        step = int(round(step / self.min_step_num, 6)) * self.min_step_num
+        lo, hi = self.bound
+        if value + step <= lo:
+            return (False, 0) if value == lo else (True, lo)
+        if value + step >= hi:
+            return (False, 0) if value == hi else (True, hi)
+        return True, self.cast(value + step)
+
+    def step_choice(self, value, step):
+        if abs(step) < self.min_step_num:
+            return False, 0
+        pos = min(range(len(self.choices)), key=lambda i: abs(self.choices[i] - value))
+        pos += int(round(step / self.min_step_num, 6))
+        pos = min(max(pos, 0), len(self.choices) - 1)
+        if self.choices[pos] == value:
+            return False, 0
+        return True, self.choices[pos]
+
+    def grid(self):
+        """ 取值网格，固定的参数返回 None """
+        if self.choices is not None:
+            return self.choices if self.default is not None and len(self.choices) > 1 else None
+        if self.min_step_num is None or self.bound[0] is None or self.default is None:
+            return None
+        lo, hi = self.bound
+        n = int(math.floor((hi - lo) / self.min_step_num + 0.5))
+        return [self.cast(lo + i * self.min_step_num) for i in range(n + 1)] if n > 0 else None
+
+    def arg(self, v):
+        if self.type == "bool":
+            return self.flag if v else ""
+        return f"{self.flag}={v}"
+
+
+# 一个 chunked 模式下的参数空间，step_cfg 为 config.yaml 中 params 下的一节
+# 参数顺序：内置的三个参数，然后是 step_cfg 中其他参数的书写顺序
+# OptiPlan、命令行、实验目录名、结果库和结果表都由它决定
+class ParamSpace:
+    def __init__(self, step_cfg):
+        names = core_names + [name for name in step_cfg if name not in core_params]
+        self.params = [Param(name, step_cfg.get(name)) for name in names]
+        self.names = names
+        self.shorts = [p.short for p in self.params]
+        if len(set(self.shorts)) != len(self.shorts):
+            raise ValueError(f"duplicate param short names: {self.shorts}")
+        self.dims = {name: dim for dim, name in enumerate(names)}
+        for p in self.params:
+            if p.le is not None and p.le not in self.dims:
+                raise ValueError(f"param {p.name}: le refers to unknown param {p.le}")
+        # 启发式规则之外的参数
+        self.extra_dims = list(range(len(core_names), len(names)))
+
+    def __len__(self):
+        return len(self.params)
+
+    def __getitem__(self, dim):
+        return self.params[dim]
+
+    def zeros(self):
+        return [0] * len(self.params)
+
+    def default(self):
+        """ 调优的起点 """
+        return self.fix([p.cast(p.default) for p in self.params])
+
+    def fix(self, values):
+        """ 按 le 约束截断，如 mns 不大于 mnbt """
+        for dim, p in enumerate(self.params):
+            if p.le is None:
+                continue
+            limit = values[self.dims[p.le]]
+            if limit is not None and values[dim] is not None and values[dim] > limit:
+                values[dim] = limit
+        return values
+
+    def valid(self, values):
+        for dim, p in enumerate(self.params):
+            if p.le is None:
+                continue
+            limit = values[self.dims[p.le]]
+            if limit is not None and values[dim] is not None and values[dim] > limit:
+                return False
+        return True
+
+    def value(self, values, name):
+        return values[self.dims[name]]
+
+    def named(self, values):
+        """ {简称: 值}，用于结果库和实验目录名 """
+        return dict(zip(self.shorts, values))
+
+    def from_named(self, named):
+        """ named 的参数与本空间不一致时返回 None """
+        if set(named) != set(self.shorts):
+            return None
+        return [named[short] for short in self.shorts]
+
+    def folder_name(self, values):
+        return trial_name(self.named(values))
+
+    def args(self, values, side):
+        """ side 一侧的命令行参数，值为 None 的参数不写出 """
+        args = [p.arg(v) for p, v in zip(self.params, values) if p.side == side and v is not None]
+        return " ".join(a for a in args if a)
+
+    def server_values(self, values):
+        """ 决定 server 是否需要重启的参数值 """
+        return tuple(v for p, v in zip(self.params, values) if p.side == "server")
+
+
+def extra_shorts(params_config):
+    """ 各 chunked 模式下内置参数以外的参数简称，作为结果表的附加列 """
+    out = []
+    for mode in ("disable_chunked_prefill", "enable_chunked_prefill"):
+        space = ParamSpace(params_config.get(mode) or {})
+        for dim in space.extra_dims:
+            if space.shorts[dim] not in out:
+                out.append(space.shorts[dim])
+    return out
@@ -0,0 +1,168 @@
+import json
+import math
+
+import numpy as np
+
+from param_space import trial_name
+from surrogate import BayesOptStrategy, GaussianProcess
+
+
+def pareto_mask(thr, ttft, tpot):
+    """ 非支配的实验：吞吐量越大越好，P99 TTFT/TPOT 越小越好；含 nan 的实验不参与 """
+    obj = np.stack([-np.asarray(thr, dtype=float), np.asarray(ttft, dtype=float),
+                    np.asarray(tpot, dtype=float)], axis=1)
+    valid = ~np.isnan(obj).any(axis=1)
+    mask = valid.copy()
+    for i in np.flatnonzero(valid):
+        dominated = np.all(obj[valid] <= obj[i], axis=1) & np.any(obj[valid] < obj[i], axis=1)
+        mask[i] = not dominated.any()
+    return mask
+
+
+def best_under(rows, ttft_limit, tpot_limit):
+    """ 前沿中满足给定 TTFT/TPOT 限制的最大吞吐量实验，rows 为 dict 列表 """
+    feasible = [r for r in rows if r["ttft_p99"] <= ttft_limit and r["tpot_p99"] <= tpot_limit]
+    return max(feasible, key=lambda r: r["throughput"]) if feasible else None
+
+
+# 多目标调优：搜索 (吞吐量, P99 TTFT, P99 TPOT) 的 Pareto 前沿
+# 一次调优即可回答任意 TTFT/TPOT 限制下的最优参数，limitation 只用于 OptiPlan 返回的最优实验
+# 沿用 BayesOptStrategy 的高斯过程和约束期望提升：每个候选随机抽一组 SLO（在观测到的延迟和
+# ttft_max/tpot_max 之间按对数均匀分布），以该 SLO 下已有的最大吞吐量为基准选期望提升最大的点，
+# 多次抽样覆盖整个 SLO 范围，前沿的各个部分都会被推进
+# ttft_max/tpot_max，关心的 SLO 范围，超出的实验不进入前沿
+# patience，前沿非空后连续这么多次实验没有变化时停止
+class ParetoStrategy(BayesOptStrategy):
+    def __init__(self, ttft_max=10000, tpot_max=300, max_trials=30, patience=6, n_init=4,
+                 seed=0):
+        super().__init__(n_init=n_init, max_trials=max_trials, seed=seed)
+        self.ttft_max = ttft_max
+        self.tpot_max = tpot_max
+        self.patience = patience
+        self.last_front = None
+        self.changed_at = 0
+
+    def front(self, plan):
+        """ 前沿实验的序号，按吞吐量升序 """
+        history = plan.history
+        thr = np.array(history.column("throughput"))
+        ttft = np.array(history.column("ttft_p99"))
+        tpot = np.array(history.column("tpot_p99"))
+        outside = (ttft > self.ttft_max) | (tpot > self.tpot_max)
+        thr[outside] = np.nan
+        idx = np.flatnonzero(pareto_mask(thr, ttft, tpot))
+        return [int(i) for i in idx[np.argsort(thr[idx], kind="stable")]]
+
+    def sample_limits(self, plan):
+        """ 随机的一组 SLO，下界取观测到的最小延迟 """
+        limits = dict(plan.limits)
+        for key, column, upper in (("ttft_p99_limit", "ttft_p99", self.ttft_max),
+                                   ("tpot_p99_limit", "tpot_p99", self.tpot_max)):
+            observed = np.array(plan.history.column(column), dtype=float)
+            # 没有实验或全部实验都没有延迟（NaN）时，下界取默认值
+            observed = observed[~np.isnan(observed)]
+            lower = min(observed.min(), upper) if len(observed) else upper / 10
+            lower = max(lower, upper / 100)
+            limits[key] = float(math.exp(self.rng.uniform(math.log(lower), math.log(upper))))
+        return limits
+
+    def propose(self, plan, k):
+        done = len(plan.history) + len(plan.pending_list) + len(plan.failed_list)
+        budget = self.max_trials - done
+        if budget <= 0:
+            return []
+        k = min(k, budget)
+        if len(plan.history) < 1 + self.n_init:
+            picks = [p for p in self.latin_hypercube(plan, k + self.n_init) if plan.is_new(p)]
+            return picks[:k]
+
+        history = plan.history
+        x, thr, ttft, tpot = self.observations(plan)
+        models = [GaussianProcess().fit(x, thr), GaussianProcess().fit(x, ttft),
+                  GaussianProcess().fit(x, tpot)]
+        pool = [p for p in self.candidates(plan) if plan.is_new(p)]
+        if not pool:
+            return []
+        xs = self.encode(plan, pool)
+        raw_ttft = np.array(history.column("ttft_p99"))
+        raw_tpot = np.array(history.column("tpot_p99"))
+        picks = []
+        while len(picks) < k and pool:
+            limits = self.sample_limits(plan)
+            ok = (raw_ttft <= limits["ttft_p99_limit"]) & (raw_tpot <= limits["tpot_p99_limit"])
+            best = float(thr[ok].max()) if ok.any() else -1
+            acq = self.acquisition(models, xs, best, limits)
+            i = int(np.argmax(acq))
+            picks.append(pool.pop(i))
+            xs = np.delete(xs, i, axis=0)
+        return picks
+
+    def observations(self, plan):
+        # 超出 SLO 范围的延迟按范围的 10 倍截断，与 BayesOptStrategy 按 limitation 截断相同
+        limits = dict(plan.limits, ttft_p99_limit=self.ttft_max, tpot_p99_limit=self.tpot_max)
+        return super().observations(plan, limits)
+
+    def finished(self, plan):
+        n = len(plan.history)
+        if n >= self.max_trials:
+            return True
+        front = self.front(plan)
+        if front != self.last_front:
+            self.last_front = front
+            self.changed_at = n
+        # 还没有 SLO 范围内的实验时继续搜索
+        return bool(front) and n - self.changed_at >= self.patience
+
+    def rows(self, plan):
+        """ 前沿实验的参数（{简称: 值}）和指标 """
+        history = plan.history
+        out = []
+        for i in self.front(plan):
+            row = {"params": plan.space.named(history.get_params(i))}
+            for name in ("throughput", "ttft_p99", "tpot_p99"):
+                row[name] = float(history.column(name)[i])
+            out.append(row)
+        return out
+
+
+def print_front(rows, ttft_limit=None, tpot_limit=None):
+    """ 打印前沿，给出 TTFT/TPOT 限制时标出其下的最优实验 """
+    best = None
+    if ttft_limit is not None or tpot_limit is not None:
+        best = best_under(rows, math.inf if ttft_limit is None else ttft_limit,
+                          math.inf if tpot_limit is None else tpot_limit)
+    names = [trial_name(row["params"]) for row in rows]
+    width = max([len(name) for name in names] + [20]) + 2
+    print(f"  {'params':<{width}}{'req/s':>8}{'P99 TTFT':>10}{'P99 TPOT':>10}")
+    for name, row in zip(names, rows):
+        mark = "  <- best" if row is best else ""
+        print(f"  {name:<{width}}{row['throughput']:>8.2f}{row['ttft_p99']:>10.0f}"
+              f"{row['tpot_p99']:>10.1f}{mark}")
+
+
+def save_front(rows, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(rows, f, indent=1)
+
+
+if __name__ == "__main__":
+    import argparse
+    from results_store import open_store
+    parser = argparse.ArgumentParser(description="结果库中各调优任务的 Pareto 前沿和给定 SLO 下的最优参数")
+    parser.add_argument("output", nargs="?", default="2-A100")
+    parser.add_argument("--model")
+    parser.add_argument("--dataset")
+    parser.add_argument("--ttft", type=float, help="P99 TTFT 限制(ms)")
+    parser.add_argument("--tpot", type=float, help="P99 TPOT 限制(ms)")
+    args = parser.parse_args()
+    groups = {}
+    for row in open_store(args.output + "/results.sqlite").rows(args.model, args.dataset):
+        key = (row["model"], row["dataset"], row["num_prompts"], row["chunked"])
+        groups.setdefault(key, []).append(row)
+    for (model, dataset, num_prompts, chunked), rows in sorted(groups.items()):
+        mask = pareto_mask([r["throughput"] for r in rows], [r["ttft_p99"] for r in rows],
+                           [r["tpot_p99"] for r in rows])
+        front = sorted((r for r, m in zip(rows, mask) if m), key=lambda r: r["throughput"])
+        print(f"{model}/{dataset}/{num_prompts}/{'enable' if chunked else 'disable'}_chunked: "
+              f"{len(front)} of {len(rows)} trials on the front")
+        print_front(front, args.ttft, args.tpot)
@@ -0,0 +1,412 @@
+import contextlib
+import io
+import os
+import statistics
+
+from log_process import parse_log
+from optimizer import OptiPlan
+from param_space import ParamSpace
+from surrogate import make_strategy
+from tracing import load
+
+# 没有历史数据时的估计值，config.yaml 的 planner 可以覆盖
+# launch_cold/launch_warm，模型权重不在/在主机 page cache 中时启动 server 的时间(s)
+# reset，复用 server 时清零 profiling 统计的时间(s)
+# overhead，每个实验除启动和 benchmark 以外的时间(s)（client 准备、save、下载等）
+# restart_rate，同一任务内后续实验需要重启 server（mns/mnbt 改变）的比例
+# benchmark_ratio，benchmark 时长 / (num_prompts / request-rate)
+# trials_per_task，每个调优任务的实验数
+# cached_models，每台主机 page cache 中能同时保留的模型数
+default_costs = {"launch_cold": 300.0, "launch_warm": 90.0, "reset": 3.0, "overhead": 15.0,
+                 "restart_rate": 0.5, "benchmark_ratio": 1.2, "trials_per_task": 12,
+                 "cached_models": 2}
+
+
+# 一个调优任务：模型 x 数据集 x chunked 模式，由 opti_experiment 串行运行若干实验
+# space，该 chunked 模式的 param_space.ParamSpace，默认只有 mns/mnbt/rr
+class Task:
+    def __init__(self, model, dataset, chunked, tp, params, space=None):
+        self.model = model
+        self.dataset = dataset
+        self.chunked = chunked
+        self.tp = tp
+        self.space = space if space is not None else ParamSpace({})
+        self.done = 0            # 结果库中已完成的实验数
+        self.finished = False    # 回放已有结果后优化器已经结束
+        self.next_params = params
+        self.replayed = False    # next_params 是否来自回放，见 serial_mode
+
+    @property
+    def key(self):
+        return (self.model, self.dataset, self.chunked)
+
+    @property
+    def server_key(self):
+        """ 与 run_item 的 server_key 一致，数据集只是 client 参数 """
+        return (self.model, self.chunked) + self.space.server_values(self.next_params)
+
+    def __repr__(self):
+        return f"{self.model}/{self.dataset}/{'enable' if self.chunked else 'disable'}_chunked"
+
+
+def expand(config):
+    """ config 中所有 模型 x 数据集 x chunked 模式 的任务，按 run_sweep 原来的顺序 """
+    tasks = []
+    for model, model_config in config["models"].items():
+        for dataset in config["datasets"]:
+            for chunked in (True, False):
+                space = ParamSpace(config["params"]["enable_chunked_prefill" if chunked
+                                                    else "disable_chunked_prefill"])
+                tasks.append(Task(model, dataset, chunked, model_config["tp"], space.default(),
+                                  space))
+    return tasks
+
+
+def store_lookup(store, num_prompts, output_folder):
+    """ 与 item_test 相同的去重：结果库中已完成的实验，或结果库建立之前留下的 log.txt（只读，不登记） """
+    def lookup(task, params):
+        key = (task.model, task.dataset, num_prompts, task.chunked, task.space.named(params))
+        record = store.get_record(*key)
+        if record is None and store.get(*key) is None:
+            log_path = "/".join([output_folder, task.model, task.dataset, str(num_prompts),
+                                 "enable_chunked" if task.chunked else "disable_chunked",
+                                 task.space.folder_name(params), "log.txt"])
+            if os.path.exists(log_path):
+                record = parse_log(log_path)
+        return record
+    return lookup
+
+
+def serial_mode(config):
+    """
+    调优是否为串行（search.parallel 为 1 且 fidelity 关闭）
+    批量调优（search_parallel）和多保真度调优的实验顺序与串行不同，replay 只能回放串行模式
+    """
+    return (config.get("search") or {}).get("parallel", 1) <= 1 and \
+        not (config.get("fidelity") or {}).get("enabled")
+
+
+def replay(task, lookup, config):
+    """ 按 opti_experiment 的顺序用已有结果回放优化器，得到已完成的实验数和下一个实验，只用于串行模式 """
+    params_config = config["params"]["enable_chunked_prefill" if task.chunked
+                                     else "disable_chunked_prefill"]
+    plan = OptiPlan(task.chunked, params_config, config["limitation"],
+                    make_strategy(config.get("search")))
+    params = plan.space.default()
+    while True:
+        record = lookup(task, params)
+        if record is None:
+            break
+        task.done += 1
+        # 回放时不打印优化器的调参过程
+        with contextlib.redirect_stdout(io.StringIO()):
+            flag, *params = plan.append_experiment(params, record.client_res, record.server_run,
+                                                   record.server_res)
+        if not flag:
+            task.finished = True
+            break
+    task.next_params = params
+    task.replayed = True
+
+
+def median(values, default):
+    return statistics.median(values) if values else default
+
+
+# 根据历史 trace（tracing.py）估计各阶段耗时，没有记录的项使用 config/default_costs
+class CostModel:
+    def __init__(self, cfg=None, spans=None, tasks=None):
+        self.values = dict(default_costs)
+        self.values.update({k: v for k, v in (cfg or {}).items() if k in default_costs})
+        self.source = {k: "config" for k in self.values}
+        self.bench = {}   # 模型 -> benchmark_ratio
+        if spans:
+            self.fit_spans(spans)
+        if tasks:
+            counts = [t.done for t in tasks if t.finished]
+            if counts:
+                self.set("trials_per_task", statistics.mean(counts), "results", len(counts))
+
+    def set(self, key, value, source, n):
+        self.values[key] = value
+        self.source[key] = f"{source}, n={n}"
+
+    def __getitem__(self, key):
+        return self.values[key]
+
+    def fit_spans(self, spans):
+        by_id = {(s["pid"], s["id"]): s for s in spans}
+        children = {}
+        for s in spans:
+            if s["parent"] is not None:
+                children.setdefault((s["pid"], s["parent"]), []).append(s)
+
+        def descendants(s, name):
+            out = []
+            for c in children.get((s["pid"], s["id"]), []):
+                if c["name"] == name:
+                    out.append(c)
+                out.extend(descendants(c, name))
+            return out
+
+        def trial_of(s):
+            while s is not None and s["name"] != "trial":
+                s = by_id.get((s["pid"], s["parent"])) if s["parent"] is not None else None
+            return s
+
+        # 同一主机上一次启动的是同一个模型时，权重仍在 page cache 中
+        launches = sorted((s for s in spans if s["name"] == "server.launch"),
+                          key=lambda s: s["ts"])
+        last_model = {}
+        cold, warm = [], []
+        for s in launches:
+            trial = trial_of(s)
+            if trial is None or s["status"] != "ok":
+                continue
+            host = trial["attrs"].get("slot", "").rsplit("/", 1)[0]
+            model = trial["attrs"].get("model")
+            (warm if last_model.get(host) == model else cold).append(s["dur"])
+            last_model[host] = model
+        if cold:
+            self.set("launch_cold", median(cold, 0), "trace", len(cold))
+        if warm:
+            self.set("launch_warm", median(warm, 0), "trace", len(warm))
+        resets = [s["dur"] for s in spans if s["name"] == "server.reset"]
+        if resets:
+            self.set("reset", median(resets, 0), "trace", len(resets))
+
+        overhead, ratios, restarts = [], {}, []
+        seen_tasks = set()
+        trials = sorted((s for s in spans if s["name"] == "trial" and s["status"] == "ok"),
+                        key=lambda s: s["ts"])
+        for trial in trials:
+            attrs = trial["attrs"]
+            launch = sum(s["dur"] for s in descendants(trial, "server.launch"))
+            reset = sum(s["dur"] for s in descendants(trial, "server.reset"))
+            benches = descendants(trial, "benchmark")
+            bench = sum(s["dur"] for s in benches)
+            overhead.append(max(trial["dur"] - launch - reset - bench, 0.0))
+            for s in benches:
+                rr = s["attrs"].get("rr")
+                if rr and attrs.get("num_prompts") and not s["attrs"].get("aborted"):
+                    ratios.setdefault(attrs.get("model"), []).append(
+                        s["dur"] / (attrs["num_prompts"] / float(rr)))
+            # 任务内第一个实验之后的实验是否重启了 server
+            task = (attrs.get("model"), attrs.get("dataset"), attrs.get("num_prompts"),
+                    str(attrs.get("trial", "")).split("/")[0])
+            if task in seen_tasks:
+                acquires = descendants(trial, "server.acquire")
+                if acquires:
+                    restarts.append(0.0 if acquires[0]["attrs"].get("reused") else 1.0)
+            seen_tasks.add(task)
+        if overhead:
+            self.set("overhead", median(overhead, 0), "trace", len(overhead))
+        if restarts:
+            self.set("restart_rate", statistics.mean(restarts), "trace", len(restarts))
+        if ratios:
+            all_ratios = [r for rs in ratios.values() for r in rs]
+            self.set("benchmark_ratio", median(all_ratios, 0), "trace", len(all_ratios))
+            self.bench = {model: median(rs, 0) for model, rs in ratios.items()}
+
+    def benchmark(self, task, num_prompts):
+        """ 一个实验的 benchmark 时间，request-rate 取任务下一个实验的值 """
+        ratio = self.bench.get(task.model, self.values["benchmark_ratio"])
+        return ratio * num_prompts / float(task.next_params[2])
+
+    def remaining_trials(self, task):
+        if task.finished:
+            return 0
+        return max(self.values["trials_per_task"] - task.done, 1)
+
+    def task_seconds(self, task, num_prompts, start):
+        """ 任务剩余部分的时间；start 为第一个实验的 server 准备方式：reset/warm/cold """
+        n = self.remaining_trials(task)
+        if n == 0:
+            return 0.0
+        first = {"reset": self.values["reset"], "warm": self.values["launch_warm"],
+                 "cold": self.values["launch_cold"]}[start]
+        restarts = self.values["restart_rate"] * (n - 1)
+        return first + restarts * self.values["launch_warm"] + \
+            (n - 1 - restarts) * self.values["reset"] + \
+            n * (self.benchmark(task, num_prompts) + self.values["overhead"])
+
+
+class Placement:
+    def __init__(self, task, host, gpus, start, end, kind):
+        self.task = task
+        self.host = host
+        self.gpus = gpus
+        self.start = start
+        self.end = end
+        self.kind = kind
+
+
+def simulate(tasks, hosts, costs, num_prompts, affinity=False, reuse_server=True):
+    """
+    按 ExperimentScheduler 的方式模拟执行：tp 大的任务先取号，按号分配最早空出的 tp 张卡
+    每台主机的 page cache 保留最近启动的 cached_models 个模型
+    affinity，同一模型的任务优先回到上次使用的槽位（与 SlotPool.allocate 的 prefer 对应）
+    返回 (预计总时长, [Placement])
+    """
+    queue = sorted(tasks, key=lambda t: -t.tp)
+    free_at = [{g: 0.0 for g in host["gpus"]} for host in hosts]
+    cache = [[] for _ in hosts]
+    resident = {}     # (host, gpus) -> server_key
+    last_slot = {}    # model -> (host, gpus)
+    prev_start = 0.0
+    placements = []
+    for task in queue:
+        if costs.remaining_trials(task) == 0:
+            placements.append(Placement(task, None, (), prev_start, prev_start, "done"))
+            continue
+        options = []
+        for h, free in enumerate(free_at):
+            if len(free) < task.tp:
+                continue
+            gpus = tuple(sorted(sorted(free, key=lambda g: (free[g], g))[:task.tp]))
+            start = max(prev_start, max(free[g] for g in gpus))
+            # 与 SlotPool.try_allocate 相同，同时可用时选空闲卡最少的主机
+            options.append((start, sum(t <= start for t in free.values()), h, gpus))
+        start, _, h, gpus = min(options)
+        preferred = last_slot.get(task.model) if affinity else None
+        if preferred is not None:
+            ph, pgpus = preferred
+            pstart = max(prev_start, max(free_at[ph][g] for g in pgpus))
+            if pstart <= start:
+                start, h, gpus = pstart, ph, pgpus
+        if reuse_server and resident.get((h, gpus)) == task.server_key:
+            kind = "reset"
+        elif task.model in cache[h]:
+            kind = "warm"
+        else:
+            kind = "cold"
+        end = start + costs.task_seconds(task, num_prompts, kind)
+        placements.append(Placement(task, h, gpus, start, end, kind))
+        for g in gpus:
+            free_at[h][g] = end
+        if task.model in cache[h]:
+            cache[h].remove(task.model)
+        cache[h].append(task.model)
+        del cache[h][:-int(costs["cached_models"]) or None]
+        # 与该槽位重叠的其他槽位上的 server 已被停止；任务结束时的 server 参数无法预知
+        for key in [k for k in resident if k[0] == h and set(k[1]) & set(gpus)]:
+            del resident[key]
+        resident[(h, gpus)] = task.server_key if costs.remaining_trials(task) == 1 else None
+        last_slot[task.model] = (h, gpus)
+        prev_start = start
+    makespan = max((p.end for p in placements), default=0.0)
+    return makespan, placements
+
+
+def group_by_model(tasks, key=None):
+    """
+    同一模型的任务排在一起（权重留在 page cache 中，server 参数相同的任务相邻），
+    模型组按 key 排序（默认保持原顺序），已完成的任务放在最前
+    """
+    groups = {}
+    for task in tasks:
+        groups.setdefault(task.model, []).append(task)
+    for group in groups.values():
+        group.sort(key=lambda t: (not t.chunked, str(t.server_key[2:]), t.dataset))
+    ordered = sorted(groups.values(), key=key) if key is not None else list(groups.values())
+    planned = [t for group in ordered for t in group]
+    return [t for t in planned if t.finished] + [t for t in planned if not t.finished]
+
+
+def candidates(tasks, costs, num_prompts):
+    """ 候选的 (名称, 顺序, 槽位亲和)，由 SweepPlan 模拟后取总时长最短的 """
+    def group_seconds(group):
+        return sum(costs.task_seconds(t, num_prompts, "warm") for t in group)
+
+    by_model = {}
+    for task in tasks:
+        by_model.setdefault(task.model, []).append(task)
+    return [("original", tasks, False),
+            ("original + affinity", tasks, True),
+            ("by model + affinity", group_by_model(tasks), True),
+            # 同 tp 的模型组剩余耗时长的先开始，缩短最后的长尾
+            ("by model, longest first + affinity",
+             group_by_model(tasks, lambda g: -group_seconds(by_model[g[0].model])), True)]
+
+
+# 一次 sweep 的规划：展开任务、用结果库去重、估计耗时并选择模拟总时长最短的顺序
+class SweepPlan:
+    def __init__(self, config, store, num_prompts, hosts, output_folder, reuse_server=True):
+        self.config = config
+        self.num_prompts = num_prompts
+        self.hosts = hosts
+        self.reuse_server = reuse_server
+        self.naive = expand(config)
+        lookup = store_lookup(store, num_prompts, output_folder)
+        self.serial = serial_mode(config)
+        for task in self.naive:
+            if self.serial:
+                replay(task, lookup, config)
+            else:
+                # 无法回放：只统计结果库中已完成的实验数，任务都按未完成规划，下一个实验未知
+                task.done = len(store.trials(task.model, task.dataset, num_prompts, task.chunked))
+        trace_path = os.path.join(output_folder, "trace.jsonl")
+        spans = load(trace_path) if os.path.exists(trace_path) else None
+        self.costs = CostModel(config.get("planner"), spans, self.naive)
+        self.naive_time, self.naive_placements = simulate(
+            self.naive, hosts, self.costs, num_prompts, False, reuse_server)
+        best = None
+        for name, tasks, affinity in candidates(self.naive, self.costs, num_prompts):
+            total, placements = simulate(tasks, hosts, self.costs, num_prompts, affinity,
+                                         reuse_server)
+            cold = [p.kind for p in placements].count("cold")
+            if best is None or (total, cold) < best[0]:
+                best = ((total, cold), name, tasks, affinity, placements)
+        (self.planned_time, _), self.strategy, self.tasks, self.affinity, self.placements = best
+
+    def print(self):
+        finished = sum(t.finished for t in self.tasks)
+        partial = sum(t.done > 0 and not t.finished for t in self.tasks)
+        slots = sum(len(h["gpus"]) for h in self.hosts)
+        print(f"{len(self.tasks)} tuning tasks ({finished} finished, {partial} partially done), "
+              f"{slots} GPUs on {len(self.hosts)} host(s), num_prompts={self.num_prompts}")
+        if not self.serial:
+            print("warning: planner only replays serial tuning; with search.parallel > 1 or "
+                  "fidelity.enabled no task is skipped, next params are unknown and the "
+                  "time estimates are rough")
+        print(f"{'#':>3}  {'task':<44}{'tp':>3}{'done':>6}  {'next params':<18}{'slot':<14}"
+              f"{'load':<6}{'start':>9}{'est.':>9}")
+        for i, p in enumerate(sorted(self.placements, key=lambda p: (p.start, p.end))):
+            t = p.task
+            slot = "-" if p.host is None else f"h{p.host}/gpu" + "_".join(str(g) for g in p.gpus)
+            params = "-" if t.finished else \
+                t.space.folder_name(t.next_params) if t.replayed else "?"
+            print(f"{i:>3}  {str(t)[:43]:<44}{t.tp:>3}{t.done:>6}  {params:<18}{slot:<14}"
+                  f"{p.kind:<6}{hours(p.start):>9}{hours(p.end - p.start):>9}")
+        for name, placements, total in (("naive order", self.naive_placements, self.naive_time),
+                                        ("planned order", self.placements, self.planned_time)):
+            kinds = [p.kind for p in placements]
+            print(f"{name:<14} makespan {hours(total):>8}   cold loads {kinds.count('cold')}, "
+                  f"warm loads {kinds.count('warm')}, reused {kinds.count('reset')}")
+        saved = self.naive_time - self.planned_time
+        print(f"order strategy: {self.strategy}")
+        print(f"predicted saving {hours(saved)} "
+              f"({saved / self.naive_time if self.naive_time else 0:.0%})")
+        print("cost model: " + ", ".join(f"{k}={v:.4g} ({self.costs.source[k]})"
+                                         for k, v in self.costs.values.items()))
+
+
+def hours(seconds):
+    if seconds >= 3600:
+        return f"{seconds / 3600:.1f}h"
+    if seconds >= 60:
+        return f"{seconds / 60:.1f}m"
+    return f"{seconds:.0f}s"
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="规划 sweep：去重、估计耗时、按模型分组排序")
+    parser.add_argument("--output", default="2-A100", help="输出目录（结果库和 trace 所在）")
+    parser.add_argument("--dry-run", action="store_true", help="只打印计划，不运行")
+    args = parser.parse_args()
+    import main
+    if args.dry_run:
+        main.plan_sweep(args.output).print()
+    else:
+        main.run_sweep(args.output)
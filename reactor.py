@@ -0,0 +1,202 @@
+import os
+import selectors
+import threading
+import time
+
+from io_stats import ChannelStats
+
+# 自适应读取大小：读满时翻倍，连续几次读到不足 1/4 时减半
+min_read_size = 4096
+max_read_size = 1 << 20
+# 单个 channel 每轮最多读取的字节数，读完后轮到其他 channel，避免一个刷屏的 server 饿死其他会话
+quantum = 4 << 20
+
+
+class Registration:
+    def __init__(self, channel, sink, stats, read_size, max_duration, on_close):
+        self.channel = channel
+        # channel.close() 会关闭 pipe，注销时使用注册时的 fd
+        self.fd = channel.fileno()
+        self.sink = sink
+        self.stats = stats
+        self.read_size = max(min_read_size, min(read_size, max_read_size))
+        self.small_reads = 0
+        self.deadline = time.time() + max_duration if max_duration else None
+        self.on_close = on_close
+        self.removed = threading.Event()
+        self.error = None
+
+
+# 所有 SSHManager 共用的读取线程
+# paramiko channel 的 fileno() 是一个内部 pipe，缓冲区有数据或 channel 关闭时可读，
+# 用 selectors（Linux 上为 epoll）同时等待所有注册的 channel，没有数据时线程阻塞，不占 CPU
+# 缓冲区的数据读走后 paramiko 才会向远端补充 SSH 窗口，所以读取永远不等待 sink 以外的任何东西；
+# sink 在本线程中调用，应当只做内存操作（ChannelLog、LiveMonitor、丢弃）
+class Reactor:
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.lock = threading.Lock()
+        self.pending = []   # (操作, Registration)，由本线程在下一轮处理
+        self.wake_r, self.wake_w = os.pipe()
+        os.set_blocking(self.wake_r, False)
+        os.set_blocking(self.wake_w, False)
+        self.selector.register(self.wake_r, selectors.EVENT_READ, None)
+        self.registrations = set()
+        self.thread = threading.Thread(target=self.run, name="SSHReactor", daemon=True)
+        self.thread.start()
+
+    # channel，paramiko channel
+    # sink(data)，接收读到的字节，为 None 时丢弃
+    # stats，io_stats.ChannelStats
+    # read_size，初始单次读取大小
+    # max_duration，最长读取时间(s)，到时自动注销
+    # on_close(registration)，channel 关闭、超时或 sink 出错被注销时调用
+    def register(self, channel, sink=None, stats=None, read_size=min_read_size,
+                 max_duration=None, on_close=None):
+        reg = Registration(channel, sink, stats if stats is not None else ChannelStats(""),
+                           read_size, max_duration, on_close)
+        self.submit("add", reg)
+        return reg
+
+    def unregister(self, reg, wait=True):
+        """ 注销后 sink 不会再被调用；wait 时等待读取线程确认 """
+        if reg.removed.is_set():
+            return
+        self.submit("remove", reg)
+        if wait and threading.current_thread() is not self.thread:
+            reg.removed.wait()
+
+    def submit(self, op, reg):
+        with self.lock:
+            self.pending.append((op, reg))
+        try:
+            os.write(self.wake_w, b'x')
+        except BlockingIOError:
+            # 唤醒 pipe 已满，读取线程一定会醒来
+            pass
+
+    def apply_pending(self):
+        with self.lock:
+            pending, self.pending = self.pending, []
+        for op, reg in pending:
+            if op == "add" and not reg.removed.is_set():
+                stale = self.selector.get_map().get(reg.fd)
+                if stale is not None:
+                    # 已关闭 channel 的 fd 被新的 pipe 复用
+                    self.remove(stale.data)
+                try:
+                    self.selector.register(reg.fd, selectors.EVENT_READ, reg)
+                except (OSError, ValueError, KeyError) as e:
+                    # 注册生效前 channel 已关闭（fd 无效），按关闭处理，不影响读取线程
+                    print("reactor register error:", e)
+                    reg.error = e
+                    self.remove(reg)
+                    continue
+                self.registrations.add(reg)
+            elif op == "remove":
+                self.remove(reg, notify=False)
+
+    def remove(self, reg, notify=True):
+        if reg in self.registrations:
+            self.registrations.discard(reg)
+            try:
+                self.selector.unregister(reg.fd)
+            except (KeyError, OSError, ValueError):
+                pass
+        reg.removed.set()
+        if notify and reg.on_close is not None:
+            try:
+                reg.on_close(reg)
+            except Exception as e:
+                print("reactor on_close error:", e)
+
+    def run(self):
+        while True:
+            now = time.time()
+            deadlines = [reg.deadline for reg in self.registrations if reg.deadline]
+            timeout = max(min(deadlines) - now, 0) if deadlines else None
+            t0 = time.perf_counter()
+            events = self.selector.select(timeout)
+            woke = time.perf_counter()
+            for key, _ in events:
+                reg = key.data
+                if reg is None:
+                    try:
+                        while os.read(self.wake_r, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                reg.stats.on_wait(woke - t0)
+                if reg.removed.is_set() or reg not in self.registrations:
+                    continue
+                try:
+                    self.service(reg, woke)
+                except Exception as e:
+                    # 如 channel.recv 出错：注销这个 channel，读取线程继续服务其他 channel
+                    print("reactor service error:", e)
+                    reg.error = e
+                    self.remove(reg)
+            self.apply_pending()
+            now = time.time()
+            for reg in [r for r in self.registrations if r.deadline and now >= r.deadline]:
+                print("reactor: channel reached maximum duration")
+                self.remove(reg)
+
+    def service(self, reg, woke):
+        """ 读取一个 channel 直到缓冲区为空或读满 quantum """
+        channel, stats = reg.channel, reg.stats
+        total = 0
+        last = woke
+        # stderr 与 stdout 共用同一个 pipe，不读走会一直可读，一并交给 sink
+        while total < quantum:
+            if channel.recv_ready():
+                recv = channel.recv
+            elif channel.recv_stderr_ready():
+                recv = channel.recv_stderr
+            else:
+                break
+            t0 = time.perf_counter()
+            # 距 select 返回或上一次开始读取的时间，包含上一块数据的 sink 处理
+            stats.on_drain(t0 - last, len(channel.in_buffer), channel.in_window_size)
+            data = recv(reg.read_size)
+            t1 = time.perf_counter()
+            stats.on_recv(len(data), t1 - t0, reg.read_size)
+            total += len(data)
+            self.adapt(reg, len(data))
+            if reg.sink is not None and data:
+                try:
+                    reg.sink(data)
+                except Exception as e:
+                    # sink 出错时停止读取这个 channel，不影响其他 channel
+                    print("reactor sink error:", e)
+                    reg.error = e
+                    self.remove(reg)
+                    return
+                stats.sink_time += time.perf_counter() - t1
+            last = t0
+        if total == 0 and (channel.closed or channel.eof_received):
+            self.remove(reg)
+
+    def adapt(self, reg, size):
+        if size >= reg.read_size:
+            reg.read_size = min(reg.read_size * 2, max_read_size)
+            reg.small_reads = 0
+        elif size < reg.read_size // 4:
+            reg.small_reads += 1
+            if reg.small_reads >= 4:
+                reg.read_size = max(reg.read_size // 2, min_read_size)
+                reg.small_reads = 0
+
+
+shared = None
+shared_lock = threading.Lock()
+
+
+def get_reactor():
+    """ 进程内共用的 Reactor，首次使用时启动 """
+    global shared
+    with shared_lock:
+        if shared is None:
+            shared = Reactor()
+        return shared
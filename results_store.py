@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from log_process import LogRecord, parse_log
+from param_space import core_shorts, trial_name
+
+# 每个实验一行，trial_key 与实验目录名一致：<chunked>/<mns>_<mnbt>_<rr>[_<short>=<值>...]
+# params 为全部参数的 JSON {简称: 值}，mns/mnbt/rr 列便于直接查询
+# early_abort 为 1 的实验被提前终止，吞吐量和延迟是预测值而不是测量值
+schema = """
+CREATE TABLE IF NOT EXISTS trials (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    model TEXT NOT NULL,
+    dataset TEXT NOT NULL,
+    num_prompts INTEGER NOT NULL,
+    chunked INTEGER NOT NULL,
+    trial_key TEXT NOT NULL,
+    mns REAL,
+    mnbt REAL,
+    rr REAL,
+    params TEXT,
+    status TEXT NOT NULL,
+    log_path TEXT,
+    started REAL,
+    finished REAL,
+    duration REAL,
+    throughput REAL,
+    ttft_p99 REAL,
+    tpot_p99 REAL,
+    early_abort INTEGER,
+    record TEXT,
+    UNIQUE (model, dataset, num_prompts, trial_key)
+);
+CREATE INDEX IF NOT EXISTS trials_search ON trials (model, dataset, num_prompts, chunked, status);
+CREATE INDEX IF NOT EXISTS trials_best ON trials (model, dataset, status, throughput);
+"""
+
+
+def trial_key(chunked_prefill, params):
+    chunked_str = "enable_chunked" if chunked_prefill else "disable_chunked"
+    return chunked_str + "/" + trial_name(params)
+
+
+def named_params(params):
+    """ {简称: 值}，params 为 ParamSpace.named 的结果或旧的 [mns, mnbt, rr] """
+    return dict(params) if isinstance(params, dict) else dict(zip(core_shorts, params))
+
+
+def row_params(row):
+    """ 结果库一行的 {简称: 值}，params 列为空（之前的版本写入）时取 mns/mnbt/rr 列 """
+    if row["params"]:
+        return json.loads(row["params"])
+    return {short: None if row[short] is None else
+            (int(row[short]) if float(row[short]).is_integer() else row[short])
+            for short in core_shorts}
+
+
+# 实验结果库（SQLite），记录每个实验的参数、解析后的 client/server 指标、耗时和状态
+# status：running 已启动未完成，done 已完成，failed 失败
+# 同一进程中的多个线程共用一个连接，写操作加锁；WAL 模式下其他进程可以同时查询
+class ResultStore:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(schema)
+            # 之前版本建立的库没有 params 列
+            columns = {row[1] for row in self.conn.execute("PRAGMA table_info(trials)")}
+            if "params" not in columns:
+                self.conn.execute("ALTER TABLE trials ADD COLUMN params TEXT")
+            # 没有 early_abort 列时按 record 中的 Early abort 补齐
+            if "early_abort" not in columns:
+                self.conn.execute("ALTER TABLE trials ADD COLUMN early_abort INTEGER")
+                for row in self.conn.execute(
+                        "SELECT id, record FROM trials WHERE record IS NOT NULL").fetchall():
+                    aborted = json.loads(row["record"])["client_res"].get("Early abort")
+                    self.conn.execute("UPDATE trials SET early_abort=? WHERE id=?",
+                                      (int(bool(aborted)), row["id"]))
+
+    def get(self, model, dataset, num_prompts, chunked_prefill, params):
+        """ 查询一个实验，不存在返回 None """
+        with self.lock:
+            return self.conn.execute(
+                "SELECT * FROM trials WHERE model=? AND dataset=? AND num_prompts=? AND trial_key=?",
+                (model, dataset, num_prompts, trial_key(chunked_prefill, params))).fetchone()
+
+    def get_record(self, model, dataset, num_prompts, chunked_prefill, params):
+        """ 已完成实验的 LogRecord，未完成返回 None """
+        row = self.get(model, dataset, num_prompts, chunked_prefill, params)
+        if row is None or row["status"] != "done":
+            return None
+        return LogRecord.from_dict(json.loads(row["record"]))
+
+    def upsert(self, model, dataset, num_prompts, chunked_prefill, params, **fields):
+        named = named_params(params)
+        fields.update(model=model, dataset=dataset, num_prompts=num_prompts,
+                      chunked=int(bool(chunked_prefill)),
+                      trial_key=trial_key(chunked_prefill, params), mns=named.get("mns"),
+                      mnbt=named.get("mnbt"), rr=named.get("rr"), params=json.dumps(named))
+        names = list(fields)
+        update = ", ".join(f"{name}=excluded.{name}" for name in names)
+        with self.lock, self.conn:
+            self.conn.execute(
+                f"INSERT INTO trials ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+                f"ON CONFLICT (model, dataset, num_prompts, trial_key) DO UPDATE SET {update}",
+                [fields[name] for name in names])
+
+    def start(self, model, dataset, num_prompts, chunked_prefill, params):
+        self.upsert(model, dataset, num_prompts, chunked_prefill, params,
+                    status="running", started=time.time())
+
+    def finish(self, model, dataset, num_prompts, chunked_prefill, params, log_path, record,
+               duration=None):
+        client_res = record.client_res
+        self.upsert(model, dataset, num_prompts, chunked_prefill, params,
+                    status="done", log_path=log_path, finished=time.time(), duration=duration,
+                    throughput=client_res.get("Request throughput (req/s)"),
+                    ttft_p99=client_res.get("P99 TTFT (ms)"),
+                    tpot_p99=client_res.get("P99 TPOT (ms)"),
+                    early_abort=int(bool(client_res.get("Early abort"))),
+                    record=json.dumps(record.to_dict()))
+
+    def fail(self, model, dataset, num_prompts, chunked_prefill, params):
+        self.upsert(model, dataset, num_prompts, chunked_prefill, params,
+                    status="failed", finished=time.time())
+
+    def trials(self, model, dataset, num_prompts, chunked_prefill):
+        """ 已完成的实验，按完成顺序返回 [({简称: 值}, LogRecord)]，用于热启动 OptiPlan """
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT mns, mnbt, rr, params, record FROM trials WHERE model=? AND dataset=? "
+                "AND num_prompts=? AND chunked=? AND status='done' ORDER BY finished, id",
+                (model, dataset, num_prompts, int(bool(chunked_prefill)))).fetchall()
+        return [(row_params(row), LogRecord.from_dict(json.loads(row["record"])))
+                for row in rows]
+
+    def rows(self, model=None, dataset=None):
+        """ 已完成实验的参数（params 为 {简称: 值}）和主要指标，不含完整的 record """
+        sql = "SELECT model, dataset, num_prompts, chunked, mns, mnbt, rr, params, throughput, " \
+              "ttft_p99, tpot_p99, log_path FROM trials WHERE status='done'"
+        args = []
+        if model is not None:
+            sql += " AND model=?"
+            args.append(model)
+        if dataset is not None:
+            sql += " AND dataset=?"
+            args.append(dataset)
+        with self.lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        return [dict(row, params=row_params(row)) for row in rows]
+
+    def best(self, limits, model=None, dataset=None):
+        """ 每个 模型/数据集/chunked 模式 下满足 TTFT/TPOT 限制的最大吞吐量实验，不含提前终止的实验 """
+        sql = "SELECT model, dataset, num_prompts, chunked, mns, mnbt, rr, params, " \
+              "MAX(throughput) AS throughput, ttft_p99, tpot_p99, log_path FROM trials " \
+              "WHERE status='done' AND NOT COALESCE(early_abort, 0) " \
+              "AND ttft_p99 <= ? AND tpot_p99 <= ?"
+        args = [limits["ttft_p99_limit"], limits["tpot_p99_limit"]]
+        if model is not None:
+            sql += " AND model=?"
+            args.append(model)
+        if dataset is not None:
+            sql += " AND dataset=?"
+            args.append(dataset)
+        sql += " GROUP BY model, dataset, num_prompts, chunked ORDER BY model, dataset, chunked"
+        with self.lock:
+            rows = self.conn.execute(sql, args).fetchall()
+        return [dict(row, params=row_params(row)) for row in rows]
+
+    def import_log(self, model, dataset, num_prompts, chunked_prefill, params, log_path):
+        """ 把已有的 log.txt（结果库建立之前的实验）登记为已完成 """
+        record = parse_log(log_path)
+        self.finish(model, dataset, num_prompts, chunked_prefill, params, log_path, record)
+        return record
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+stores = {}
+stores_lock = threading.Lock()
+
+
+def open_store(path):
+    """ 同一路径的结果库在进程内共用一个实例 """
+    path = os.path.abspath(path)
+    with stores_lock:
+        if path not in stores:
+            stores[path] = ResultStore(path)
+        return stores[path]
+
+
+if __name__ == "__main__":
+    import sys
+    import yaml
+    with open("config.yaml") as f:
+        limits = yaml.safe_load(f)["limitation"]
+    store = open_store(sys.argv[1] if len(sys.argv) > 1 else "2-A100/results.sqlite")
+    for row in store.best(limits):
+        print(row)
@@ -0,0 +1,159 @@
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+# GPU 槽位：一台主机上分配给一个实验的若干张卡
+# 每个槽位独占 app_port 和远端工作目录，互不干扰
+class Slot:
+    def __init__(self, host, gpus, app_port, work_dir):
+        self.host = host          # ssh 设置，dict: ip/port/username/password/prompt
+        self.gpus = gpus          # GPU 编号列表
+        self.app_port = app_port
+        self.work_dir = work_dir
+
+    @property
+    def name(self):
+        return f"{self.host['ip']}:{self.host['port']}/gpu" + "_".join(str(g) for g in self.gpus)
+
+    def __repr__(self):
+        return f"Slot({self.name}, port={self.app_port})"
+
+
+# 主机与 GPU 资源池
+# hosts，主机列表，每项包含 ssh 设置和 gpus；缺省字段沿用 default_host
+class SlotPool:
+    def __init__(self, hosts, default_host, base_port, work_dir):
+        self.hosts = []
+        for host in hosts:
+            merged = dict(default_host)
+            merged.update(host)
+            merged["gpus"] = list(merged["gpus"])
+            self.hosts.append(merged)
+        self.base_port = base_port
+        self.work_dir = work_dir
+        self.cond = threading.Condition()
+        self.free = {i: list(host["gpus"]) for i, host in enumerate(self.hosts)}
+        # 按取号顺序分配，大任务不会被后来的小任务饿死
+        self.tickets = 0
+        self.serving = 0
+
+    def max_tp(self):
+        return max(len(host["gpus"]) for host in self.hosts)
+
+    def host_index(self, slot):
+        for i, host in enumerate(self.hosts):
+            if host["ip"] == slot.host["ip"] and host["port"] == slot.host["port"]:
+                return i
+        return None
+
+    # prefer，上一次使用的 Slot，其卡都空闲时原样分配（同一模型的权重还在该主机的 page cache 中）
+    def try_allocate(self, tp, prefer=None):
+        if prefer is not None and len(prefer.gpus) == tp:
+            idx = self.host_index(prefer)
+            if idx is not None and all(g in self.free[idx] for g in prefer.gpus):
+                self.free[idx] = [g for g in self.free[idx] if g not in prefer.gpus]
+                return self.make_slot(idx, list(prefer.gpus))
+        # 优先选空闲卡最少但够用的主机，减少碎片
+        candidates = [(len(free), i) for i, free in self.free.items() if len(free) >= tp]
+        if not candidates:
+            return None
+        _, idx = min(candidates)
+        free = sorted(self.free[idx])
+        self.free[idx] = free[tp:]
+        return self.make_slot(idx, free[:tp])
+
+    def make_slot(self, idx, gpus):
+        host = self.hosts[idx]
+        # 端口、工作目录按槽位的首张卡区分
+        app_port = self.base_port + gpus[0]
+        work_dir = self.work_dir + "/gpu" + "_".join(str(g) for g in gpus)
+        ssh = {k: v for k, v in host.items() if k != "gpus"}
+        return Slot(ssh, gpus, app_port, work_dir)
+
+    def ticket(self):
+        with self.cond:
+            self.tickets += 1
+            return self.tickets - 1
+
+    def allocate(self, tp, ticket=None, prefer=None):
+        """ 阻塞直到轮到该号且有 tp 张空闲卡 """
+        if ticket is None:
+            ticket = self.ticket()
+        with self.cond:
+            while True:
+                if ticket == self.serving:
+                    slot = self.try_allocate(tp, prefer)
+                    if slot is not None:
+                        self.serving += 1
+                        self.cond.notify_all()
+                        return slot
+                self.cond.wait()
+
+    def release(self, slot):
+        with self.cond:
+            idx = self.host_index(slot)
+            if idx is not None:
+                self.free[idx].extend(slot.gpus)
+            self.cond.notify_all()
+
+
+# 实验调度器：任务按 tp 从大到小排队，拿到槽位后并发执行
+# run_fn(task, slot)，在工作线程中执行一个任务
+class ExperimentScheduler:
+    def __init__(self, slot_pool, run_fn):
+        self.slot_pool = slot_pool
+        self.run_fn = run_fn
+        self.tasks = []
+        self.results = {}
+        self.lock = threading.Lock()
+        self.last_slot = {}   # group -> 该组上一个任务使用的 Slot
+
+    # task，可哈希的任务描述，如 (model, dataset, chunked_prefill)
+    # tp，任务需要的 GPU 数
+    # group，同组任务（如同一模型）优先分配到该组上次使用的槽位
+    def submit(self, task, tp, group=None):
+        if tp > self.slot_pool.max_tp():
+            raise ValueError(f"{task}: no host has {tp} GPUs")
+        self.tasks.append((task, tp, group))
+
+    def run_one(self, task, tp, group, order, ticket):
+        with self.lock:
+            prefer = self.last_slot.get(group) if group is not None else None
+        slot = self.slot_pool.allocate(tp, ticket, prefer)
+        if group is not None:
+            with self.lock:
+                self.last_slot[group] = slot
+        start = time.time()
+        print(f"[scheduler] start {task} on {slot}")
+        try:
+            result = self.run_fn(task, slot)
+            status = "ok"
+        except Exception:
+            traceback.print_exc()
+            result = None
+            status = "failed"
+        finally:
+            self.slot_pool.release(slot)
+        elapsed = time.time() - start
+        print(f"[scheduler] {status} {task} on {slot} in {elapsed:.1f}s")
+        with self.lock:
+            self.results[task] = {"status": status, "result": result, "slot": slot.name,
+                                  "start": start, "seconds": elapsed, "order": order}
+
+    def run(self):
+        """ 执行所有任务，返回 {task: 结果信息} """
+        # 大 tp 的任务先占位，小任务填补剩余的卡
+        queue = sorted(self.tasks, key=lambda x: -x[1])
+        # 工作线程数不超过可同时运行的任务数上限（每卡一个）
+        workers = max(1, min(len(queue), sum(len(h["gpus"]) for h in self.slot_pool.hosts)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # 提交时按队列顺序取号，槽位按号分配
+            futures = []
+            for order, (task, tp, group) in enumerate(queue):
+                futures.append(executor.submit(self.run_one, task, tp, group, order,
+                                               self.slot_pool.ticket()))
+            for future in futures:
+                future.result()
+        return self.results
@@ -0,0 +1,148 @@
+import threading
+
+from tracing import span
+
+
+# 一个 GPU 槽位上常驻的 vLLM server
+# 启动参数 key（模型、chunked 模式、max_num_seqs、max_num_batched_tokens）不变时，多次实验复用
+# 同一个 server；request-rate 只是 client 参数，改变时不需要重启
+# server 存活期间 drain 线程一直读取输出，当前实验的 ChannelLog 等通过 attach/detach 挂上，
+# 实验之间的输出直接丢弃
+class VllmServer:
+    # slot，所在的 GPU 槽位
+    # make_ssh()，新建 server shell 的函数，返回 SSHManager
+    # setup(ssh)，新 shell 上的前处理（工作目录、可见 GPU、pre_cmds）
+    # stop_cmds，停止 server 时依次发送的命令（如 '\x03'）
+    # ready，server 启动完成的标志
+    def __init__(self, slot, make_ssh, setup=None, stop_cmds=None, ready="Uvicorn running on"):
+        self.slot = slot
+        self.make_ssh = make_ssh
+        self.setup = setup
+        self.stop_cmds = stop_cmds or []
+        self.ready = ready
+        self.lock = threading.Lock()
+        self.sink_lock = threading.Lock()
+        self.ssh = None
+        self.key = None
+        self.thread_name = None
+        self.sinks = ()
+        self.prompt = b''
+        self.tail = b''
+        self.launches = 0
+        self.reuses = 0
+
+    def feed(self, data):
+        # 只保留最后 len(prompt) 个字节，用于判断 server 进程是否已经退出回到 shell
+        if self.prompt:
+            self.tail = (self.tail + data)[-len(self.prompt):]
+        with self.sink_lock:
+            for sink in self.sinks:
+                sink(data)
+
+    def alive(self):
+        """ shell 连接正常，且最近的输出不是 shell 提示符（server 进程已退出） """
+        if self.ssh is None or self.ssh.channel is None or self.ssh.channel.closed:
+            return False
+        return not (self.prompt and self.tail.endswith(self.prompt))
+
+    def acquire(self, key, cmd, reuse=True):
+        """ 保证以 key 启动的 server 正在运行，返回是否复用了已有的 server """
+        with self.lock:
+            if reuse and self.key == key and self.alive():
+                self.reuses += 1
+                return True
+            if self.ssh is not None and self.key == key:
+                print(self.slot.name, "server exited, relaunch")
+            self.stop_locked()
+            stop_overlapping(self)
+            self.launch(key, cmd)
+            return False
+
+    def launch(self, key, cmd):
+        with span("server.launch", slot=self.slot.name):
+            self.ssh = self.make_ssh()
+            with span("server.setup"):
+                if self.setup is not None:
+                    self.setup(self.ssh)
+            with span("server.model_load"):
+                self.ssh.execute_command_async(cmd)
+                out = self.ssh.read_until_prompt(self.ready, show_log=True)
+        if self.ready not in out:
+            self.stop_locked()
+            raise RuntimeError(f"{self.slot.name}: server launch failed")
+        self.key = key
+        self.prompt = self.ssh.final_prompt.encode('utf-8')
+        self.tail = b''
+        self.launches += 1
+        self.thread_name = self.ssh.start_recv_thread(sink=self.feed)
+
+    # sinks，接收 server 输出字节的回调（ChannelLog、LiveMonitor 等）
+    def attach(self, *sinks):
+        with self.sink_lock:
+            self.sinks = sinks
+
+    def detach(self):
+        with self.sink_lock:
+            self.sinks = ()
+
+    def stop(self):
+        with self.lock:
+            self.stop_locked()
+
+    def stop_locked(self):
+        self.detach()
+        if self.ssh is None:
+            return
+        with span("server.stop", slot=self.slot.name):
+            self.stop_ssh()
+
+    def stop_ssh(self):
+        if self.thread_name is not None:
+            self.ssh.stop_thread(self.thread_name)
+            self.thread_name = None
+        try:
+            for cmd in self.stop_cmds:
+                self.ssh.execute_command(cmd, max_duration=3)
+        finally:
+            self.ssh.close()
+            self.ssh = None
+            self.key = None
+
+
+servers = {}
+servers_lock = threading.Lock()
+
+
+def server_for(slot, make_ssh, setup=None, stop_cmds=None):
+    """ 每个槽位一个 VllmServer，同一槽位上先后运行的实验共用 """
+    with servers_lock:
+        server = servers.get(slot.name)
+        if server is None:
+            server = VllmServer(slot, make_ssh, setup, stop_cmds)
+            servers[slot.name] = server
+        return server
+
+
+def overlaps(a, b):
+    if a.host["ip"] != b.host["ip"] or a.host["port"] != b.host["port"]:
+        return False
+    # 未指定 GPU 的槽位可以看到所有卡
+    return not a.gpus or not b.gpus or bool(set(a.gpus) & set(b.gpus))
+
+
+def stop_overlapping(server):
+    """ 停止与 server 所在槽位共用 GPU 的其他空闲 server，释放显存和端口 """
+    with servers_lock:
+        others = [s for s in servers.values() if s is not server and overlaps(s.slot, server.slot)]
+    for other in others:
+        if other.ssh is not None:
+            print(other.slot.name, "stop idle server, GPUs needed by", server.slot.name)
+            other.stop()
+
+
+def stop_servers():
+    """ 停止所有常驻的 server """
+    with servers_lock:
+        all_servers = list(servers.values())
+    for server in all_servers:
+        server.stop()
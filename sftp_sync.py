@@ -0,0 +1,245 @@
+import hashlib
+import os
+import posixpath
+import queue
+import shlex
+import stat
+import sys
+import tarfile
+import threading
+import time
+
+
+# 远端目录增量同步到本地
+# 多个 SFTP channel 并发下载（同一个 Transport 上多路复用），sftp.get 自带预取流水线
+# 大小和 mtime 都未变化的文件跳过；小文件很多时可以用远端 tar 流一次性传输
+class SFTPSync:
+    # ssh，已连接的 paramiko.SSHClient
+    # workers，并发 SFTP channel 数
+    # check，'mtime' 按大小+修改时间判断是否变化，'hash' 额外比较 md5（远端执行 md5sum）
+    # tar_min_files，mode='auto' 时，待下载的小文件数达到该值改用 tar 流
+    # small_size，tar 模式只打包小于该值的文件，大文件仍走并发 SFTP
+    def __init__(self, ssh, workers=4, check='mtime', tar_min_files=200,
+                 small_size=1024 * 1024):
+        self.ssh = ssh
+        self.workers = workers
+        self.check = check
+        self.tar_min_files = tar_min_files
+        self.small_size = small_size
+
+    def list_remote(self, sftp, remote_dir):
+        """ 递归列出远端文件，返回 [(相对路径, 大小, mtime)] """
+        files = []
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            for entry in sftp.listdir_attr(posixpath.join(remote_dir, rel_dir)):
+                rel_path = posixpath.join(rel_dir, entry.filename)
+                if stat.S_ISDIR(entry.st_mode):
+                    stack.append(rel_path)
+                else:
+                    files.append((rel_path, entry.st_size, entry.st_mtime))
+        return files
+
+    def unchanged(self, local_path, size, mtime):
+        try:
+            st = os.stat(local_path)
+        except OSError:
+            return False
+        return st.st_size == size and int(st.st_mtime) == int(mtime)
+
+    def remote_md5(self, remote_dir, rel_paths):
+        """ 远端批量计算 md5，返回 {相对路径: md5} """
+        result = {}
+        batch = 200
+        for i in range(0, len(rel_paths), batch):
+            cmd = "cd " + shlex.quote(remote_dir) + " && md5sum -- " + \
+                  " ".join(shlex.quote(p) for p in rel_paths[i:i + batch])
+            _, stdout, _ = self.ssh.exec_command(cmd)
+            for line in stdout.read().decode('utf-8', errors='replace').splitlines():
+                digest, _, path = line.partition('  ')
+                result[path] = digest
+        return result
+
+    def local_md5(self, path):
+        h = hashlib.md5()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def plan(self, sftp, remote_dir, local_dir):
+        """ 找出需要下载的文件，返回 (待下载, 跳过的文件数, 远端所有文件的相对路径) """
+        todo = []
+        same_meta = []
+        listing = self.list_remote(sftp, remote_dir)
+        for rel_path, size, mtime in listing:
+            local_path = os.path.join(local_dir, rel_path)
+            if self.unchanged(local_path, size, mtime):
+                same_meta.append((rel_path, size, mtime))
+            else:
+                todo.append((rel_path, size, mtime))
+        # hash 模式下，大小和 mtime 相同的文件再比较内容
+        skipped = len(same_meta)
+        if self.check == 'hash' and same_meta:
+            digests = self.remote_md5(remote_dir, [item[0] for item in same_meta])
+            for item in same_meta:
+                local_path = os.path.join(local_dir, item[0])
+                if digests.get(item[0]) != self.local_md5(local_path):
+                    todo.append(item)
+                    skipped -= 1
+        return todo, skipped, {item[0] for item in listing}
+
+    def prune(self, local_dir, remote_paths):
+        """ 删除本地镜像中远端已不存在的文件（包括中断留下的 .part）和空目录，返回删除的文件数 """
+        removed = 0
+        for root, dirs, files in os.walk(local_dir, topdown=False):
+            for name in files:
+                local_path = os.path.join(root, name)
+                rel_path = os.path.relpath(local_path, local_dir).replace(os.sep, '/')
+                if rel_path not in remote_paths:
+                    os.remove(local_path)
+                    removed += 1
+            if root != local_dir and not os.listdir(root):
+                os.rmdir(root)
+        return removed
+
+    def fetch_one(self, sftp, remote_dir, local_dir, item):
+        rel_path, size, mtime = item
+        remote_path = posixpath.join(remote_dir, rel_path)
+        local_path = os.path.join(local_dir, rel_path)
+        os.makedirs(os.path.dirname(local_path), exist_ok=True)
+        tmp_path = local_path + ".part"
+        sftp.get(remote_path, tmp_path)
+        os.replace(tmp_path, local_path)
+        # 本地 mtime 与远端一致，下次同步可以据此跳过
+        os.utime(local_path, (mtime, mtime))
+
+    def fetch_parallel(self, remote_dir, local_dir, items):
+        """ 多个 SFTP channel 并发下载，大文件优先调度 """
+        tasks = queue.Queue()
+        for item in sorted(items, key=lambda x: -x[1]):
+            tasks.put(item)
+        errors = []
+
+        def worker():
+            sftp = self.ssh.open_sftp()
+            try:
+                while True:
+                    try:
+                        item = tasks.get_nowait()
+                    except queue.Empty:
+                        return
+                    try:
+                        self.fetch_one(sftp, remote_dir, local_dir, item)
+                    except Exception as e:
+                        errors.append(item[0])
+                        print(f"下载文件失败: {item[0]}. 错误: {e}", file=sys.stderr)
+            finally:
+                sftp.close()
+
+        threads = [threading.Thread(target=worker)
+                   for _ in range(max(1, min(self.workers, len(items))))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return errors
+
+    def fetch_tar(self, remote_dir, local_dir, items):
+        """ 远端 tar 打包待下载的文件，经单个 exec channel 流式解包到本地 """
+        stdin, stdout, stderr = self.ssh.exec_command(
+            "tar -C " + shlex.quote(remote_dir) + " -cf - -T -")
+
+        # 文件列表在单独线程中写入，避免 tar 输出填满窗口时双方互相等待
+        def feed_names():
+            stdin.write("".join(item[0] + "\n" for item in items))
+            stdin.channel.shutdown_write()
+        feeder = threading.Thread(target=feed_names, daemon=True)
+        feeder.start()
+        wanted = {item[0]: item for item in items}
+        try:
+            with tarfile.open(fileobj=stdout, mode='r|') as tar:
+                for member in tar:
+                    if not member.isfile() or member.name not in wanted:
+                        continue
+                    local_path = os.path.join(local_dir, member.name)
+                    os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                    src = tar.extractfile(member)
+                    with open(local_path + ".part", 'wb') as f:
+                        while True:
+                            block = src.read(1024 * 1024)
+                            if not block:
+                                break
+                            f.write(block)
+                    os.replace(local_path + ".part", local_path)
+                    mtime = wanted.pop(member.name)[2]
+                    os.utime(local_path, (mtime, mtime))
+        except tarfile.ReadError as e:
+            print("tar stream error:", e, file=sys.stderr)
+        feeder.join()
+        if stdout.channel.recv_exit_status() != 0:
+            print("tar stream error:", stderr.read().decode('utf-8', errors='replace'),
+                  file=sys.stderr)
+        # tar 中缺失的文件交给 SFTP 补齐
+        return list(wanted.values())
+
+    # mode，'sftp' 只用并发 SFTP，'tar' 小文件走 tar 流，'auto' 小文件足够多时才用 tar
+    # prune，删除本地有而远端没有的文件，只用于专用的镜像目录，local_dir 中的其他文件会被删除
+    def sync(self, remote_dir, local_dir, mode='auto', prune=False):
+        start = time.time()
+        os.makedirs(local_dir, exist_ok=True)
+        sftp = self.ssh.open_sftp()
+        try:
+            todo, skipped, remote_paths = self.plan(sftp, remote_dir, local_dir)
+        finally:
+            sftp.close()
+        # 远端删除或改名的文件不能留在镜像中，否则会被 link_tree 带到之后的每个实验目录
+        removed = self.prune(local_dir, remote_paths) if prune else 0
+
+        small = [item for item in todo if item[1] < self.small_size]
+        use_tar = mode == 'tar' or (mode == 'auto' and len(small) >= self.tar_min_files)
+        rest = todo
+        if use_tar and small:
+            large = [item for item in todo if item[1] >= self.small_size]
+            rest = large + self.fetch_tar(remote_dir, local_dir, small)
+        errors = self.fetch_parallel(remote_dir, local_dir, rest) if rest else []
+        # 下载失败的文件删除本地的旧版本，不把过期的内容当作本次结果
+        for rel_path in errors:
+            local_path = os.path.join(local_dir, rel_path)
+            if os.path.exists(local_path):
+                os.remove(local_path)
+
+        failed = set(errors)
+        stats = {
+            "files": len(todo) - len(errors),
+            "bytes": sum(item[1] for item in todo if item[0] not in failed),
+            "skipped": skipped,
+            "removed": removed,
+            "errors": len(errors),
+            "tar": use_tar,
+            "seconds": time.time() - start,
+        }
+        print(f"同步 {remote_dir} 到 {local_dir}: {stats}")
+        return stats
+
+
+def link_tree(src_dir, dst_dir):
+    """
+    用硬链接把 src_dir 复制到 dst_dir（跨文件系统时退化为复制）
+    SFTPSync 通过 .part + os.replace 更新文件，不会改写已链接出去的旧快照
+    """
+    import shutil
+    for root, _, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        target_root = os.path.normpath(os.path.join(dst_dir, rel_root))
+        os.makedirs(target_root, exist_ok=True)
+        for name in files:
+            src = os.path.join(root, name)
+            dst = os.path.join(target_root, name)
+            if os.path.exists(dst):
+                os.remove(dst)
+            try:
+                os.link(src, dst)
+            except OSError:
+                shutil.copy2(src, dst)
@@ -1,9 +1,234 @@
 import paramiko
+import codecs
+import select
+import socket
 import time
 import threading
+from concurrent.futures import ThreadPoolExecutor
+from sftp_sync import SFTPSync
+from tracing import span, current
+from io_stats import ChannelStats, SFTPStats, merge
+from reactor import get_reactor
+
+# 流式读取：增量 utf-8 解码 + prompt 匹配
+# 每次只在新数据和上次尾部 len(prompt)-1 个字符组成的窗口中查找，整体线性复杂度
+# keep，是否保留读到的全部文本供 getvalue 返回，为 False 时只保留尾部窗口，内存不随输出增长
+# stats，传入 io_stats.ChannelStats 时记录多字节字符被截断的次数
+class StreamMatcher:
+    def __init__(self, prompt, keep=True, stats=None):
+        self.prompt = prompt
+        self.keep = keep
+        self.stats = stats
+        # 增量解码器会缓存被截断的多字节字符，不需要对整个缓冲区重新解码
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.chunks = []
+        self.tail = ''
+        self.found = False
+
+    def feed(self, data):
+        """ 输入新收到的字节，返回本次解码出的字符串 """
+        text = self.decoder.decode(data)
+        # 末尾的多字节字符被截断，留待下一块数据解码
+        if self.stats is not None and self.decoder.getstate()[0]:
+            self.stats.decode_retries += 1
+        if not text:
+            return text
+        if self.keep:
+            self.chunks.append(text)
+        if self.prompt and not self.found:
+            window = self.tail + text
+            if self.prompt in window:
+                self.found = True
+            keep = len(self.prompt) - 1
+            self.tail = window[-keep:] if keep > 0 else ''
+        return text
+
+    def getvalue(self):
+        if len(self.chunks) > 1:
+            self.chunks = [''.join(self.chunks)]
+        return self.chunks[0] if self.chunks else ''
+
+
+# read_until_prompt 的读取循环，SSHManager 和 AsyncSSHManager 共用
+# 需要等待 channel 可读时 yield 最长等待时间(s)，由调用方以各自的方式等待，结束时返回读到的内容
+# 参数含义见 SSHManager.read_until_prompt；stats 为 io_stats.ChannelStats，s 为累加字节数的 span
+def read_loop(channel, ssh_name, prompt, max_duration, once_max_wait, show_log, buffer_size,
+              interval, sink, stats, s):
+    matcher = StreamMatcher(prompt, keep=sink is None, stats=stats)
+    begin = time.perf_counter()
+    first = True
+
+    if once_max_wait > max_duration:
+        once_max_wait = max_duration
+
+    start_time = time.time()
+    last_recv_time = start_time
+    while time.time() - start_time < max_duration:
+        # 等待有效读取出现，阻塞在 channel 上，无需 sleep 轮询
+        if not channel.recv_ready():
+            now = time.time()
+            # 超时检测
+            if now - last_recv_time >= once_max_wait:
+                print(ssh_name, "Reached once_max_wait")
+                stats.timeouts += 1
+                return matcher.getvalue()
+            # 出现错误流时，抛出异常
+            if channel.recv_stderr_ready():
+                print(ssh_name, "an error occurred")
+                print(channel.recv_stderr(buffer_size))
+                raise RuntimeError(ssh_name)
+            # 连接已关闭，不会再有数据
+            if channel.closed or channel.eof_received:
+                print(ssh_name, "channel closed")
+                return matcher.getvalue()
+            timeout = min(interval,
+                          once_max_wait - (now - last_recv_time),
+                          max_duration - (now - start_time))
+            t0 = time.perf_counter()
+            yield timeout
+            stats.on_wait(time.perf_counter() - t0)
+            continue
+
+        t0 = time.perf_counter()
+        data = channel.recv(buffer_size)
+        t1 = time.perf_counter()
+        stats.on_recv(len(data), t1 - t0, buffer_size)
+        if first:
+            stats.first_byte.observe(t1 - begin)
+            first = False
+        s.add("bytes", len(data))
+        recv = matcher.feed(data)
+        last_recv_time = time.time()
+        if show_log and recv:
+            print(recv, end="")
+        if sink is not None and recv:
+            sink(recv)
+            stats.sink_time += time.perf_counter() - t1
+
+        # 查询字符可能分割在两个 recv 中，由 matcher 的尾部窗口处理
+        if matcher.found:
+            stats.prompt_wait.observe(time.perf_counter() - begin)
+            break
+
+    return matcher.getvalue()
+
+
+# exec 模式命令的结果
+# exit_status，命令的退出码，超时被关闭时为 None
+class CommandResult:
+    def __init__(self, command, stdout, stderr, exit_status, duration):
+        self.command = command
+        self.stdout = stdout
+        self.stderr = stderr
+        self.exit_status = exit_status
+        self.duration = duration
+
+    @property
+    def ok(self):
+        return self.exit_status == 0
+
+    def check(self):
+        """ 退出码非 0 或超时时抛出 RuntimeError，附 stderr 的最后几行 """
+        if not self.ok:
+            status = "timed out" if self.exit_status is None else f"exit {self.exit_status}"
+            tail = "\n".join(self.stderr.splitlines()[-5:])
+            raise RuntimeError(f"{self.command!r} {status}" + (f": {tail}" if tail else ""))
+        return self
+
+
+# 改变 shell 环境的命令，shell 中执行后记录下来，exec 模式的命令前依次执行
+env_cmd_prefixes = ("cd ", "export ", "unset ", "source ", ". ", "conda activate ", "ulimit ",
+                    "umask ")
+
+
+# 关闭 Nagle，交互式的小包（命令、channel 请求、健康检查）不必等待对端的延迟 ACK
+def set_nodelay(client):
+    sock = client.get_transport().sock
+    if isinstance(sock, socket.socket):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+# 连接池：按 (ip, port, username) 复用已认证的 Transport
+# 同一主机上的 server/client shell 与 SFTP 都复用同一个 Transport，只在首次使用时握手
+class SSHPool:
+    def __init__(self, keepalive=30):
+        self.keepalive = keepalive
+        self.lock = threading.Lock()
+        self.clients = {}  # key -> paramiko.SSHClient
+        self.sftps = {}    # key -> paramiko.SFTPClient
+        self.key_locks = {}  # key -> threading.Lock，串行化同一主机的连接
+
+    def is_alive(self, client):
+        """ 健康检查：Transport 存活且能发出 ignore 包 """
+        transport = client.get_transport()
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except (paramiko.SSHException, EOFError, OSError):
+            return False
+        return True
+
+    def key_lock(self, key):
+        with self.lock:
+            return self.key_locks.setdefault(key, threading.Lock())
+
+    # 每个主机一把锁：同一主机只建立一个连接，慢主机的握手不阻塞其他主机
+    # self.lock 只保护字典，不在其中做网络操作
+    def get_client(self, ip, port, username, password):
+        key = (ip, int(port), username)
+        with self.key_lock(key):
+            with self.lock:
+                client = self.clients.get(key)
+            if client is not None and self.is_alive(client):
+                return client
+            if client is not None:
+                print(key, "pooled transport is dead, reconnect")
+                with self.lock:
+                    self.drop(key)
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            client.connect(ip, port, username, password)
+            set_nodelay(client)
+            if self.keepalive:
+                client.get_transport().set_keepalive(self.keepalive)
+            with self.lock:
+                self.clients[key] = client
+            return client
+
+    def get_sftp(self, ip, port, username, password):
+        client = self.get_client(ip, port, username, password)
+        key = (ip, int(port), username)
+        with self.key_lock(key):
+            with self.lock:
+                sftp = self.sftps.get(key)
+            if sftp is None or sftp.get_channel().closed:
+                sftp = client.open_sftp()
+                with self.lock:
+                    self.sftps[key] = sftp
+            return sftp
+
+    def drop(self, key):
+        sftp = self.sftps.pop(key, None)
+        client = self.clients.pop(key, None)
+        try:
+            if sftp is not None:
+                sftp.close()
+            if client is not None:
+                client.close()
+        except (paramiko.SSHException, EOFError, OSError):
+            pass
+
+    def close(self):
+        with self.lock:
+            for key in list(self.clients.keys()):
+                self.drop(key)
+
 
 class SSHManager:
-    def __init__(self, ip, username, password, ssh_name="", port=22, final_prompt="$ "):
+    # pool，传入 SSHPool 时复用池中的 Transport，close 只关闭本对象的 shell channel
+    def __init__(self, ip, username, password, ssh_name="", port=22, final_prompt="$ ",
+                 pool=None):
         super().__init__()
         self.ip = ip
         self.port = port
@@ -11,17 +236,34 @@ class SSHManager:
         self.password = password
         self.final_prompt = final_prompt
         self.ssh_name = ssh_name
+        self.pool = pool
         self.ssh = None
         self.sftp = None
         self.channel = None
         self.threads = {} # 保存线程实例
+        # 读取统计，shell 重连后继续累加，见 io_stats
+        self.stats = ChannelStats(ssh_name or "shell")
+        self.exec_stats = ChannelStats((ssh_name or "") + "exec")
+        self.exec_lock = threading.Lock()
+        self.sftp_stats = SFTPStats()
+        # shell 中执行过的 cd/export 等命令，见 remember_env
+        self.env_cmds = []
         self.connect()
 
     def connect(self):
-        self.ssh = paramiko.SSHClient()
-        self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        self.ssh.connect(self.ip, self.port, self.username, self.password)
-        self.sftp = self.ssh.open_sftp()
+        with span("ssh.connect", ssh=self.ssh_name, pooled=self.pool is not None):
+            self.open_shell()
+
+    def open_shell(self):
+        if self.pool is not None:
+            self.ssh = self.pool.get_client(self.ip, self.port, self.username, self.password)
+            self.sftp = self.pool.get_sftp(self.ip, self.port, self.username, self.password)
+        else:
+            self.ssh = paramiko.SSHClient()
+            self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+            self.ssh.connect(self.ip, self.port, self.username, self.password)
+            set_nodelay(self.ssh)
+            self.sftp = self.ssh.open_sftp()
         self.channel = self.ssh.invoke_shell()
         # 非阻塞模式
         self.channel.setblocking(0)
@@ -31,66 +273,38 @@ class SSHManager:
         # 连接命令的缓冲区立即读取
         self.read_until_prompt(self.final_prompt)
 
+    # 等待 channel 可读，有数据（或 stderr、连接关闭）到达时立即返回
+    # paramiko 的 channel.fileno() 是一个内部 pipe，数据到达时被置为可读
+    def wait_readable(self, timeout):
+        if timeout <= 0:
+            return self.channel.recv_ready()
+        readable, _, _ = select.select([self.channel], [], [], timeout)
+        return len(readable) > 0
+
     # 阻塞式读取
     # prompt，读取到指定字符串时停止
     # max_duration，该命令最长执行时间(s)
     # once_max_wait，单次读取缓冲区最长等待时间(s)
     # show_log，是否打印读取的信息
     # buffer_size，单次读取缓冲区大小
-    # interval，单次读取失败后的间隔时间(s)
+    # interval，无数据时检查 stderr/超时的最长间隔(s)，数据到达时会立即唤醒
+    # sink，接收每次解码出的文本的回调（如 log_process.TermNormalizer），传入时不在内存中
+    # 保留读到的内容，返回空串
     def read_until_prompt(self,
                           prompt,
                           max_duration=3600,
                           once_max_wait = 360,
                           show_log=False,
                           buffer_size=1024,
-                          interval=1):
-        output = ''
-        buffer = b''  # 使用字节类型的缓冲区
-        # last_decode = True
-
-        if once_max_wait > max_duration:
-            once_max_wait = max_duration
-
-        start_time = time.time()
-        last_recv_time = start_time
-        while time.time() - start_time < max_duration:
-            # 等待有效读取出现
-            while not self.channel.recv_ready():
-                time.sleep(interval)  # 避免过高的 CPU 使用率
-                # 超时检测
-                if time.time() - last_recv_time >= once_max_wait:
-                    print(self.ssh_name, "Reached once_max_wait")
-                    return output
-                # 出现错误流时，抛出异常
-                if self.channel.recv_stderr_ready():
-                    print(self.ssh_name, "an error occurred")
-                    print(self.channel.recv_stderr(buffer_size))
-                    raise RuntimeError(self.ssh_name)
-
-            buffer += self.channel.recv(buffer_size)
-            last_recv_time = time.time()
-
-            # 缓冲区转换成 utf-8 编码
-            try:
-                recv = buffer.decode('utf-8')
-                if show_log:
-                    print(recv, end="")
-                buffer = b''
-                # if not last_decode:
-                    # print(self.ssh_name, "redecode success")
-                    # last_decode = True
-            except UnicodeDecodeError as e:
-                # print(self.ssh_name, f"decode error: {e}, try read more buffer to decode")
-                # last_decode = False
-                continue
-
-            output += recv
-            # 查询字符可能分割在两个 recv 中
-            if prompt and prompt in output:
-                break
-
-        return output
+                          interval=1,
+                          sink=None):
+        reader = read_loop(self.channel, self.ssh_name, prompt, max_duration, once_max_wait,
+                           show_log, buffer_size, interval, sink, self.stats, current())
+        try:
+            while True:
+                self.wait_readable(next(reader))
+        except StopIteration as done:
+            return done.value
 
     def execute_command(self,
                         command,
@@ -100,34 +314,149 @@ class SSHManager:
                         buffer_size=1024,
                         interval=1):
         print(self.ssh_name, command)
-        self.channel.send(command + "\r")
-        return self.read_until_prompt(self.final_prompt, max_duration, once_max_wait,
-                                      show_log, buffer_size, interval)
+        self.remember_env(command)
+        with span("ssh.exec", ssh=self.ssh_name, cmd=command[:120]):
+            self.channel.send(command + "\r")
+            return self.read_until_prompt(self.final_prompt, max_duration, once_max_wait,
+                                          show_log, buffer_size, interval)
+
+    def remember_env(self, command):
+        """ 记录改变 shell 环境的命令（可以用 && 连接），exec 模式下继续生效 """
+        for part in command.split("&&"):
+            part = part.strip()
+            if part.startswith(env_cmd_prefixes) or part == "cd":
+                self.env_cmds.append(part)
+
+    # exec 模式：每条命令在同一 Transport 上新开的 exec channel 中运行
+    # 不经过交互 shell，不需要匹配 prompt，stdout/stderr 分开，返回真实的退出码，进程结束即返回
+    # 多个线程可以同时调用，各自使用独立的 channel，见 exec_commands
+    # shell 中执行过的 cd/export 等环境命令依次加在命令前（docker exec -it 之类进入其他 shell 的
+    # 命令无法在 exec 模式中重现）
+    # timeout，最长执行时间(s)，超时关闭 channel，exit_status 为 None
+    # sink/stderr_sink，接收解码后的 stdout/stderr 文本的回调，传入时不在内存中保留对应内容
+    # check，退出码非 0 或超时时抛出 RuntimeError
+    def exec_command(self, command, timeout=3600, show_log=False, buffer_size=32768,
+                     interval=1, sink=None, stderr_sink=None, check=False):
+        print(self.ssh_name, "[exec]", command)
+        stats = ChannelStats(self.ssh_name)
+        out = StreamMatcher(None, keep=sink is None, stats=stats)
+        err = StreamMatcher(None, keep=stderr_sink is None, stats=stats)
+        with span("ssh.exec", ssh=self.ssh_name, cmd=command[:120], mode="exec") as s:
+            begin = time.perf_counter()
+            channel = self.ssh.get_transport().open_session()
+            try:
+                channel.exec_command(" && ".join(self.env_cmds + [command]))
+                status = self.read_exec(channel, out, err, stats, s, begin + timeout,
+                                        show_log, buffer_size, interval, sink, stderr_sink)
+            finally:
+                channel.close()
+            duration = time.perf_counter() - begin
+            s.set(exit_status=status)
+        stats.commands = 1
+        stats.failed = int(status != 0)
+        if status is None:
+            print(self.ssh_name, "[exec] timed out:", command)
+            stats.timeouts += 1
+        else:
+            stats.prompt_wait.observe(duration)
+        with self.exec_lock:
+            self.exec_stats.merge(stats)
+        result = CommandResult(command, out.getvalue(), err.getvalue(), status, duration)
+        return result.check() if check else result
+
+    def read_exec(self, channel, out, err, stats, s, deadline, show_log, buffer_size, interval,
+                  sink, stderr_sink):
+        """ 读取 exec channel 直到进程退出且输出读完，返回退出码，超时返回 None """
+        begin = time.perf_counter()
+        first = True
+        while True:
+            # 退出码在所有输出之后到达，先取状态再读缓冲，保证退出前的输出都已读完
+            exited = channel.exit_status_ready()
+            got = False
+            for ready, recv, matcher, callback in (
+                    (channel.recv_ready, channel.recv, out, sink),
+                    (channel.recv_stderr_ready, channel.recv_stderr, err, stderr_sink)):
+                if not ready():
+                    continue
+                t0 = time.perf_counter()
+                data = recv(buffer_size)
+                t1 = time.perf_counter()
+                stats.on_recv(len(data), t1 - t0, buffer_size)
+                if first:
+                    stats.first_byte.observe(t1 - begin)
+                    first = False
+                s.add("bytes", len(data))
+                text = matcher.feed(data)
+                if show_log and text:
+                    print(text, end="")
+                if callback is not None and text:
+                    callback(text)
+                    stats.sink_time += time.perf_counter() - t1
+                got = True
+            if got:
+                continue
+            if exited:
+                return channel.recv_exit_status()
+            now = time.perf_counter()
+            if now >= deadline:
+                return None
+            # stdout、stderr 有数据或 channel 关闭时都会唤醒
+            select.select([channel], [], [], min(interval, deadline - now))
+            stats.on_wait(time.perf_counter() - now)
+
+    def exec_commands(self, commands, workers=8, **kwargs):
+        """ 在同一 Transport 上并发运行多条 exec 命令，按输入顺序返回 CommandResult """
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(commands)))) as pool:
+            return list(pool.map(lambda cmd: self.exec_command(cmd, **kwargs), commands))
 
     # 可以搭配线程使用，防止缓冲区堵塞
     def execute_command_async(self, command):
         print(self.ssh_name, command)
         self.channel.send(command + "\r")
 
-    # server 端一直运行，需要靠线程实现非阻塞式地读取缓冲区，否则缓冲区堵塞会造成错误或者执行缓慢
-    # request-rate 较大时，server 端打印过快，interval 要设置非常小
-    def start_recv_thread(self, max_duration=3600, buffer_size=4096, interval=0):
-        """ 开启新线程以持续接收数据 """
+    # server 端一直运行，需要持续读取缓冲区，否则缓冲区堵塞会造成错误或者执行缓慢
+    # sink，接收每次读到的字节的回调（如 ChannelLog），为 None 时直接丢弃
+    # shared，注册到所有 SSHManager 共用的 reactor 线程（select 等待，读取大小自适应，
+    # buffer_size 为初始读取大小）；为 False 时单独开线程轮询，request-rate 较大时 interval
+    # 要设置非常小，interval=0 时会占满一个 CPU 核
+    def start_recv_thread(self, max_duration=3600, buffer_size=4096, interval=0, sink=None,
+                          shared=True):
+        """ 开始持续接收数据，返回用于 stop_thread 的名字 """
         thread_name = f"RecvThread-{len(self.threads) + 1}"
+        if shared:
+            reg = get_reactor().register(self.channel, sink, self.stats, buffer_size,
+                                         max_duration)
+            self.threads[thread_name] = {'reactor': reg}
+            return thread_name
         thread = threading.Thread(target=self.recv_thread,
-                                args=(thread_name,max_duration,buffer_size,interval))
+                                args=(thread_name,max_duration,buffer_size,interval,sink))
         self.threads[thread_name] = {'thread': thread, 'running': True}
         thread.start()
         return thread_name
 
-    def recv_thread(self, thread_name, max_duration=3600, buffer_size=4096, interval=0):
+    def recv_thread(self, thread_name, max_duration=3600, buffer_size=4096, interval=0,
+                    sink=None):
         """ 线程运行的函数，不断接收数据，防止缓冲区占满 """
         print(f"Thread {thread_name} started")
+        stats = self.stats
         start_time = time.time()
+        last = time.perf_counter()
         while self.threads[thread_name]['running']:
+            t0 = time.perf_counter()
             if self.channel.recv_ready():
-                self.channel.recv(buffer_size)
+                # 距上一次检查的间隔：数据到达后最多等这么久才被读走
+                stats.on_drain(t0 - last, len(self.channel.in_buffer),
+                               self.channel.in_window_size)
+                data = self.channel.recv(buffer_size)
+                t1 = time.perf_counter()
+                stats.on_recv(len(data), t1 - t0, buffer_size)
+                if sink is not None:
+                    sink(data)
+                    stats.sink_time += time.perf_counter() - t1
+            last = t0
+            t0 = time.perf_counter()
             time.sleep(interval)
+            stats.on_wait(time.perf_counter() - t0)
             if time.time() - start_time >= max_duration:
                 print(f"Thread {thread_name} Reached maximum duration.")
                 return
@@ -136,8 +465,11 @@ class SSHManager:
     def stop_thread(self, thread_name):
         """ 停止指定的线程 """
         if thread_name in self.threads:
-            self.threads[thread_name]['running'] = False
-            self.threads[thread_name]['thread'].join()  # 等待线程结束
+            if 'reactor' in self.threads[thread_name]:
+                get_reactor().unregister(self.threads[thread_name]['reactor'])
+            else:
+                self.threads[thread_name]['running'] = False
+                self.threads[thread_name]['thread'].join()  # 等待线程结束
             del self.threads[thread_name]
             print(f"Thread {thread_name} has been stopped")
         else:
@@ -152,27 +484,46 @@ class SSHManager:
             import sys
             print(f"下载文件失败: {remote_path}. 错误: {e}", file=sys.stderr)
 
-    def download_directory(self, remote_dir, local_dir):
-        import os
-        import stat
-        os.makedirs(local_dir, exist_ok=True)
-        for entry in self.sftp.listdir_attr(remote_dir):
-            remote_path = os.path.join(remote_dir, entry.filename)
-            local_path = os.path.join(local_dir, entry.filename)
-            if stat.S_ISDIR(entry.st_mode):
-                self.download_directory(remote_path, local_path)
-            else:
-                self.download_file(remote_path, local_path)
+    # 增量同步远端目录，未变化的文件跳过
+    # workers，并发 SFTP channel 数
+    # mode，'sftp'/'tar'/'auto'，见 SFTPSync.sync
+    # prune，同时删除 local_dir 中远端没有的文件，见 SFTPSync.sync
+    def download_directory(self, remote_dir, local_dir, workers=4, mode='auto', check='mtime',
+                           prune=False):
+        with span("sftp.sync", remote=remote_dir, mode=mode) as s:
+            t0 = time.perf_counter()
+            stats = SFTPSync(self.ssh, workers=workers, check=check).sync(remote_dir, local_dir,
+                                                                           mode, prune)
+            self.sftp_stats.on_sync(stats, time.perf_counter() - t0)
+            s.set(bytes=stats.get("bytes", 0), files=stats.get("files", 0),
+                  skipped=stats.get("skipped", 0))
+            return stats
+
+    def io_stats(self):
+        """ 本对象各 channel 的读取统计和 SFTP 传输统计的快照 """
+        channels = [self.stats.snapshot(), self.exec_stats.snapshot()]
+        return {"name": self.ssh_name, "channels": channels, "sftp": self.sftp_stats.snapshot(),
+                "total": merge(channels)}
+
+    def reset_stats(self):
+        self.stats.reset()
+        with self.exec_lock:
+            self.exec_stats.reset()
+        self.sftp_stats.reset()
 
     def close(self):
         if self.ssh:
-            self.sftp.close()
-            self.ssh.close()
-            print(self.ssh_name, "ssh close")
-            self.ssh = None
-            # 停止所有线程
+            # 先停止读取，channel.close() 会关闭 reactor 正在等待的 pipe
             for thread_name in list(self.threads.keys()):
                 self.stop_thread(thread_name)
+            if self.pool is not None:
+                # Transport 和 SFTP 归连接池所有，只关闭 shell
+                self.channel.close()
+            else:
+                self.sftp.close()
+                self.ssh.close()
+            print(self.ssh_name, "ssh close")
+            self.ssh = None
 
     def __del__(self):
         self.close()
@@ -0,0 +1,258 @@
+import math
+
+import numpy as np
+
+from optimizer import SearchStrategy
+
+
+def norm_cdf(z):
+    # 无 scipy 依赖的标准正态分布函数（Abramowitz-Stegun 7.1.26，误差 < 1.5e-7）
+    x = np.abs(z) / math.sqrt(2)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 +
+                t * (-1.453152027 + t * 1.061405429))))
+    erf = 1.0 - poly * np.exp(-x * x)
+    return 0.5 * (1.0 + np.sign(z) * erf)
+
+
+def norm_pdf(z):
+    return np.exp(-0.5 * z * z) / math.sqrt(2 * math.pi)
+
+
+# 高斯过程回归，Matern 5/2 核，各维长度尺度在候选网格中按边际似然选择
+# 维度多于 max_grid_dims 时网格组合过多，改为逐维选择（坐标下降）
+class GaussianProcess:
+    length_grid = [0.1, 0.2, 0.4, 0.8]
+    max_grid_dims = 4
+
+    def __init__(self, noise=1e-2):
+        self.noise = noise
+        self.lengths = None
+
+    def kernel(self, a, b, lengths):
+        diff = (a[:, None, :] - b[None, :, :]) / lengths
+        r = np.sqrt(np.sum(diff * diff, axis=-1))
+        s5r = math.sqrt(5) * r
+        return (1 + s5r + 5 * r * r / 3) * np.exp(-s5r)
+
+    def fit(self, x, y, lengths=None):
+        self.x = x
+        self.mean = float(np.mean(y))
+        self.std = float(np.std(y)) or 1.0
+        yn = (y - self.mean) / self.std
+        if lengths is None:
+            lengths = self.select_lengths(x, yn)
+        self.lengths = lengths
+        k = self.kernel(x, x, lengths) + self.noise * np.eye(len(x))
+        self.chol = np.linalg.cholesky(k)
+        self.alpha = np.linalg.solve(self.chol.T, np.linalg.solve(self.chol, yn))
+        return self
+
+    def log_likelihood(self, x, yn, lengths):
+        k = self.kernel(x, x, lengths) + self.noise * np.eye(len(x))
+        try:
+            chol = np.linalg.cholesky(k)
+        except np.linalg.LinAlgError:
+            return -np.inf
+        alpha = np.linalg.solve(chol.T, np.linalg.solve(chol, yn))
+        return -0.5 * yn @ alpha - np.sum(np.log(np.diag(chol)))
+
+    def select_lengths(self, x, yn):
+        dims = x.shape[1]
+        if dims > self.max_grid_dims:
+            lengths = np.full(dims, 0.4)
+            for _ in range(2):
+                for d in range(dims):
+                    trials = [np.where(np.arange(dims) == d, v, lengths)
+                              for v in self.length_grid]
+                    lls = [self.log_likelihood(x, yn, t) for t in trials]
+                    lengths = trials[int(np.argmax(lls))]
+            return lengths
+        best, best_ll = None, -np.inf
+        grids = np.array(np.meshgrid(*[self.length_grid] * dims)).reshape(dims, -1).T
+        for lengths in grids:
+            ll = self.log_likelihood(x, yn, lengths)
+            if ll > best_ll:
+                best, best_ll = lengths, ll
+        return best if best is not None else np.full(dims, 0.4)
+
+    def predict(self, xs):
+        ks = self.kernel(self.x, xs, self.lengths)
+        mu = ks.T @ self.alpha
+        v = np.linalg.solve(self.chol, ks)
+        var = np.maximum(1.0 - np.sum(v * v, axis=0), 1e-12)
+        return mu * self.std + self.mean, np.sqrt(var) * self.std
+
+
+# 基于代理模型的贝叶斯优化
+# 用 GP 拟合吞吐量以及 log(P99 TTFT)、log(P99 TPOT)，按“约束期望提升”选点：
+# EI(吞吐量) x P(TTFT <= ttft_p99_limit) x P(TPOT <= tpot_p99_limit)
+# 候选点取自 config.yaml 中 bound/min_step_num（或 choices）定义的网格，并满足 le 约束（mns <= mnbt）
+class BayesOptStrategy(SearchStrategy):
+    # n_init，默认值之后先用拉丁超立方撒点的次数
+    # max_trials，最多实验次数
+    # ei_tol，最大约束期望提升低于 ei_tol * 当前最优值时停止
+    # max_candidates，网格过大时随机抽样的候选数
+    def __init__(self, n_init=4, max_trials=30, ei_tol=0.01, max_candidates=50000, seed=0):
+        self.n_init = n_init
+        self.max_trials = max_trials
+        self.ei_tol = ei_tol
+        self.max_candidates = max_candidates
+        self.rng = np.random.default_rng(seed)
+        self.last_max_ei = None
+
+    def axes(self, plan):
+        """ 每个参数的取值网格，固定为 None 的参数返回 None """
+        axes = []
+        for param in plan.space.params:
+            values = param.grid()
+            axes.append(None if values is None else np.array(values, dtype=float))
+        return axes
+
+    def encode(self, plan, params):
+        """ 参数映射到 [0, 1]，log 为 true 的参数（如 max_num_seqs）取对数 """
+        axes = self.axes(plan)
+        cols = []
+        for dim, values in enumerate(axes):
+            if values is None:
+                continue
+            lo, hi = values[0], values[-1]
+            v = np.array([p[dim] for p in params], dtype=float)
+            if plan.space[dim].log and lo > 0:
+                cols.append((np.log(v) - np.log(lo)) / (np.log(hi) - np.log(lo)))
+            else:
+                cols.append((v - lo) / (hi - lo))
+        return np.stack(cols, axis=1)
+
+    def candidates(self, plan):
+        axes = self.axes(plan)
+        grids = [values if values is not None else np.array([None]) for values in axes]
+        sizes = [len(g) for g in grids]
+        total = int(np.prod(sizes))
+        if total > self.max_candidates:
+            idx = self.rng.integers(0, total, self.max_candidates)
+        else:
+            idx = np.arange(total)
+        params = []
+        for flat in idx:
+            point = []
+            for g, size in zip(grids, sizes):
+                point.append(g[flat % size])
+                flat //= size
+            point = [None if v is None else (int(v) if float(v).is_integer() else float(v))
+                     for v in point]
+            # mnbt 不小于 mns 等约束
+            if not plan.space.valid(point):
+                continue
+            params.append(point)
+        return params
+
+    def latin_hypercube(self, plan, k):
+        pool = self.candidates(plan)
+        if not pool:
+            return []
+        x = self.encode(plan, pool)
+        picks = []
+        bins = self.rng.permutation(k)[:, None] if x.shape[1] == 1 else \
+            np.stack([self.rng.permutation(k) for _ in range(x.shape[1])], axis=1)
+        for row in bins:
+            target = (row + self.rng.random(x.shape[1])) / k
+            picks.append(pool[int(np.argmin(np.sum((x - target) ** 2, axis=1)))])
+        return picks
+
+    # limits，截断延迟用的限制，默认为 plan.limits
+    def observations(self, plan, limits=None):
+        limits = limits if limits is not None else plan.limits
+        history = plan.history
+        x = self.encode(plan, plan.input_params_list)
+        thr = np.array(history.column("throughput"))
+        # 提前终止等无法测得的延迟（nan），按限制的 10 倍处理；超过的截断到 10 倍
+        ttft = np.fmin(history.column("ttft_p99"), 10 * limits["ttft_p99_limit"])
+        tpot = np.fmin(history.column("tpot_p99"), 10 * limits["tpot_p99_limit"])
+        return x, thr, np.log(np.maximum(ttft, 1e-3)), np.log(np.maximum(tpot, 1e-3))
+
+    def acquisition(self, models, xs, best, limits):
+        gp_thr, gp_ttft, gp_tpot = models
+        mu, sigma = gp_thr.predict(xs)
+        pof = np.ones(len(xs))
+        for gp, limit in ((gp_ttft, limits["ttft_p99_limit"]),
+                          (gp_tpot, limits["tpot_p99_limit"])):
+            m, s = gp.predict(xs)
+            pof *= norm_cdf((math.log(limit) - m) / s)
+        if best <= 0:
+            # 还没有满足约束的实验，先找可行域
+            return pof
+        z = (mu - best) / sigma
+        ei = (mu - best) * norm_cdf(z) + sigma * norm_pdf(z)
+        return np.maximum(ei, 0) * pof
+
+    def propose(self, plan, k):
+        done = len(plan.history) + len(plan.pending_list) + len(plan.failed_list)
+        budget = self.max_trials - done
+        if budget <= 0:
+            return []
+        k = min(k, budget)
+        if len(plan.history) < 1 + self.n_init:
+            picks = [p for p in self.latin_hypercube(plan, k + self.n_init) if plan.is_new(p)]
+            return picks[:k]
+
+        x, thr, ttft, tpot = self.observations(plan)
+        models = [GaussianProcess().fit(x, thr), GaussianProcess().fit(x, ttft),
+                  GaussianProcess().fit(x, tpot)]
+        pool = [p for p in self.candidates(plan) if plan.is_new(p)]
+        if not pool:
+            return []
+        xs = self.encode(plan, pool)
+        best = plan.best_throughput
+
+        # 进行中的实验按预测均值作为虚拟观测（constant liar），批量中的点依次加入
+        fantasy = list(plan.pending_list)
+        picks = []
+        for _ in range(k):
+            if fantasy:
+                xf = np.concatenate([x, self.encode(plan, fantasy)])
+                fx = self.encode(plan, fantasy)
+                models = [GaussianProcess().fit(xf, np.concatenate([y, m.predict(fx)[0]]),
+                                                lengths=m.lengths)
+                          for m, y in zip(models, (thr, ttft, tpot))]
+            acq = self.acquisition(models, xs, best, plan.limits)
+            i = int(np.argmax(acq))
+            if not picks:
+                self.last_max_ei = float(acq[i])
+            picks.append(pool[i])
+            fantasy.append(pool[i])
+            acq[i] = -np.inf
+            xs = np.delete(xs, i, axis=0)
+            pool.pop(i)
+            if not pool:
+                break
+        return picks
+
+    def finished(self, plan):
+        if len(plan.history) >= self.max_trials:
+            return True
+        # 期望提升已经很小，继续采样收益有限；初始设计之后至少再做同样多次，避免模型过早自信
+        if len(plan.history) < 2 * (1 + self.n_init):
+            return False
+        if self.last_max_ei is not None and plan.best_throughput > 0 and \
+                self.last_max_ei < self.ei_tol * plan.best_throughput:
+            return True
+        return False
+
+
+def make_strategy(search_cfg):
+    """ 按 config.yaml 中的 search 配置创建调优策略 """
+    from optimizer import HeuristicStrategy
+    if not search_cfg or search_cfg.get("strategy", "heuristic") == "heuristic":
+        return HeuristicStrategy()
+    if search_cfg["strategy"] == "bayes":
+        return BayesOptStrategy(n_init=search_cfg.get("n_init", 4),
+                                max_trials=search_cfg.get("max_trials", 30),
+                                ei_tol=search_cfg.get("ei_tol", 0.01))
+    if search_cfg["strategy"] == "pareto":
+        from pareto import ParetoStrategy
+        return ParetoStrategy(ttft_max=search_cfg.get("ttft_max", 10000),
+                              tpot_max=search_cfg.get("tpot_max", 300),
+                              max_trials=search_cfg.get("max_trials", 30),
+                              patience=search_cfg.get("patience", 6))
+    raise ValueError("unknown search strategy: " + str(search_cfg["strategy"]))
@@ -0,0 +1,216 @@
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# 分阶段计时：嵌套的 span 记录开始时间、耗时、线程、结果和附加属性（字节数等）
+# 每个结束的 span 追加一行到 JSON-lines 文件；to_chrome 转为 Chrome trace-event 格式
+# （chrome://tracing 或 Perfetto 打开），summarize 汇总整个 sweep 各阶段耗时
+# 未打开 trace 文件时 span 只做一次判断，不计时
+class Tracer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.file = None
+        self.path = None
+
+    def open(self, path):
+        """ 打开 trace 文件（追加），同一路径重复打开无影响 """
+        path = os.path.abspath(path)
+        with self.lock:
+            if self.path == path:
+                return
+            if self.file is not None:
+                self.file.close()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.file = open(path, 'a', encoding='utf-8')
+            self.path = path
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+            self.file = None
+            self.path = None
+
+    @property
+    def enabled(self):
+        return self.file is not None
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def emit(self, record):
+        line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+        with self.lock:
+            if self.file is not None:
+                self.file.write(line)
+                self.file.flush()
+
+
+class Span:
+    def __init__(self, span_id, name, attrs):
+        self.id = span_id
+        self.name = name
+        self.attrs = attrs
+
+    def set(self, **attrs):
+        """ 补充属性，如读到的字节数、是否复用 """
+        self.attrs.update(attrs)
+
+    def add(self, key, value):
+        """ 累加数值属性 """
+        self.attrs[key] = self.attrs.get(key, 0) + value
+
+
+class NullSpan:
+    def set(self, **attrs):
+        pass
+
+    def add(self, key, value):
+        pass
+
+
+null_span = NullSpan()
+tracer = Tracer()
+
+
+@contextmanager
+def span(name, **attrs):
+    """ with span("server.launch", model=...) as s: ...; s.set(bytes=n) """
+    if not tracer.enabled:
+        yield null_span
+        return
+    stack = tracer.stack()
+    s = Span(next(tracer.ids), name, attrs)
+    parent = stack[-1].id if stack else None
+    stack.append(s)
+    start = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield s
+    except BaseException as e:
+        status = "error: " + type(e).__name__
+        raise
+    finally:
+        stack.pop()
+        thread = threading.current_thread()
+        tracer.emit({"id": s.id, "parent": parent, "name": name, "ts": start,
+                     "dur": time.perf_counter() - t0, "tid": thread.ident,
+                     "thread": thread.name, "pid": os.getpid(), "status": status,
+                     "attrs": s.attrs})
+
+
+def current():
+    """ 当前线程最内层的 span，没有时返回空操作的 span """
+    stack = tracer.stack() if tracer.enabled else None
+    return stack[-1] if stack else null_span
+
+
+def open_trace(path):
+    tracer.open(path)
+
+
+def close_trace():
+    tracer.close()
+
+
+def load(path):
+    spans = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    spans.append(json.loads(line))
+                except ValueError:
+                    # 进程被杀时最后一行可能不完整
+                    pass
+    return spans
+
+
+def to_chrome(spans, output_path):
+    """ Chrome trace-event 格式，每个 span 一个完整事件（ph=X），时间单位 us """
+    events = []
+    threads = {}
+    for s in spans:
+        threads[(s["pid"], s["tid"])] = s["thread"]
+        args = dict(s["attrs"])
+        args["status"] = s["status"]
+        events.append({"name": s["name"], "cat": s["name"].split(".")[0], "ph": "X",
+                       "ts": s["ts"] * 1e6, "dur": s["dur"] * 1e6, "pid": s["pid"],
+                       "tid": s["tid"], "args": args})
+    for (pid, tid), name in threads.items():
+        events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                       "args": {"name": name}})
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def summarize(spans, by=None):
+    """
+    按 span 名（by 指定时按 属性值/span 名）汇总：次数、总耗时、自身耗时（减去子 span）、平均、最大、失败次数
+    返回 [dict]，同一分组内按总耗时降序
+    """
+    children = {}
+    for s in spans:
+        if s["parent"] is not None:
+            children[(s["pid"], s["parent"])] = children.get((s["pid"], s["parent"]), 0) + s["dur"]
+    # 子 span 从祖先继承分组属性（如 trial 的 model）
+    attrs_of = {(s["pid"], s["id"]): s for s in spans}
+
+    def group_value(s):
+        while s is not None:
+            if by in s["attrs"]:
+                return s["attrs"][by]
+            s = attrs_of.get((s["pid"], s["parent"])) if s["parent"] is not None else None
+        return "-"
+
+    rows = {}
+    for s in spans:
+        key = (group_value(s), s["name"]) if by else ("", s["name"])
+        row = rows.setdefault(key, {"group": key[0], "name": key[1], "count": 0, "total": 0.0,
+                                    "self": 0.0, "max": 0.0, "errors": 0, "bytes": 0})
+        row["count"] += 1
+        row["total"] += s["dur"]
+        row["self"] += max(s["dur"] - children.get((s["pid"], s["id"]), 0.0), 0.0)
+        row["max"] = max(row["max"], s["dur"])
+        row["errors"] += s["status"] != "ok"
+        row["bytes"] += s["attrs"].get("bytes", 0) or 0
+    out = sorted(rows.values(), key=lambda r: (str(r["group"]), -r["total"]))
+    for row in out:
+        row["mean"] = row["total"] / row["count"]
+    return out
+
+
+def print_summary(spans, by=None, root="trial"):
+    rows = summarize(spans, by)
+    wall = sum(s["dur"] for s in spans if s["name"] == root) or 1.0
+    print(f"{by or '':<20}{'span':<24}{'count':>6}{'total s':>10}{'self s':>10}{'mean s':>9}"
+          f"{'max s':>9}{'share':>7}{'MB':>9}{'err':>5}")
+    for r in rows:
+        print(f"{str(r['group'])[:19]:<20}{r['name'][:23]:<24}{r['count']:>6}{r['total']:>10.2f}"
+              f"{r['self']:>10.2f}{r['mean']:>9.2f}{r['max']:>9.2f}{r['self'] / wall:>7.1%}"
+              f"{r['bytes'] / 2**20:>9.1f}{r['errors']:>5}")
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="汇总 trace.jsonl，可转为 Chrome trace")
+    parser.add_argument("trace", nargs="?", default="2-A100/trace.jsonl")
+    parser.add_argument("--by", default=None, help="按 span 属性分组，如 model")
+    parser.add_argument("--chrome", default=None, help="输出 Chrome trace-event JSON")
+    args = parser.parse_args()
+    spans = load(args.trace)
+    print_summary(spans, args.by)
+    if args.chrome:
+        to_chrome(spans, args.chrome)
+        print("chrome trace:", args.chrome)